@@ -0,0 +1,99 @@
+"""
+MedAssist Response Serialization Benchmark
+Bytes and microseconds per prediction response, by projection and JSON encoder
+
+Scores a set of random patients once, then times turning the cached result
+documents into HTTP response bodies: projection (fields / top_k) plus
+serialization, with Flask's jsonify and with the fast encoder in
+response_format.py. Batch responses are timed per contained result.
+
+Usage:
+    python benchmark_responses.py --patients 200 --repeat 5
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from flask import jsonify
+from werkzeug.datastructures import MultiDict
+
+import prediction_api
+import response_format
+from benchmark_serving import random_cardio_patient, random_diabetes_patient
+
+# (name, query string) of the projections compared
+PROJECTIONS = (
+    ('full', {}),
+    ('top_k=3', {'top_k': '3'}),
+    ('risk_probability,top_factors&top_k=3', {'fields': 'risk_probability,top_factors', 'top_k': '3'}),
+    ('risk_probability', {'fields': 'risk_probability'})
+)
+
+
+def time_per_response(render: Callable[[], bytes], responses: int, repeat: int) -> float:
+    """Best-of-`repeat` time per response in microseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        best = min(best, time.perf_counter() - started)
+    return best / responses * 1e6
+
+
+def run(patients: int, repeat: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Time every projection with both encoders, for single and batch responses"""
+    logging.getLogger('prediction_api').setLevel(logging.WARNING)
+    prediction_api.load_models()
+    rng = random.Random(seed)
+
+    rows = []
+    with prediction_api.app.app_context():
+        for name, generate, scorer in (
+                ('cardiovascular', random_cardio_patient, prediction_api.score_cardio_records),
+                ('diabetes', random_diabetes_patient, prediction_api.score_diabetes_records)):
+            results = [result for result, _ in scorer([generate(rng) for _ in range(patients)])]
+
+            for label, args in PROJECTIONS:
+                projection = response_format.parse_projection(MultiDict(args))
+
+                def single(encode):
+                    return lambda: [encode(projection.apply(r)) for r in results]
+
+                def batch(encode):
+                    return lambda: encode({'count': len(results), 'succeeded': len(results), 'failed': 0,
+                                           'results': [{'index': i, **projection.apply(r)}
+                                                       for i, r in enumerate(results)]})
+
+                jsonify_body = lambda payload: jsonify(payload).get_data()
+                fast_body = lambda payload: response_format.json_response(payload).get_data()
+                size = sum(len(fast_body(projection.apply(r))) for r in results) / len(results)
+
+                rows.append({
+                    'model': name,
+                    'projection': label,
+                    'bytes_per_response': round(size),
+                    'jsonify_us': round(time_per_response(single(jsonify_body), len(results), repeat), 1),
+                    'fast_us': round(time_per_response(single(fast_body), len(results), repeat), 1),
+                    'batch_jsonify_us_per_row': round(time_per_response(batch(jsonify_body), len(results), repeat), 1),
+                    'batch_fast_us_per_row': round(time_per_response(batch(fast_body), len(results), repeat), 1)
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark response size and serialization time')
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps({'fast_json': response_format.FAST_JSON,
+                      'results': run(args.patients, args.repeat, args.seed)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
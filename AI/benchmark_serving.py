@@ -0,0 +1,133 @@
+"""
+MedAssist Serving Benchmark
+Closed-loop HTTP load generator for comparing serving modes
+
+Sends randomized patients (so the prediction cache does not turn every request
+into a hit) to one prediction endpoint from N concurrent clients for a fixed
+duration, then prints requests per second and latency percentiles.
+
+Usage:
+    python benchmark_serving.py --url http://localhost:5001 --endpoint /predict/cardiovascular \
+        --concurrency 16 --duration 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+import requests
+
+
+def random_cardio_patient(rng: random.Random) -> Dict[str, Any]:
+    """Random cardiovascular request within realistic ranges"""
+    return {
+        'age': rng.randint(30, 65) * 365 + rng.randint(0, 364),
+        'gender': rng.choice([1, 2]),
+        'height': rng.randint(150, 195),
+        'weight': round(rng.uniform(50, 120), 1),
+        'ap_hi': rng.randint(95, 180),
+        'ap_lo': rng.randint(60, 110),
+        'cholesterol': rng.choice([1, 1, 1, 2, 3]),
+        'gluc': rng.choice([1, 1, 1, 2, 3]),
+        'smoke': int(rng.random() < 0.1),
+        'alco': int(rng.random() < 0.05),
+        'active': int(rng.random() < 0.8)
+    }
+
+
+def random_diabetes_patient(rng: random.Random) -> Dict[str, Any]:
+    """Random diabetes request within realistic ranges"""
+    return {
+        'age': float(rng.randint(18, 80)),
+        'gender': rng.choice(['Female', 'Male']),
+        'hypertension': int(rng.random() < 0.08),
+        'heart_disease': int(rng.random() < 0.04),
+        'smoking_history': rng.choice(['never', 'No Info', 'current', 'former', 'ever', 'not current']),
+        'bmi': round(rng.uniform(18, 40), 2),
+        'HbA1c_level': round(rng.uniform(3.5, 9.0), 1),
+        'blood_glucose_level': rng.randint(80, 300)
+    }
+
+
+GENERATORS = {
+    '/predict/cardiovascular': random_cardio_patient,
+    '/predict/diabetes': random_diabetes_patient
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_benchmark(url: str, endpoint: str, concurrency: int, duration: float, seed: int = 0) -> Dict[str, Any]:
+    """Drive one endpoint with `concurrency` clients for `duration` seconds"""
+    generate = GENERATORS[endpoint]
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        session = requests.Session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            payload = generate(rng)
+            started = time.perf_counter()
+            try:
+                response = session.post(url + endpoint, json=payload, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - started)
+            failed += 0 if ok else 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a running MedAssist Prediction API')
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--endpoint', default='/predict/cardiovascular', choices=sorted(GENERATORS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    result = run_benchmark(args.url, args.endpoint, args.concurrency, args.duration, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+MedAssist Bulk Scorer
+Stream a CSV or Parquet patient file through the prediction models
+
+Reads the input in fixed-size chunks, scores the chunks in a process pool and
+writes risk probability, prediction, risk category and the top-k explanation
+factors per row to CSV or Parquet. Only a bounded number of chunks is in flight
+at any time, so memory stays constant however large the file is. Rows that
+cannot be scored keep their place in the output with an `error` message.
+
+The feature encoding is the model's FeaturePipeline, the same one used by
+prediction_api.py (including the days-to-years age conversion and the diabetes
+category codes).
+
+Usage:
+    python bulk_score.py cardiovascular dataset/cardio_train.csv cardio_scores.parquet
+    python bulk_score.py diabetes dataset/diabetes_prediction_dataset.csv diabetes_scores.csv \
+        --workers 4 --chunk-size 20000 --top-k 3 --explain native
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import prediction_api
+from explanation_engine import EXPLAIN_MODES
+
+logger = logging.getLogger('bulk_score')
+
+MODELS = ('cardiovascular', 'diabetes')
+
+# Per-worker float32 feature buffers, reused by every chunk the worker scores
+_feature_buffers = {}
+
+
+def read_chunks(path: str, chunk_size: int, sep: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Yield the input file as DataFrames of at most chunk_size rows"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+
+    if sep is None:
+        # cardio_train.csv is ';'-separated, the diabetes dataset uses ','
+        with open(path, 'r') as f:
+            header = f.readline()
+        sep = ';' if header.count(';') > header.count(',') else ','
+
+    yield from pd.read_csv(path, sep=sep, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._header_written = False
+
+    def write(self, frame: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(frame, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._header_written else 'w',
+                         header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _init_worker(nthread: int):
+    """Load the models once per worker process"""
+    logging.getLogger('prediction_api').setLevel(logging.WARNING)
+    # Bulk scoring never uses shap's explainer unless --explain exact asks for it
+    prediction_api.load_models(build_explainers=False)
+    prediction_api.configure_threads(nthread)
+
+
+def score_chunk(model_name: str, frame: pd.DataFrame, top_k: int, explain_mode: str,
+                keep_columns: List[str]) -> pd.DataFrame:
+    """Score one chunk and return its output rows"""
+    bundle = prediction_api.get_bundle(model_name)
+    buffer = _feature_buffers.get(model_name)
+    if buffer is None or len(buffer) < len(frame):
+        buffer = _feature_buffers[model_name] = np.empty((len(frame), len(bundle.feature_names)), dtype=np.float32)
+    features, errors = bundle.pipeline.transform_frame(frame, out=buffer)
+    model, engine, feature_names = bundle.model, bundle.engine, bundle.feature_names
+    # A model cannot explain more factors than it has features
+    top_k = min(top_k, len(feature_names))
+
+    out = frame[keep_columns].reset_index(drop=True) if keep_columns else pd.DataFrame(index=range(len(frame)))
+    valid = np.array([error is None for error in errors], dtype=bool)
+
+    risk = np.full(len(frame), np.nan)
+    prediction = np.full(len(frame), -1, dtype=np.int8)
+    factor_names = np.full((len(frame), top_k), None, dtype=object)
+    factor_values = np.full((len(frame), top_k), np.nan)
+
+    if valid.any():
+        rows = features[valid]
+        risk[valid] = model.predict_proba(rows)[:, 1]
+        prediction[valid] = risk[valid] > 0.5
+
+        contributions = engine.contributions(rows, explain_mode) if top_k else None
+        if contributions is not None:
+            # Top-k features by absolute contribution, most important first
+            order = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :top_k]
+            factor_names[valid] = np.asarray(feature_names, dtype=object)[order]
+            factor_values[valid] = np.take_along_axis(contributions, order, axis=1)
+
+    out['risk_probability'] = risk
+    out['prediction'] = prediction
+    out['risk_category'] = pd.Series(
+        np.select([risk < 0.3, risk < 0.7, risk >= 0.7], ['Low', 'Medium', 'High'], default=None),
+        dtype='string')
+    for k in range(top_k):
+        out[f'top_factor_{k + 1}'] = pd.Series(factor_names[:, k], dtype='string')
+        out[f'top_factor_{k + 1}_shap'] = factor_values[:, k]
+    out['error'] = pd.Series(errors, dtype='string')
+
+    return out
+
+
+def run(model_name: str, input_path: str, output_path: str, workers: int, chunk_size: int,
+        top_k: int, explain_mode: str, keep_columns: Optional[List[str]], sep: Optional[str]) -> int:
+    """Score the whole file and return the number of rows written"""
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    writer = ChunkWriter(output_path)
+    pending = deque()
+    rows_done = 0
+    started = time.perf_counter()
+
+    def flush_oldest():
+        nonlocal rows_done
+        frame = pending.popleft().result()
+        writer.write(frame)
+        rows_done += len(frame)
+        elapsed = time.perf_counter() - started
+        logger.info(f"{rows_done} rows scored ({rows_done / elapsed:,.0f} rows/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(nthread,)) as pool:
+            for chunk in read_chunks(input_path, chunk_size, sep):
+                columns = keep_columns if keep_columns is not None else [c for c in ('id',) if c in chunk.columns]
+                pending.append(pool.submit(score_chunk, model_name, chunk, top_k, explain_mode, columns))
+                # Bound the chunks held in memory: at most two per worker in flight
+                while len(pending) >= 2 * workers:
+                    flush_oldest()
+            while pending:
+                flush_oldest()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Done: {rows_done} rows in {elapsed:.1f}s ({rows_done / elapsed:,.0f} rows/s) -> {output_path}")
+    return rows_done
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of patients in bulk')
+    parser.add_argument('model', choices=MODELS)
+    parser.add_argument('input', help='CSV or .parquet file with one patient per row')
+    parser.add_argument('output', help='Output file; .parquet writes Parquet, anything else CSV')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--top-k', type=int, default=3, help='Number of explanation factors per row (0 = none)')
+    parser.add_argument('--explain', default='native', choices=[m for m in EXPLAIN_MODES if m != 'none'])
+    parser.add_argument('--keep', nargs='*', default=None,
+                        help="Input columns copied to the output (default: 'id' when present)")
+    parser.add_argument('--sep', default=None, help="CSV separator (default: detected from the header)")
+    args = parser.parse_args(argv)
+    if args.top_k < 0:
+        parser.error('--top-k must be 0 or more')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        run(args.model, args.input, args.output, args.workers, args.chunk_size,
+            args.top_k, args.explain, args.keep, args.sep)
+    except prediction_api.ValidationError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
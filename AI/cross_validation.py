@@ -0,0 +1,371 @@
+"""
+MedAssist Cross-Validation
+Parallel stratified k-fold evaluation with cached out-of-fold predictions
+
+The notebook judges each model on a single 80/20 split. This harness instead
+trains one model per fold of a stratified k-fold split. The data is loaded and
+cleaned with train_models.py's code and seed. Each fold trains the same way
+train_models.py does: hist trees and early stopping on a validation split of
+its own training folds. The fold's held-out rows are never seen in training.
+
+Folds run in a pool of worker processes under a thread budget. `--workers`
+folds train at once, each with `--thread-budget` / `--workers` XGBoost threads.
+The workers memory-map the encoded matrices instead of re-parsing the CSV.
+
+The out-of-fold predictions are cached on disk
+(training_cache/<model>-cv<k>-<key>/oof.npy), next to the labels and the fold
+of each row. That gives one honest prediction for every row. The key hashes
+the dataset contents, the fold count, the seed and the training parameters.
+Threshold and risk-band analyses are recomputed from the cache on every run,
+so a new cut point costs milliseconds and no retraining. The default risk
+bands are the 0.3/0.7 cut points of get_risk_category in prediction_api.py.
+
+Usage:
+    python cross_validation.py diabetes --folds 5 --workers 5 --thread-budget 10
+    python cross_validation.py diabetes --bands 0.2 0.5               # reuses the cached predictions
+    python cross_validation.py cardiovascular --params '{"max_depth": 4}' --output cv_cardio.json
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import xgboost as xgb
+
+from dataset_cache import DATASET_DIR, REFERENCE_DATASETS
+from hyperparameter_search import CACHE_DIR, cache_key
+from train_models import LOADERS, NOTEBOOK_PARAMS, SEED, VALIDATION_SIZE
+
+logger = logging.getLogger('cross_validation')
+
+FOLDS = 5
+
+# get_risk_category in prediction_api.py: Low < 0.3 <= Medium < 0.7 <= High
+RISK_BANDS = (0.3, 0.7)
+RISK_LABELS = ('Low', 'Medium', 'High')
+
+THRESHOLDS = tuple(round(t, 2) for t in np.arange(0.05, 1.0, 0.05))
+
+# Process-local state of a pool worker: the memory-mapped matrices and fold assignment
+_worker: Dict[str, Any] = {}
+
+
+def cv_key(name: str, folds: int, params: Dict[str, Any], settings: Dict[str, Any],
+           dataset_dir: str = DATASET_DIR, seed: int = SEED) -> str:
+    """Hash of the dataset contents, the fold count, the seed and everything that shapes the fold models"""
+    spec = {'data': cache_key(name, dataset_dir, seed), 'folds': folds, 'params': params,
+            'validation_size': VALIDATION_SIZE, 'xgboost': xgb.__version__, **settings}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def scores(y: np.ndarray, proba: np.ndarray) -> Dict[str, float]:
+    """The notebook's metrics: accuracy at 0.5, ROC AUC and log loss"""
+    from sklearn.metrics import log_loss, roc_auc_score
+
+    return {
+        'accuracy': round(float(np.mean((proba > 0.5) == y)), 5),
+        'roc_auc': round(float(roc_auc_score(y, proba)), 5),
+        'log_loss': round(float(log_loss(y, proba, labels=[0, 1])), 5)
+    }
+
+
+def _init_worker(path: str):
+    _worker['X'] = np.load(os.path.join(path, 'X.npy'), mmap_mode='r')
+    _worker['y'] = np.load(os.path.join(path, 'y.npy'))
+    _worker['fold'] = np.load(os.path.join(path, 'fold.npy'))
+    with open(os.path.join(path, 'feature_names.json'), 'r') as f:
+        _worker['feature_names'] = json.load(f)
+
+
+def run_fold(fold: int, params: Dict[str, Any], settings: Dict[str, Any],
+             threads: int) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Train on every fold but `fold` and predict its rows, in a pool worker"""
+    from sklearn.model_selection import train_test_split
+
+    X, y, names = _worker['X'], _worker['y'], _worker['feature_names']
+    held_out = _worker['fold'] == fold
+    train_rows = np.flatnonzero(~held_out)
+    fit_rows, val_rows = train_test_split(train_rows, test_size=VALIDATION_SIZE, random_state=settings['seed'],
+                                          stratify=y[train_rows])
+
+    started = time.perf_counter()
+    max_bin = params.get('max_bin', 256)
+    train = xgb.QuantileDMatrix(X[fit_rows], y[fit_rows], max_bin=max_bin, nthread=threads, feature_names=names)
+    validation = xgb.QuantileDMatrix(X[val_rows], y[val_rows], ref=train, max_bin=max_bin, nthread=threads,
+                                     feature_names=names)
+    booster_params = {
+        'objective': 'binary:logistic',
+        'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'nthread': threads,
+        'seed': settings['seed'],
+        **params
+    }
+    booster = xgb.train(booster_params, train, num_boost_round=settings['max_rounds'],
+                        evals=[(validation, 'validation')], early_stopping_rounds=settings['early_stopping'],
+                        verbose_eval=False)
+    booster = booster[:booster.best_iteration + 1]
+    train_seconds = time.perf_counter() - started
+
+    proba = booster.inplace_predict(np.ascontiguousarray(X[held_out])).astype(np.float32)
+    row = {
+        'fold': fold,
+        'rows': {'fit': int(len(fit_rows)), 'validation': int(len(val_rows)), 'test': int(held_out.sum())},
+        'trees': booster.num_boosted_rounds(),
+        'train_seconds': round(train_seconds, 3),
+        **scores(y[held_out], proba)
+    }
+    return row, proba
+
+
+def run_cv(name: str, folds: int = FOLDS, workers: int = 1, thread_budget: int = 1,
+           params: Optional[Dict[str, Any]] = None, max_rounds: int = 1000, early_stopping: int = 50,
+           seed: int = SEED, dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR,
+           refit: bool = False) -> str:
+    """
+    Cross-validate a model, or reuse its cached out-of-fold predictions.
+
+    Args:
+        params: XGBoost parameters over the notebook's (NOTEBOOK_PARAMS)
+        workers: Folds trained at once
+        thread_budget: XGBoost threads shared by the workers
+        refit: Retrain even if the predictions are cached
+
+    Returns:
+        str: The cache directory holding oof.npy, y.npy, fold.npy and meta.json.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    params = {**NOTEBOOK_PARAMS[name], **(params or {})}
+    settings = {'max_rounds': max_rounds, 'early_stopping': early_stopping, 'seed': seed}
+    path = os.path.join(cache_dir, f'{name}-cv{folds}-{cv_key(name, folds, params, settings, dataset_dir, seed)}')
+    if os.path.exists(os.path.join(path, 'meta.json')) and not refit:
+        logger.info(f"Using cached {name} out-of-fold predictions in {path}")
+        return path
+
+    started = time.perf_counter()
+    X, y, _ = LOADERS[name](dataset_dir)
+    labels = y.to_numpy(dtype=np.int8)
+    fold = np.empty(len(labels), dtype=np.int8)
+    for k, (_, held_out) in enumerate(StratifiedKFold(folds, shuffle=True, random_state=seed).split(X, labels)):
+        fold[held_out] = k
+
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'X.npy'), np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(os.path.join(tmp_path, 'y.npy'), labels)
+    np.save(os.path.join(tmp_path, 'fold.npy'), fold)
+    with open(os.path.join(tmp_path, 'feature_names.json'), 'w') as f:
+        json.dump(list(X.columns), f)
+    load_seconds = time.perf_counter() - started
+
+    workers = max(1, min(workers, folds, thread_budget))
+    threads = max(1, thread_budget // workers)
+    oof = np.full(len(labels), np.nan, dtype=np.float32)
+    results = []
+    # spawn, not fork: the workers start their own OpenMP runtime
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(tmp_path,)) as pool:
+        futures = [pool.submit(run_fold, k, params, settings, threads) for k in range(folds)]
+        for future in as_completed(futures):
+            row, proba = future.result()
+            oof[fold == row['fold']] = proba
+            results.append(row)
+            logger.info(f"Fold {row['fold']}: AUC {row['roc_auc']}, {row['trees']} trees, {row['train_seconds']}s")
+
+    np.save(os.path.join(tmp_path, 'oof.npy'), oof)
+    os.remove(os.path.join(tmp_path, 'X.npy'))
+    meta = {
+        'model': name,
+        'dataset': REFERENCE_DATASETS[name][0],
+        'folds': folds,
+        'params': params,
+        **settings,
+        'workers': workers,
+        'threads_per_fold': threads,
+        'rows': int(len(labels)),
+        'load_seconds': round(load_seconds, 3),
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        'fold_results': sorted(results, key=lambda row: row['fold'])
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Cached {name} out-of-fold predictions in {path} ({meta['wall_seconds']}s)")
+    return path
+
+
+def load_predictions(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+    """
+    Read a cross-validation cache.
+
+    Returns:
+        tuple: (labels, out-of-fold probabilities, fold of each row, metadata)
+    """
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    return (np.load(os.path.join(path, 'y.npy')), np.load(os.path.join(path, 'oof.npy')),
+            np.load(os.path.join(path, 'fold.npy')), meta)
+
+
+def threshold_table(y: np.ndarray, proba: np.ndarray,
+                    thresholds: Sequence[float] = THRESHOLDS) -> List[Dict[str, Any]]:
+    """Confusion counts and rates when predicting positive above each threshold (the API's `> 0.5` rule)"""
+    positives, negatives = np.sort(proba[y == 1]), np.sort(proba[y == 0])
+    table = []
+    for threshold in thresholds:
+        tp = len(positives) - int(np.searchsorted(positives, threshold, side='right'))
+        fp = len(negatives) - int(np.searchsorted(negatives, threshold, side='right'))
+        fn, tn = len(positives) - tp, len(negatives) - fp
+        precision = tp / (tp + fp) if tp + fp else None
+        recall = tp / len(positives) if len(positives) else None
+        table.append({
+            'threshold': threshold,
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            'precision': round(precision, 4) if precision is not None else None,
+            'recall': round(recall, 4) if recall is not None else None,
+            'specificity': round(tn / len(negatives), 4) if len(negatives) else None,
+            'f1': round(2 * tp / (2 * tp + fp + fn), 4) if tp else 0.0,
+            'accuracy': round((tp + tn) / len(y), 4),
+            'flagged': round((tp + fp) / len(y), 4)
+        })
+    return table
+
+
+def band_labels(cuts: Sequence[float]) -> List[str]:
+    if len(cuts) == len(RISK_LABELS) - 1:
+        return list(RISK_LABELS)
+    edges = [0.0, *cuts, 1.0]
+    return [f'{low:g}-{high:g}' for low, high in zip(edges, edges[1:])]
+
+
+def risk_bands(y: np.ndarray, proba: np.ndarray, fold: np.ndarray,
+               cuts: Sequence[float] = RISK_BANDS) -> List[Dict[str, Any]]:
+    """
+    Rows, observed event rate and calibration of each risk band.
+
+    A probability below the first cut falls in the first band, as in get_risk_category.
+    The fold range of the observed rate shows how stable each band is.
+    """
+    band = np.digitize(proba, cuts)
+    edges = [0.0, *cuts, 1.0]
+    total_positives = max(int(y.sum()), 1)
+    rows = []
+    for k, label in enumerate(band_labels(cuts)):
+        members = band == k
+        count = int(members.sum())
+        fold_rates = [float(y[members & (fold == f)].mean()) for f in np.unique(fold)
+                      if (members & (fold == f)).any()]
+        rows.append({
+            'band': label,
+            'range': [edges[k], edges[k + 1]],
+            'rows': count,
+            'share': round(count / len(y), 4),
+            'events': int(y[members].sum()),
+            'observed_rate': round(float(y[members].mean()), 4) if count else None,
+            'mean_predicted': round(float(proba[members].mean()), 4) if count else None,
+            'events_captured': round(int(y[members].sum()) / total_positives, 4),
+            'fold_rate_range': [round(min(fold_rates), 4), round(max(fold_rates), 4)] if fold_rates else None
+        })
+    return rows
+
+
+def analyze(path: str, thresholds: Sequence[float] = THRESHOLDS,
+            cuts: Sequence[float] = RISK_BANDS) -> Dict[str, Any]:
+    """Fold metrics, pooled out-of-fold metrics, the threshold table and the risk bands of a cached run"""
+    started = time.perf_counter()
+    y, oof, fold, meta = load_predictions(path)
+    fold_auc = [row['roc_auc'] for row in meta['fold_results']]
+    table = threshold_table(y, oof, thresholds)
+    report = {
+        **meta,
+        'cache': path,
+        'fold_auc_mean': round(float(np.mean(fold_auc)), 5),
+        'fold_auc_std': round(float(np.std(fold_auc)), 5),
+        'out_of_fold': scores(y, oof),
+        'thresholds': table,
+        'best_f1_threshold': max(table, key=lambda row: row['f1'])['threshold'],
+        'risk_bands': risk_bands(y, oof, fold, cuts)
+    }
+    report['analysis_seconds'] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'fold':>4} {'test rows':>9} {'trees':>5} {'train s':>7} {'accuracy':>8} {'roc_auc':>8} {'log_loss':>8}")
+    for row in report['fold_results']:
+        print(f"{row['fold']:>4} {row['rows']['test']:>9} {row['trees']:>5} {row['train_seconds']:>7.2f} "
+              f"{row['accuracy']:>8.5f} {row['roc_auc']:>8.5f} {row['log_loss']:>8.5f}")
+    pooled = report['out_of_fold']
+    print(f"\nFold AUC {report['fold_auc_mean']:.5f} +/- {report['fold_auc_std']:.5f}; out-of-fold accuracy "
+          f"{pooled['accuracy']:.5f}, AUC {pooled['roc_auc']:.5f}, log loss {pooled['log_loss']:.5f}")
+
+    print(f"\n{'threshold':>9} {'precision':>9} {'recall':>7} {'specif.':>7} {'f1':>6} {'accuracy':>8} {'flagged':>7}")
+    for row in report['thresholds']:
+        print(f"{row['threshold']:>9.2f} {row['precision'] if row['precision'] is not None else float('nan'):>9.4f} "
+              f"{row['recall']:>7.4f} {row['specificity']:>7.4f} {row['f1']:>6.4f} {row['accuracy']:>8.4f} "
+              f"{row['flagged']:>7.4f}")
+    print(f"Best F1 at threshold {report['best_f1_threshold']}")
+
+    print(f"\n{'band':>10} {'range':>11} {'rows':>7} {'share':>6} {'observed':>8} {'predicted':>9} {'captured':>8} "
+          f"{'fold range':>15}")
+    for row in report['risk_bands']:
+        fold_range = f"{row['fold_rate_range'][0]:.4f}-{row['fold_rate_range'][1]:.4f}" if row['fold_rate_range'] else ''
+        observed = f"{row['observed_rate']:.4f}" if row['observed_rate'] is not None else ''
+        predicted = f"{row['mean_predicted']:.4f}" if row['mean_predicted'] is not None else ''
+        print(f"{row['band']:>10} {row['range'][0]:>5g}-{row['range'][1]:<5g} {row['rows']:>7} {row['share']:>6.3f} "
+              f"{observed:>8} {predicted:>9} {row['events_captured']:>8.4f} {fold_range:>15}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Parallel stratified k-fold cross-validation with cached '
+                                                 'out-of-fold predictions')
+    parser.add_argument('model', choices=list(LOADERS))
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--workers', type=int, default=None, help='Folds trained at once (default: folds, '
+                                                                   'capped by the thread budget)')
+    parser.add_argument('--thread-budget', type=int, default=os.cpu_count() or 1,
+                        help='XGBoost threads shared by all workers (default: cores)')
+    parser.add_argument('--params', type=json.loads, default=None,
+                        help='JSON object of XGBoost parameters over the notebook\'s')
+    parser.add_argument('--max-rounds', type=int, default=1000)
+    parser.add_argument('--early-stopping', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--refit', action='store_true', help='Retrain even if the predictions are cached')
+    parser.add_argument('--bands', type=float, nargs='+', default=list(RISK_BANDS),
+                        help='Risk band cut points (default: get_risk_category\'s 0.3 0.7)')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(THRESHOLDS))
+    parser.add_argument('--output', default=None, help='Write the full report to this JSON file')
+    args = parser.parse_args(argv)
+    if args.folds < 2:
+        parser.error('--folds must be at least 2')
+    if any(not 0 < cut < 1 for cut in args.bands) or args.bands != sorted(set(args.bands)):
+        parser.error('--bands must be increasing cut points between 0 and 1')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    path = run_cv(args.model, args.folds, args.workers or args.folds, args.thread_budget, args.params,
+                  args.max_rounds, args.early_stopping, args.seed, args.dataset_dir, args.cache_dir, args.refit)
+    report = analyze(path, args.thresholds, args.bands)
+
+    print_report(report)
+    print(f"\n{report['folds']}-fold CV trained in {report['wall_seconds']}s with {report['workers']} workers x "
+          f"{report['threads_per_fold']} threads; analysis {report['analysis_seconds'] * 1000:.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+MedAssist Dataset Cache
+The training datasets as compact, columnar binary files, converted from CSV once
+
+load_dataset() returns a dataset as a DataFrame with the smallest dtypes that
+hold its values:
+- integer columns: the smallest signed integer type (int8/int16/int32). Signed
+  types are kept so that differences such as ap_hi - ap_lo cannot wrap around.
+- float columns: float32. XGBoost trains and predicts on float32 anyway, and
+  every value in the CSVs has 7 or fewer significant digits.
+- text columns (gender, smoking_history): categoricals, i.e. small integer codes
+  plus one copy of each label.
+
+The first load parses the CSV and writes the result as an uncompressed Feather
+(Arrow IPC) file under dataset_cache/. Later loads memory-map that file. The
+CSV's size and modification time are stored in the file's metadata, and the
+cache is rebuilt when either changes. Without pyarrow the CSV is parsed every
+time, with the same dtypes.
+
+Usage:
+    python dataset_cache.py build              # (re)build both caches
+    python dataset_cache.py report             # load time and memory, CSV vs cache
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import shortest_decimal
+from model_store import MODEL_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    FEATHER_AVAILABLE = True
+except ImportError:
+    FEATHER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(MODEL_DIR, 'dataset')
+CACHE_DIR = os.getenv('DATASET_CACHE_DIR', os.path.join(MODEL_DIR, 'dataset_cache'))
+
+# Training dataset and CSV separator per model
+REFERENCE_DATASETS = {
+    'cardiovascular': ('cardio_train.csv', ';'),
+    'diabetes': ('diabetes_prediction_dataset.csv', ',')
+}
+
+# Text columns stored as categoricals
+CATEGORICAL_COLUMNS = {
+    'diabetes': ['gender', 'smoking_history']
+}
+
+METADATA_KEY = b'medassist'
+
+
+def compact_dtypes(frame: pd.DataFrame, categorical: List[str]) -> pd.DataFrame:
+    """Downcast every column of a freshly parsed CSV to its smallest dtype"""
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in categorical:
+            columns[column] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values):
+            columns[column] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            columns[column] = values.astype(np.float32)
+        else:
+            columns[column] = values
+    return pd.DataFrame(columns)
+
+
+def widen_dtypes(frame: pd.DataFrame) -> pd.DataFrame:
+    """The dtypes pd.read_csv would have given: int64, float64 (values as written in the CSV) and str"""
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.astype(object)
+        elif pd.api.types.is_integer_dtype(values):
+            columns[column] = values.astype(np.int64)
+        elif values.dtype == np.float32:
+            columns[column] = pd.Series(shortest_decimal(values.to_numpy()), index=values.index, name=column)
+        else:
+            columns[column] = values
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def source_path(name: str, dataset_dir: str = DATASET_DIR) -> str:
+    return os.path.join(dataset_dir, REFERENCE_DATASETS[name][0])
+
+
+def cache_path(name: str, cache_dir: str = CACHE_DIR) -> str:
+    stem = os.path.splitext(REFERENCE_DATASETS[name][0])[0]
+    return os.path.join(cache_dir, f'{stem}.feather')
+
+
+def source_fingerprint(path: str) -> Dict[str, int]:
+    """Size and modification time of the source CSV"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_csv(name: str, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """Parse a dataset CSV and downcast its columns"""
+    filename, sep = REFERENCE_DATASETS[name]
+    frame = pd.read_csv(os.path.join(dataset_dir, filename), sep=sep)
+    return compact_dtypes(frame, CATEGORICAL_COLUMNS.get(name, []))
+
+
+def cache_metadata(name: str, cache_dir: str = CACHE_DIR) -> Optional[Dict[str, Any]]:
+    """The metadata stored in a dataset's cache file (None if there is no cache)"""
+    path = cache_path(name, cache_dir)
+    if not FEATHER_AVAILABLE or not os.path.exists(path):
+        return None
+    schema = pa.ipc.open_file(path).schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else None
+
+
+def is_current(name: str, dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR) -> bool:
+    """Whether the cache exists and was built from the CSV as it is now"""
+    metadata = cache_metadata(name, cache_dir)
+    return metadata is not None and metadata.get('source') == source_fingerprint(source_path(name, dataset_dir))
+
+
+def build_cache(name: str, dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR) -> str:
+    """Convert a dataset CSV into its Feather cache"""
+    started = time.perf_counter()
+    fingerprint = source_fingerprint(source_path(name, dataset_dir))
+    frame = read_csv(name, dataset_dir)
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = {'dataset': REFERENCE_DATASETS[name][0], 'source': fingerprint, 'rows': len(frame)}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(metadata).encode()})
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(name, cache_dir)
+    # Write to a private name and rename, so concurrent readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    logger.info(f"Cached {metadata['dataset']} as {path} ({time.perf_counter() - started:.2f}s)")
+    return path
+
+
+def load_dataset(name: str, dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR,
+                 columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a training dataset with compact dtypes, from its cache when current.
+
+    Args:
+        name: Model name ('cardiovascular' or 'diabetes').
+        columns: Only these columns (all by default).
+
+    Returns:
+        pd.DataFrame: The dataset, in CSV row order.
+    """
+    if not FEATHER_AVAILABLE:
+        frame = read_csv(name, dataset_dir)
+        return frame[columns] if columns else frame
+
+    if not is_current(name, dataset_dir, cache_dir):
+        build_cache(name, dataset_dir, cache_dir)
+    return feather.read_feather(cache_path(name, cache_dir), columns=columns, memory_map=True)
+
+
+def measure(load, repeat: int) -> Dict[str, Any]:
+    """Best-of-`repeat` load time and the loaded frame's memory"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        frame = load()
+        best = min(best, time.perf_counter() - started)
+    return {'load_ms': round(best * 1000, 1), 'memory_mb': round(frame.memory_usage(deep=True).sum() / 1e6, 2),
+            'dtypes': {column: str(dtype) for column, dtype in frame.dtypes.items()}}
+
+
+def report(dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR, repeat: int = 5) -> Dict[str, Any]:
+    """Load time and memory of each dataset: plain read_csv, against the cache"""
+    results = {}
+    for name, (filename, sep) in REFERENCE_DATASETS.items():
+        if not is_current(name, dataset_dir, cache_dir):
+            build_cache(name, dataset_dir, cache_dir)
+        csv = measure(lambda: pd.read_csv(os.path.join(dataset_dir, filename), sep=sep), repeat)
+        cached = measure(lambda: load_dataset(name, dataset_dir, cache_dir), repeat)
+        results[name] = {
+            'rows': cache_metadata(name, cache_dir)['rows'],
+            'read_csv': csv,
+            'cache': cached,
+            'speedup': round(csv['load_ms'] / cached['load_ms'], 1),
+            'memory_reduction': round(csv['memory_mb'] / cached['memory_mb'], 1)
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Build or measure the columnar dataset cache')
+    parser.add_argument('command', choices=['build', 'report'])
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if not FEATHER_AVAILABLE:
+        parser.error('The dataset cache requires pyarrow')
+
+    if args.command == 'build':
+        for name in REFERENCE_DATASETS:
+            build_cache(name, args.dataset_dir, args.cache_dir)
+    else:
+        print(json.dumps(report(args.dataset_dir, args.cache_dir, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
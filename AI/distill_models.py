@@ -0,0 +1,278 @@
+"""
+MedAssist Model Distillation
+Compact "fast tier" models trained on the current models' predicted probabilities
+
+Each tier is a smaller XGBoost model, with fewer and shallower trees, fitted to
+the soft labels of the active (teacher) model. The soft labels are the
+teacher's predicted probabilities, used as binary:logistic targets. The
+transfer set is the training split of train_models.py (same cleaning, split and
+seed). It is encoded by the model's feature pipeline exactly as API requests
+are, so the student learns what the teacher does on served inputs. For
+cardiovascular that includes the API's days-to-years age conversion.
+
+Every tier is evaluated on the test split, which neither model was trained on.
+The report gives its ROC AUC, the AUC loss against the teacher, fidelity to the
+teacher (mean absolute probability difference, and agreement at 0.5), and
+latency per row on one thread. Latency is measured for single-row prediction,
+prediction in a 1,000-row batch and native TreeSHAP contributions in a batch.
+Each latency also gets its speedup over the teacher.
+
+A published tier is written to the registry as '<model>_fast'. The API serves
+it to callers that ask for ?tier=fast (see README, "Fast Tier").
+
+Usage:
+    python distill_models.py diabetes                                # report every tier
+    python distill_models.py cardiovascular --depths 2 3 --trees 20 50
+    python distill_models.py diabetes --publish 3x50                  # publish one tier as diabetes_fast
+    python distill_models.py diabetes --publish auto --max-auc-loss 0.002
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from dataset_cache import REFERENCE_DATASETS, load_dataset, widen_dtypes
+from hyperparameter_search import LATENCY_BATCH_ROWS, row_latency_us
+from model_registry import REGISTRY_DIR, load_active, publish, registry_name
+from train_models import LOADERS, SEED, TARGETS, clean_cardio, evaluate, split
+
+logger = logging.getLogger('distill_models')
+
+DEFAULT_DEPTHS = [2, 3, 4]
+DEFAULT_TREES = [20, 50]
+# Few trees need larger steps than the teacher's
+DEFAULT_LEARNING_RATE = 0.3
+# Largest test AUC loss against the teacher that --publish auto accepts
+DEFAULT_MAX_AUC_LOSS = 0.005
+
+
+def tier_label(max_depth: int, trees: int) -> str:
+    return f'{max_depth}x{trees}'
+
+
+def parse_tier(label: str) -> Tuple[int, int]:
+    """'3x50' -> (max_depth 3, 50 trees)"""
+    try:
+        max_depth, trees = (int(part) for part in label.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid tier {label!r}; expected DEPTHxTREES, e.g. 3x50")
+    return max_depth, trees
+
+
+def transfer_set(name: str, pipeline, seed: int = SEED) -> Dict[str, np.ndarray]:
+    """
+    The train/test split of train_models.py, encoded by the serving pipeline.
+
+    Returns:
+        dict: 'train' and 'test' float32 matrices plus 'y_train' and 'y_test'
+        labels, without the rows the pipeline rejects.
+    """
+    frame = load_dataset(name)
+    if name == 'cardiovascular':
+        frame = clean_cardio(frame)
+    # The pipeline expects values as JSON requests carry them
+    frame = widen_dtypes(frame)
+    y = frame.pop(TARGETS[name])
+    X_fit, X_val, X_test, y_fit, y_val, y_test = split(name, frame, y, seed)
+
+    data = {}
+    for part, X, labels in (('train', pd.concat([X_fit, X_val]), pd.concat([y_fit, y_val])),
+                            ('test', X_test, y_test)):
+        features, errors = pipeline.transform_frame(X)
+        valid = np.array([error is None for error in errors], dtype=bool)
+        data[part] = np.ascontiguousarray(features[valid], dtype=np.float32)
+        data[f'y_{part}'] = labels.to_numpy()[valid]
+    return data
+
+
+def booster_shape(booster) -> Dict[str, int]:
+    """Trees and maximum depth of a booster"""
+    config = json.loads(booster.save_config())
+    return {'trees': int(booster.num_boosted_rounds()),
+            'max_depth': int(config['learner']['gradient_booster']['tree_train_param']['max_depth'])}
+
+
+def contribution_latency_us(booster, X: np.ndarray, repeat: int = 3) -> float:
+    """Best-of-`repeat` native TreeSHAP time per row in a batch (the API's explain=native)"""
+    batch = xgb.DMatrix(X[:LATENCY_BATCH_ROWS], feature_names=booster.feature_names)
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        booster.predict(batch, pred_contribs=True)
+        best = min(best, (time.perf_counter() - started) / batch.num_row())
+    return round(best * 1e6, 2)
+
+
+def latency(model, X: np.ndarray) -> Dict[str, float]:
+    """Per-row latency of a model on one thread"""
+    booster = model.get_booster()
+    booster.set_param({'nthread': 1})
+    return {**row_latency_us(booster, X), 'contribs_us_per_row_batch': contribution_latency_us(booster, X)}
+
+
+def fidelity(teacher_proba: np.ndarray, student_proba: np.ndarray) -> Dict[str, float]:
+    """How closely the student reproduces the teacher's probabilities"""
+    return {'mean_abs_diff': round(float(np.mean(np.abs(student_proba - teacher_proba))), 5),
+            'agreement': round(float(np.mean((student_proba > 0.5) == (teacher_proba > 0.5))), 5)}
+
+
+def distill(train: np.ndarray, soft_labels: np.ndarray, feature_names: List[str], max_depth: int, trees: int,
+            learning_rate: float = DEFAULT_LEARNING_RATE, nthread: int = -1, seed: int = SEED):
+    """Fit a `trees` x `max_depth` student to the teacher's probabilities"""
+    params = {
+        'objective': 'binary:logistic',
+        'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'max_depth': max_depth,
+        'learning_rate': learning_rate,
+        'nthread': nthread,
+        'seed': seed
+    }
+    booster = xgb.train(params, xgb.DMatrix(train, label=soft_labels, feature_names=feature_names),
+                        num_boost_round=trees)
+    student = xgb.XGBClassifier()
+    student.load_model(bytearray(booster.save_raw('ubj')))
+    return student
+
+
+def run(name: str, tiers: List[Tuple[int, int]], learning_rate: float = DEFAULT_LEARNING_RATE,
+        nthread: int = -1, seed: int = SEED, registry_dir: str = REGISTRY_DIR) -> Tuple[Dict[str, Any], Dict[str, Any], Any]:
+    """
+    Distill every tier from the active model and evaluate it against the teacher.
+
+    Returns:
+        tuple: (report, student models keyed by tier label, teacher bundle)
+    """
+    teacher = load_active(name, registry_dir)
+    started = time.perf_counter()
+    data = transfer_set(name, teacher.pipeline, seed)
+    soft_train = teacher.model.predict_proba(data['train'])[:, 1]
+    teacher_test = teacher.model.predict_proba(data['test'])[:, 1]
+
+    report: Dict[str, Any] = {
+        'model': name,
+        'dataset': REFERENCE_DATASETS[name][0],
+        'rows': {'train': int(len(data['train'])), 'test': int(len(data['test']))},
+        'teacher': {'version': teacher.version, 'source': teacher.source,
+                    **booster_shape(teacher.model.get_booster()),
+                    'test_metrics': evaluate(teacher.model, data['test'], data['y_test']),
+                    **latency(teacher.model, data['test'])},
+        'learning_rate': learning_rate,
+        'load_seconds': round(time.perf_counter() - started, 3),
+        'tiers': []
+    }
+    teacher_auc = report['teacher']['test_metrics']['roc_auc']
+
+    students = {}
+    for max_depth, trees in tiers:
+        label = tier_label(max_depth, trees)
+        fit_started = time.perf_counter()
+        student = distill(data['train'], soft_train, teacher.feature_names, max_depth, trees,
+                          learning_rate, nthread, seed)
+        train_seconds = time.perf_counter() - fit_started
+        metrics = evaluate(student, data['test'], data['y_test'])
+        timing = latency(student, data['test'])
+        report['tiers'].append({
+            'tier': label,
+            'max_depth': max_depth,
+            'trees': trees,
+            'test_metrics': metrics,
+            'auc_loss': round(teacher_auc - metrics['roc_auc'], 5),
+            'fidelity': fidelity(teacher_test, student.predict_proba(data['test'])[:, 1]),
+            **timing,
+            'speedup': {key: round(report['teacher'][key] / timing[key], 1) for key in timing},
+            'train_seconds': round(train_seconds, 3)
+        })
+        students[label] = student
+        logger.info(f"{name} {label}: AUC {metrics['roc_auc']} (loss {report['tiers'][-1]['auc_loss']}), "
+                    f"{timing['latency_us_per_row_batch']} us/row in a batch")
+    return report, students, teacher
+
+
+def select_tier(report: Dict[str, Any], max_auc_loss: float = DEFAULT_MAX_AUC_LOSS) -> Optional[str]:
+    """The tier with the fastest batch prediction among those within `max_auc_loss` of the teacher"""
+    eligible = [tier for tier in report['tiers'] if tier['auc_loss'] <= max_auc_loss]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda tier: (tier['latency_us_per_row_batch'], -tier['test_metrics']['roc_auc']))['tier']
+
+
+def print_report(report: Dict[str, Any]):
+    teacher = report['teacher']
+    print(f"{report['model']}: teacher {teacher['version']} ({teacher['trees']} trees, depth {teacher['max_depth']}), "
+          f"test AUC {teacher['test_metrics']['roc_auc']:.5f}, "
+          f"{teacher['latency_us_single_row']:.1f} us/row single, {teacher['latency_us_per_row_batch']:.2f} us/row "
+          f"batch, {teacher['contribs_us_per_row_batch']:.2f} us/row SHAP")
+    print(f"{'tier':>6} {'test_auc':>8} {'auc_loss':>8} {'agree':>6} {'|dp|':>7} {'us/row':>7} {'speedup':>7} "
+          f"{'us/row@1k':>9} {'speedup':>7} {'shap@1k':>8} {'speedup':>7}")
+    for tier in report['tiers']:
+        speedup = tier['speedup']
+        print(f"{tier['tier']:>6} {tier['test_metrics']['roc_auc']:>8.5f} {tier['auc_loss']:>8.5f} "
+              f"{tier['fidelity']['agreement']:>6.3f} {tier['fidelity']['mean_abs_diff']:>7.4f} "
+              f"{tier['latency_us_single_row']:>7.1f} {speedup['latency_us_single_row']:>6.1f}x "
+              f"{tier['latency_us_per_row_batch']:>9.2f} {speedup['latency_us_per_row_batch']:>6.1f}x "
+              f"{tier['contribs_us_per_row_batch']:>8.2f} {speedup['contribs_us_per_row_batch']:>6.1f}x")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Distill fast-tier models from the active models')
+    parser.add_argument('model', choices=list(LOADERS))
+    parser.add_argument('--depths', type=int, nargs='+', default=DEFAULT_DEPTHS, help='Tree depths to try')
+    parser.add_argument('--trees', type=int, nargs='+', default=DEFAULT_TREES, help='Tree counts to try')
+    parser.add_argument('--learning-rate', type=float, default=DEFAULT_LEARNING_RATE)
+    parser.add_argument('--nthread', type=int, default=-1, help='XGBoost training threads (-1 = all cores)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    parser.add_argument('--publish', default=None, metavar='TIER',
+                        help="Publish this tier (e.g. 3x50) as <model>_fast, or 'auto' for the fastest tier "
+                             "within --max-auc-loss")
+    parser.add_argument('--max-auc-loss', type=float, default=DEFAULT_MAX_AUC_LOSS)
+    parser.add_argument('--version', default=None, help='Registry version name (default: UTC timestamp)')
+    parser.add_argument('--output', default=None, help='Also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    tiers = [(max_depth, trees) for max_depth in args.depths for trees in args.trees]
+    if args.publish not in (None, 'auto'):
+        try:
+            tiers = sorted(set(tiers) | {parse_tier(args.publish)})
+        except ValueError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    report, students, teacher = run(args.model, tiers, args.learning_rate, args.nthread, args.seed, args.registry_dir)
+    print_report(report)
+
+    published = True
+    if args.publish is not None:
+        label = select_tier(report, args.max_auc_loss) if args.publish == 'auto' else tier_label(*parse_tier(args.publish))
+        if label is None:
+            logger.error(f"No tier is within {args.max_auc_loss} test AUC of the teacher; nothing published")
+            published = False
+        else:
+            distillation = {'teacher_version': report['teacher']['version'], 'dataset': report['dataset'],
+                            'rows': report['rows'], 'learning_rate': report['learning_rate'],
+                            'teacher_test_metrics': report['teacher']['test_metrics'],
+                            **next(tier for tier in report['tiers'] if tier['tier'] == label)}
+            report['published'] = {
+                'tier': label,
+                'version': publish(registry_name(args.model, 'fast'), students[label], list(teacher.feature_names),
+                                   teacher.encoders, args.registry_dir, args.version,
+                                   extra={'distillation': distillation})
+            }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if not published:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
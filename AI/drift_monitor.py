@@ -0,0 +1,412 @@
+"""
+MedAssist Drift Monitor
+Constant-memory input drift detection against the training distributions
+
+For every model feature, the reference histogram is computed once from the
+model's dataset in dataset/ (after the notebook's outlier filter), encoded by
+the model's feature pipeline exactly as live requests are. Each feature gets
+DRIFT_BINS bins. Features with that many or fewer distinct values (gender,
+cholesterol, smoking) get one bin per value, the others get bins at the
+reference deciles. Reference histograms are
+stored as drift_reference_<model>.json next to the models. They are
+recomputed only when the feature layout or the bin count change, or when the
+dataset is on disk and its contents changed. Serving does not need dataset/.
+
+Every prediction request adds its encoded rows to the live histograms of its
+model. Each process keeps a fixed (features x bins) count array per time window
+and updates it in place. That costs one vectorized comparison and one indexed
+increment per request, under a microsecond per feature, and the memory
+does not depend on traffic. There are two windows of DRIFT_WINDOW_SECONDS. The
+older one is cleared when the current one fills, so scores cover the last one
+to two windows.
+
+Counts add up across processes. With DRIFT_STATE_DIR set (to a directory
+shared by the gunicorn workers), each worker writes its counts there every
+DRIFT_PUBLISH_SECONDS, and /model/drift merges all workers' counts. Per
+feature the report gives the population stability index (PSI) and the
+Kolmogorov-Smirnov distance between the binned distributions. It also gives
+the live minimum and maximum. PSI below 0.1 is read as stable, 0.1-0.25 as
+moderate drift and above 0.25 as significant drift.
+
+Usage:
+    python drift_monitor.py              # precompute the reference histograms of both models
+    python drift_monitor.py --force
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from dataset_cache import DATASET_DIR, REFERENCE_DATASETS
+from feature_pipeline import shortest_decimal
+from model_store import MODEL_DIR, file_checksum
+
+logger = logging.getLogger(__name__)
+
+DRIFT_BINS = int(os.getenv('DRIFT_BINS', '10'))
+DRIFT_WINDOW_SECONDS = float(os.getenv('DRIFT_WINDOW_SECONDS', '3600'))
+DRIFT_PUBLISH_SECONDS = float(os.getenv('DRIFT_PUBLISH_SECONDS', '30'))
+# Rows needed in the live window before a feature gets a drift status
+DRIFT_MIN_ROWS = int(os.getenv('DRIFT_MIN_ROWS', '100'))
+DRIFT_STATE_DIR = os.getenv('DRIFT_STATE_DIR')
+
+# PSI above which drift is moderate and significant
+PSI_THRESHOLDS = (0.1, 0.25)
+# Floor for bin proportions, so an empty bin does not make PSI infinite
+PSI_EPSILON = 1e-4
+
+
+def reference_path(name: str, model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, f'drift_reference_{name}.json')
+
+
+def dataset_checksum(name: str, dataset_dir: str = DATASET_DIR) -> str:
+    return file_checksum(os.path.join(dataset_dir, REFERENCE_DATASETS[name][0]))
+
+
+def bin_edges(values: np.ndarray, bins: int = DRIFT_BINS) -> np.ndarray:
+    """
+    Inner bin edges of one feature, padded with +inf to bins - 1 entries.
+
+    A value falls into the bin numbered by how many edges are <= the value.
+    """
+    distinct = np.unique(values)
+    if len(distinct) <= bins:
+        # One bin per value, split halfway between neighbours
+        edges = (distinct[:-1] + distinct[1:]) / 2
+    else:
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+    return np.concatenate([edges, np.full(bins - 1 - len(edges), np.inf)]).astype(np.float32)
+
+
+def histogram_counts(features: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """(features x bins) counts of a feature matrix"""
+    n_features, bins = edges.shape[0], edges.shape[1] + 1
+    index = np.empty(features.shape, dtype=np.intp)
+    for j in range(n_features):
+        index[:, j] = np.searchsorted(edges[j], features[:, j], side='right') + j * bins
+    return np.bincount(index.ravel(), minlength=n_features * bins).reshape(n_features, bins)
+
+
+def compute_reference(name: str, pipeline, feature_names: List[str], bins: int = DRIFT_BINS,
+                      dataset_dir: str = DATASET_DIR) -> Dict[str, Any]:
+    """Encode a model's whole dataset through its pipeline and histogram every feature"""
+    from global_explanations import load_reference_sample
+
+    started = time.perf_counter()
+    frame = load_reference_sample(name, sample_size=10 ** 9)
+    features, errors = pipeline.transform_frame(frame)
+    features = features[np.array([error is None for error in errors], dtype=bool)]
+
+    edges = np.vstack([bin_edges(features[:, j], bins) for j in range(features.shape[1])])
+    return {
+        'model': name,
+        'dataset': REFERENCE_DATASETS[name][0],
+        'dataset_sha256': dataset_checksum(name, dataset_dir),
+        'feature_names': list(feature_names),
+        'bins': bins,
+        'rows': int(len(features)),
+        'edges': [[as_float(edge) for edge in row] for row in edges],
+        'counts': histogram_counts(features, edges).tolist(),
+        'min': [as_float(value) for value in features.min(axis=0)],
+        'max': [as_float(value) for value in features.max(axis=0)],
+        'computed_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'compute_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _is_current(reference: Optional[Dict[str, Any]], name: str, feature_names: List[str], bins: int,
+                dataset_dir: str) -> bool:
+    """A stored reference matches the model's features and bins, and the dataset when it is on disk"""
+    if (reference is None or reference.get('bins') != bins
+            or reference.get('feature_names') != list(feature_names)
+            or np.shape(reference.get('edges')) != (len(feature_names), bins - 1)
+            or np.shape(reference.get('counts')) != (len(feature_names), bins)):
+        return False
+    # Serving may run without dataset/; the committed reference is then trusted as is
+    if not os.path.exists(os.path.join(dataset_dir, REFERENCE_DATASETS[name][0])):
+        return True
+    return reference.get('dataset_sha256') == dataset_checksum(name, dataset_dir)
+
+
+def get_reference(name: str, pipeline, feature_names: List[str], bins: int = DRIFT_BINS, force: bool = False,
+                  model_dir: str = MODEL_DIR, dataset_dir: str = DATASET_DIR) -> Dict[str, Any]:
+    """Return a model's reference histograms from disk, or compute and save them"""
+    path = reference_path(name, model_dir)
+    reference = None
+    if not force and os.path.exists(path):
+        with open(path, 'r') as f:
+            reference = json.load(f)
+
+    if not _is_current(reference, name, feature_names, bins, dataset_dir):
+        reference = compute_reference(name, pipeline, feature_names, bins, dataset_dir)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(reference, f, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Drift reference for {name} computed in {reference['compute_seconds']}s")
+    return reference
+
+
+def as_float(value) -> Optional[float]:
+    """A float32 feature value for JSON (None for infinity)"""
+    return float(shortest_decimal(value)) if np.isfinite(value) else None
+
+
+def drift_scores(reference: np.ndarray, live: np.ndarray) -> Dict[str, float]:
+    """PSI and KS distance between two histograms over the same bins"""
+    p_ref = np.maximum(reference / max(reference.sum(), 1), PSI_EPSILON)
+    p_live = np.maximum(live / max(live.sum(), 1), PSI_EPSILON)
+    psi = float(np.sum((p_live - p_ref) * np.log(p_live / p_ref)))
+    ks = float(np.max(np.abs(np.cumsum(reference) / max(reference.sum(), 1) - np.cumsum(live) / max(live.sum(), 1))))
+    return {'psi': round(psi, 4), 'ks': round(ks, 4)}
+
+
+def drift_status(psi: float) -> str:
+    moderate, significant = PSI_THRESHOLDS
+    return 'significant' if psi > significant else 'moderate' if psi > moderate else 'stable'
+
+
+class FeatureSketch:
+    """Live per-feature histograms of one model in two rotating windows, updated in place"""
+
+    def __init__(self, edges: np.ndarray, window_seconds: float = DRIFT_WINDOW_SECONDS):
+        self.edges = np.ascontiguousarray(edges, dtype=np.float32)
+        self.n_features, self.bins = edges.shape[0], edges.shape[1] + 1
+        self.window_seconds = window_seconds
+        # [current, previous] window: flat (features x bins) counts, row count, per-feature min and max
+        self._counts = np.zeros((2, self.n_features * self.bins), dtype=np.int64)
+        self._rows = [0, 0]
+        self._min = np.full((2, self.n_features), np.inf, dtype=np.float32)
+        self._max = np.full((2, self.n_features), -np.inf, dtype=np.float32)
+        self._current = 0
+        self._window_started = time.monotonic()
+        # Per-window views and scratch space of the single-row path, so it allocates no arrays
+        self._window_counts = [self._counts[0], self._counts[1]]
+        self._window_min = [self._min[0], self._min[1]]
+        self._window_max = [self._max[0], self._max[1]]
+        self._above = np.empty(self.edges.shape, dtype=bool)
+        self._index = np.empty(self.n_features, dtype=np.intp)
+        self._offsets = np.arange(self.n_features, dtype=np.intp) * self.bins
+        self._lock = threading.Lock()
+
+    def _rotate(self, now: float):
+        """Start a new window; clear both after an idle period longer than two windows"""
+        rotations = 2 if now - self._window_started >= 2 * self.window_seconds else 1
+        for _ in range(rotations):
+            self._current ^= 1
+            self._counts[self._current] = 0
+            self._rows[self._current] = 0
+            self._min[self._current] = np.inf
+            self._max[self._current] = -np.inf
+        self._window_started = now
+
+    def observe(self, features: np.ndarray):
+        """Add encoded rows (float32, in the model's column order) to the current window"""
+        if not len(features):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_started >= self.window_seconds:
+                self._rotate(now)
+            current = self._current
+            if len(features) == 1:
+                row = features[0]
+                np.greater_equal(row[:, None], self.edges, out=self._above)
+                self._above.sum(axis=1, out=self._index)
+                self._index += self._offsets
+                self._window_counts[current][self._index] += 1
+                np.minimum(self._window_min[current], row, out=self._window_min[current])
+                np.maximum(self._window_max[current], row, out=self._window_max[current])
+            else:
+                self._counts[current] += histogram_counts(features, self.edges).ravel()
+                np.minimum(self._min[current], features.min(axis=0), out=self._min[current])
+                np.maximum(self._max[current], features.max(axis=0), out=self._max[current])
+            self._rows[current] += len(features)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts, rows, minimum and maximum over both windows"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_started >= self.window_seconds:
+                self._rotate(now)
+            return {
+                'rows': sum(self._rows),
+                'counts': self._counts.sum(axis=0).reshape(self.n_features, self.bins),
+                'min': self._min.min(axis=0),
+                'max': self._max.max(axis=0)
+            }
+
+
+class DriftMonitor:
+    """Live feature histograms per model, their merge across workers and the drift report"""
+
+    def __init__(self, bins: int = DRIFT_BINS, window_seconds: float = DRIFT_WINDOW_SECONDS,
+                 min_rows: int = DRIFT_MIN_ROWS, state_dir: Optional[str] = DRIFT_STATE_DIR,
+                 publish_seconds: float = DRIFT_PUBLISH_SECONDS, model_dir: str = MODEL_DIR):
+        self.bins = bins
+        self.window_seconds = window_seconds
+        self.min_rows = min_rows
+        self.state_dir = state_dir
+        self.publish_seconds = publish_seconds
+        self.model_dir = model_dir
+        self._sketches: Dict[str, FeatureSketch] = {}
+        self._references: Dict[str, Dict[str, Any]] = {}
+        self._preparing = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def prepare(self, name: str, pipeline, feature_names: List[str]):
+        """Load (or compute) a model's reference and create its live sketch"""
+        reference = get_reference(name, pipeline, feature_names, self.bins, model_dir=self.model_dir)
+        edges = np.array([[np.inf if edge is None else edge for edge in row] for row in reference['edges']],
+                         dtype=np.float32)
+        self._references[name] = reference
+        self._sketches[name] = FeatureSketch(edges, self.window_seconds)
+
+    def observe(self, bundle, features: np.ndarray):
+        """Record a request's encoded rows; the first call for a model prepares it in the background"""
+        sketch = self._sketches.get(bundle.name)
+        if sketch is not None:
+            sketch.observe(features)
+            return
+        with self._lock:
+            if bundle.name in self._preparing:
+                return
+            self._preparing.add(bundle.name)
+
+        def prepare():
+            try:
+                self.prepare(bundle.name, bundle.pipeline, bundle.feature_names)
+            except Exception as e:
+                logger.error(f"Could not prepare drift monitoring for {bundle.name}: {str(e)}")
+                # Let a later request try again
+                with self._lock:
+                    self._preparing.discard(bundle.name)
+
+        threading.Thread(target=prepare, name=f'drift-{bundle.name}', daemon=True).start()
+
+    def _state_path(self, name: str, pid: int) -> str:
+        return os.path.join(self.state_dir, f'{name}.{pid}.json')
+
+    def publish(self):
+        """Write this process's counts to the shared state directory"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        for name, sketch in list(self._sketches.items()):
+            snapshot = sketch.snapshot()
+            state = {'pid': os.getpid(), 'written_at': time.time(), 'rows': snapshot['rows'],
+                     'counts': snapshot['counts'].tolist(),
+                     'min': snapshot['min'].tolist(), 'max': snapshot['max'].tolist()}
+            path = self._state_path(name, os.getpid())
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+
+    def merged(self, name: str) -> Dict[str, Any]:
+        """This process's live counts plus the recent counts other workers published"""
+        merged = self._sketches[name].snapshot()
+        workers = 1
+        if self.state_dir:
+            oldest = time.time() - 2 * self.window_seconds
+            for path in glob.glob(os.path.join(self.state_dir, f'{glob.escape(name)}.*.json')):
+                if path == self._state_path(name, os.getpid()):
+                    continue
+                try:
+                    with open(path, 'r') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                counts = np.asarray(state['counts'], dtype=np.int64)
+                if state['written_at'] < oldest or counts.shape != merged['counts'].shape:
+                    continue
+                merged['counts'] = merged['counts'] + counts
+                merged['rows'] += state['rows']
+                merged['min'] = np.minimum(merged['min'], np.asarray(state['min'], dtype=np.float32))
+                merged['max'] = np.maximum(merged['max'], np.asarray(state['max'], dtype=np.float32))
+                workers += 1
+        merged['workers'] = workers
+        return merged
+
+    def report(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """PSI and KS per feature of every prepared model, on the merged live counts"""
+        models = {}
+        for name in names or list(self._sketches):
+            if name not in self._sketches:
+                models[name] = {'status': 'preparing' if name in self._preparing else 'no traffic yet'}
+                continue
+            reference = self._references[name]
+            live = self.merged(name)
+            reference_counts = np.asarray(reference['counts'], dtype=np.int64)
+            enough = live['rows'] >= self.min_rows
+            features = []
+            for j, feature in enumerate(reference['feature_names']):
+                entry = {'feature': feature, **drift_scores(reference_counts[j], live['counts'][j])}
+                entry['status'] = drift_status(entry['psi']) if enough else 'insufficient data'
+                entry['live_min'] = as_float(live['min'][j])
+                entry['live_max'] = as_float(live['max'][j])
+                entry['reference_min'] = reference['min'][j]
+                entry['reference_max'] = reference['max'][j]
+                features.append(entry)
+            features.sort(key=lambda entry: -entry['psi'])
+            models[name] = {
+                'rows': live['rows'],
+                'workers': live['workers'],
+                'reference_rows': reference['rows'],
+                'max_psi': features[0]['psi'] if features else 0.0,
+                'drifted': [entry['feature'] for entry in features if entry['status'] in ('moderate', 'significant')],
+                'features': features
+            }
+        return {'window_seconds': self.window_seconds, 'bins': self.bins, 'min_rows': self.min_rows,
+                'thresholds': {'moderate': PSI_THRESHOLDS[0], 'significant': PSI_THRESHOLDS[1]}, 'models': models}
+
+    def start(self):
+        """Publish this process's counts every publish_seconds (only with a shared state directory)"""
+        if not self.state_dir or self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.publish_seconds):
+                try:
+                    self.publish()
+                except Exception as e:
+                    logger.error(f"Drift state publish failed: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='drift-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def main(argv: Optional[List[str]] = None):
+    from model_store import load_bundle
+
+    parser = argparse.ArgumentParser(description='Precompute the drift reference histograms of the models')
+    parser.add_argument('--bins', type=int, default=DRIFT_BINS)
+    parser.add_argument('--force', action='store_true', help='Recompute even if the stored reference is current')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for name in REFERENCE_DATASETS:
+        bundle = load_bundle(name)
+        reference = get_reference(name, bundle.pipeline, bundle.feature_names, args.bins, force=args.force)
+        logger.info(f"{name}: {reference['rows']} reference rows, {len(reference['feature_names'])} features, "
+                    f"{reference['bins']} bins")
+
+
+if __name__ == '__main__':
+    main()
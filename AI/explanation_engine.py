@@ -0,0 +1,76 @@
+"""
+MedAssist Explanation Engine
+Selectable per-feature contribution backends for the XGBoost models
+
+Modes:
+- exact:  TreeSHAP through shap.TreeExplainer (the original behaviour)
+- native: XGBoost's built-in TreeSHAP (Booster.predict with pred_contribs=True),
+          numerically the same values without needing shap at request time
+- approx: Saabas-style approximate contributions (approx_contribs=True), which
+          only walk each tree's decision path and are several times cheaper
+- none:   no explanation at all, for callers that only need the risk score
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import numpy as np
+import xgboost as xgb
+
+EXPLAIN_MODES = ('exact', 'native', 'approx', 'none')
+DEFAULT_EXPLAIN_MODE = os.getenv('DEFAULT_EXPLAIN_MODE', 'exact')
+
+
+class ExplanationEngine:
+    """Compute per-feature contributions for one model in the requested mode"""
+
+    def __init__(self, model: Any, explainer_factory: Optional[Callable[[Any], Any]] = None):
+        self.model = model
+        self.booster = model.get_booster()
+        self.feature_names = self.booster.feature_names
+        # Builds the shap.TreeExplainer on first use; None when shap is not installed
+        self._explainer_factory = explainer_factory
+        self._explainer = None
+        self._lock = threading.Lock()
+        self.explainer_seconds: Optional[float] = None
+
+    @property
+    def explainer(self) -> Any:
+        """The shap.TreeExplainer, built (and shap imported) on first access"""
+        if self._explainer is None and self._explainer_factory is not None:
+            with self._lock:
+                if self._explainer is None:
+                    started = time.perf_counter()
+                    self._explainer = self._explainer_factory(self.model)
+                    self.explainer_seconds = time.perf_counter() - started
+        return self._explainer
+
+    def resolve_mode(self, mode: str) -> str:
+        """Return the mode that will actually be used for a requested mode"""
+        if mode == 'exact' and self._explainer_factory is None:
+            # XGBoost's own TreeSHAP gives the same values as shap.TreeExplainer
+            return 'native'
+        return mode
+
+    def contributions(self, features: np.ndarray, mode: str) -> Optional[np.ndarray]:
+        """
+        Compute contributions for a feature matrix.
+
+        Returns:
+            np.ndarray of shape (rows, features) in log-odds units, or None for mode 'none'.
+        """
+        mode = self.resolve_mode(mode)
+
+        if mode == 'none':
+            return None
+
+        if mode == 'exact':
+            return self.explainer.shap_values(features)
+
+        dmatrix = xgb.DMatrix(features, feature_names=self.feature_names)
+        contribs = self.booster.predict(dmatrix, pred_contribs=True,
+                                        approx_contribs=(mode == 'approx'))
+        # The last column is the bias term (expected value), not a feature
+        return contribs[:, :-1]
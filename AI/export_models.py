@@ -0,0 +1,84 @@
+"""
+MedAssist Model Export
+Convert the pickled training artifacts to XGBoost's native model format
+
+Writes each model as UBJ (or JSON) next to the pickles, together with
+model_manifest.json recording the file checksum, the checksum of the pickle it
+was exported from, the feature names and the diabetes label encoder classes.
+The API then loads the native files (checking the checksum) instead of
+unpickling, which is faster and does not depend on the XGBoost and
+scikit-learn versions the pickles were written with.
+
+Usage:
+    python export_models.py              # UBJ (smallest, fastest to load)
+    python export_models.py --format json
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import xgboost as xgb
+
+from model_store import MANIFEST_FILE, MODEL_DIR, PICKLE_FILES, file_checksum, load_pickle
+
+logger = logging.getLogger('export_models')
+
+EXPORT_FILES = {
+    'cardiovascular': 'xgboost_model',
+    'diabetes': 'diabetes_xgboost_model'
+}
+
+
+def export_model(name: str, fmt: str, model_dir: str = MODEL_DIR) -> Dict[str, Any]:
+    """Export one pickled model and return its manifest entry"""
+    bundle = load_pickle(name, model_dir)
+    filename = f"{EXPORT_FILES[name]}.{fmt}"
+    path = os.path.join(model_dir, filename)
+    bundle.model.save_model(path)
+
+    # The exported model must score exactly like the pickle it came from
+    reloaded = xgb.XGBClassifier()
+    reloaded.load_model(path)
+    probe = np.random.default_rng(0).uniform(0, 200, size=(256, len(bundle.feature_names)))
+    if not np.array_equal(reloaded.predict_proba(probe), bundle.model.predict_proba(probe)):
+        raise RuntimeError(f"Exported {name} model does not reproduce the pickle's predictions")
+
+    entry = {
+        'file': filename,
+        'format': fmt,
+        'sha256': file_checksum(path, length=None),
+        'source': PICKLE_FILES[name]['model'],
+        'source_sha256': file_checksum(os.path.join(model_dir, PICKLE_FILES[name]['model']), length=None),
+        'feature_names': list(bundle.feature_names),
+        'xgboost_version': xgb.__version__,
+        'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+    }
+    if bundle.encoders:
+        entry['label_classes'] = {key: [str(c) for c in encoder.classes_]
+                                  for key, encoder in bundle.encoders.items()}
+
+    logger.info(f"{name}: {PICKLE_FILES[name]['model']} -> {filename} ({os.path.getsize(path):,} bytes)")
+    return entry
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Export the models to XGBoost native format')
+    parser.add_argument('--format', default='ubj', choices=['ubj', 'json'])
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    manifest = {'models': {name: export_model(name, args.format, args.model_dir) for name in EXPORT_FILES}}
+
+    with open(os.path.join(args.model_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Wrote {MANIFEST_FILE}")
+
+
+if __name__ == '__main__':
+    main()
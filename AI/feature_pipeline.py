@@ -0,0 +1,286 @@
+"""
+MedAssist Feature Pipeline
+Compiled per-model feature encoding shared by every scoring path
+
+A FeaturePipeline is built once per model when the model is loaded. It fixes
+the model's column layout, turns the fitted label encoders into plain
+category-to-code lookup tables and holds the column rules (such as the
+days-to-years age heuristic). The single-patient, batch and bulk paths all
+encode through it, so they can never disagree on how a patient is turned into
+a feature row.
+
+Rows are validated one by one (a bad row only fails itself), the column rules
+run once over the whole matrix, and the result is written into a
+preallocated float32 array, the precision XGBoost scores in.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CARDIO_FEATURE_NAMES = ['age', 'gender', 'height', 'weight', 'ap_hi', 'ap_lo',
+                        'cholesterol', 'gluc', 'smoke', 'alco', 'active']
+
+DIABETES_REQUIRED_FIELDS = ['age', 'gender', 'hypertension', 'heart_disease',
+                            'smoking_history', 'bmi', 'HbA1c_level', 'blood_glucose_level']
+
+VALID_GENDERS = ['Female', 'Male', 'Other']
+VALID_SMOKING = ['never', 'No Info', 'current', 'former', 'ever', 'not current']
+
+
+class ValidationError(ValueError):
+    """Raised when a patient record fails input validation (HTTP 400)"""
+
+
+def shortest_decimal(values) -> np.ndarray:
+    """
+    float64 values of float32 features as the decimals they were parsed from.
+
+    float32 cannot hold most decimals exactly (6.2 is stored as 6.199999809...).
+    Each value is taken at the shortest decimal that reads back to the same float32,
+    which is how the value was written in the request or the CSV.
+    """
+    return np.asarray(values, dtype=np.float32).astype(str).astype(np.float64)
+
+
+def age_in_years(age: np.ndarray):
+    """Ages above 150 are taken as days (as in cardio_train.csv) and converted to years, in place"""
+    np.divide(age, 365.25, out=age, where=age > 150)
+
+
+class Column:
+    """One model feature: the input field it comes from and how it is encoded"""
+
+    def __init__(self, feature: str, field: Optional[str] = None, codes: Optional[Dict[str, int]] = None,
+                 error: Optional[str] = None, rule: Optional[Callable[[np.ndarray], None]] = None,
+                 positive: bool = False):
+        self.feature = feature
+        self.field = field or feature
+        # Category -> code lookup table for categorical fields, None for numeric ones
+        self.codes = codes
+        self.error = error
+        # Vectorized in-place transform applied to the whole column after validation
+        self.rule = rule
+        self.positive = positive
+
+
+class FeaturePipeline:
+    """Validate patient records and encode them into a model's float32 feature matrix"""
+
+    def __init__(self, name: str, columns: List[Column], required_fields: List[str],
+                 derive: Optional[Callable[[np.ndarray], List[Dict[str, float]]]] = None):
+        self.name = name
+        self.columns = columns
+        self.feature_names = [column.feature for column in columns]
+        self.required_fields = required_fields
+        self._derive = derive
+
+        # Categorical columns are checked first so their messages take precedence
+        self._categorical = [(j, c.field, c.codes, c.error) for j, c in enumerate(columns) if c.codes is not None]
+        self._numeric = [(j, c.field, c.positive) for j, c in enumerate(columns) if c.codes is None]
+        self._numeric_fields = [c.field for c in columns if c.codes is None]
+        self._positive = [(k, c.field) for k, c in enumerate(c for c in columns if c.codes is None) if c.positive]
+        self._rules = [(j, c.rule) for j, c in enumerate(columns) if c.rule is not None]
+
+    def _encode_record(self, data: Any) -> List[float]:
+        """Validate one record and return its feature row before the column rules"""
+        if not isinstance(data, dict) or not data:
+            raise ValidationError('No JSON data provided')
+
+        missing_fields = [field for field in self.required_fields if field not in data]
+        if missing_fields:
+            raise ValidationError(f'Missing required fields: {missing_fields}')
+
+        codes_found = []
+        for j, field, codes, error in self._categorical:
+            value = data[field]
+            code = codes.get(value) if isinstance(value, str) else None
+            if code is None:
+                raise ValidationError(error)
+            codes_found.append((j, code))
+
+        try:
+            row = [float(data[field]) for field in self._numeric_fields]
+        except (TypeError, ValueError):
+            for field in self._numeric_fields:
+                try:
+                    float(data[field])
+                except (TypeError, ValueError):
+                    raise ValidationError(f"Field '{field}' must be numeric")
+            raise
+        for k, field in self._positive:
+            if not row[k] > 0:
+                raise ValidationError(f"Field '{field}' must be greater than 0")
+
+        # Categorical codes go into their columns in ascending order
+        for j, code in codes_found:
+            row.insert(j, code)
+        return row
+
+    def _finish(self, staging: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        """Apply the column rules in float64, then write the rows into the float32 output"""
+        for j, rule in self._rules:
+            rule(staging[:, j])
+
+        if out is None:
+            return staging.astype(np.float32)
+        out[:len(staging)] = staging
+        return out[:len(staging)]
+
+    def transform(self, records: List[Any], out: Optional[np.ndarray] = None,
+                  timings: Optional[Dict[str, float]] = None
+                  ) -> Tuple[np.ndarray, List[int], List[Dict[str, float]], List[Optional[Exception]]]:
+        """
+        Encode one or many patient records.
+
+        Args:
+            records: Request bodies, one per patient.
+            out: Optional preallocated float32 array with at least len(records) rows.
+            timings: Optional dict that receives the seconds spent in 'validation'
+                (per-record checks) and 'encoding' (building the matrix).
+
+        Returns:
+            tuple: (features, positions, derived, errors) where features holds the
+            valid rows in order, positions maps each of them back to its index in
+            records, derived holds per-row values for the response (such as BMI),
+            and errors holds None or the ValidationError for every record.
+        """
+        started = time.perf_counter()
+        errors: List[Optional[Exception]] = [None] * len(records)
+        rows, positions = [], []
+
+        for i, data in enumerate(records):
+            try:
+                rows.append(self._encode_record(data))
+                positions.append(i)
+            except ValidationError as e:
+                errors[i] = e
+
+        validated = time.perf_counter()
+        staging = np.array(rows, dtype=float).reshape(len(rows), len(self.columns))
+        features = self._finish(staging, out)
+        derived = self._derive(staging) if self._derive is not None else [{} for _ in rows]
+
+        if timings is not None:
+            timings['validation'] = validated - started
+            timings['encoding'] = time.perf_counter() - validated
+
+        return features, positions, derived, errors
+
+    def transform_frame(self, frame: pd.DataFrame, out: Optional[np.ndarray] = None
+                        ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Encode a table of patients column by column.
+
+        Returns:
+            tuple: (features, errors) where features has one row per input row
+            (NaN in invalid rows) and errors holds None for valid rows or the
+            reason a row is invalid.
+        """
+        missing_fields = [field for field in self.required_fields if field not in frame.columns]
+        if missing_fields:
+            raise ValidationError(f'Missing required fields: {missing_fields}')
+
+        staging = np.empty((len(frame), len(self.columns)), dtype=float)
+        for j, field, _ in self._numeric:
+            staging[:, j] = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=float)
+        numeric_invalid = np.isnan(staging[:, [j for j, _, _ in self._numeric]]).any(axis=1)
+        for j, field, positive in self._numeric:
+            if positive:
+                numeric_invalid |= ~(staging[:, j] > 0)
+
+        errors: List[Optional[str]] = [None] * len(frame)
+        for j, field, codes, error in self._categorical:
+            staging[:, j] = frame[field].map(codes).to_numpy(dtype=float)
+            for i in np.flatnonzero(np.isnan(staging[:, j])):
+                errors[i] = errors[i] or error
+        for i in np.flatnonzero(numeric_invalid):
+            errors[i] = 'Missing or non-numeric values'
+
+        return self._finish(staging, out), errors
+
+    def transform_grid(self, record: Any, axes: List[Tuple[str, List[Any]]]) -> np.ndarray:
+        """
+        Encode one record with some of its fields swept over lists of values.
+
+        Args:
+            record: The base patient; every field not swept keeps its value.
+            axes: (field, values) pairs. Numeric fields take numbers, categorical
+                fields take category labels.
+
+        Returns:
+            np.ndarray: float32 matrix with one row per grid point, in row-major
+            (first axis slowest) order, after the column rules.
+        """
+        base = self._encode_record(record)
+        columns = {column.field: (j, column) for j, column in enumerate(self.columns)}
+
+        axis_columns, axis_values = [], []
+        for field, values in axes:
+            if field not in columns:
+                raise ValidationError(f"Field '{field}' cannot be swept. Must be one of: {list(columns)}")
+            j, column = columns[field]
+            if column.codes is not None:
+                codes = [column.codes.get(value) if isinstance(value, str) else None for value in values]
+                if any(code is None for code in codes):
+                    raise ValidationError(column.error)
+                encoded = np.array(codes, dtype=float)
+            else:
+                try:
+                    encoded = np.array(values, dtype=float)
+                except (TypeError, ValueError):
+                    raise ValidationError(f"Values of '{field}' must be numeric")
+                if not np.isfinite(encoded).all():
+                    raise ValidationError(f"Values of '{field}' must be finite")
+                if column.positive and not (encoded > 0).all():
+                    raise ValidationError(f"Values of '{field}' must be greater than 0")
+            axis_columns.append(j)
+            axis_values.append(encoded)
+
+        staging = np.tile(np.array(base, dtype=float), (int(np.prod([len(v) for v in axis_values])), 1))
+        for j, grid in zip(axis_columns, np.meshgrid(*axis_values, indexing='ij')):
+            staging[:, j] = grid.ravel()
+        return self._finish(staging, None)
+
+
+def encoder_codes(encoder: Any) -> Dict[str, int]:
+    """Category -> code lookup table with the fitted encoder's class order"""
+    return {str(label): code for code, label in enumerate(encoder.classes_)}
+
+
+def cardio_derivations(feature_names: List[str]) -> Callable[[np.ndarray], List[Dict[str, float]]]:
+    """Per-row age in years and BMI for the cardiovascular response"""
+    age, height, weight = (feature_names.index(field) for field in ('age', 'height', 'weight'))
+
+    def derive(staging: np.ndarray) -> List[Dict[str, float]]:
+        return [{'age_years': row[age], 'bmi': row[weight] / (row[height] / 100) ** 2}
+                for row in staging.tolist()]
+
+    return derive
+
+
+def build_pipeline(name: str, feature_names: List[str], encoders: Dict[str, Any]) -> FeaturePipeline:
+    """Compile the feature pipeline for one model from its feature order and label encoders"""
+    if name == 'cardiovascular':
+        columns = {
+            'age': Column('age', rule=age_in_years),
+            'height': Column('height', positive=True)
+        }
+        pipeline = FeaturePipeline(name, [columns.get(f) or Column(f) for f in feature_names],
+                                   CARDIO_FEATURE_NAMES, cardio_derivations(feature_names))
+    elif name == 'diabetes':
+        columns = {
+            'gender_encoded': Column('gender_encoded', 'gender', encoder_codes(encoders['gender_encoder']),
+                                     f'Invalid gender. Must be one of: {VALID_GENDERS}'),
+            'smoking_encoded': Column('smoking_encoded', 'smoking_history',
+                                      encoder_codes(encoders['smoking_encoder']),
+                                      f'Invalid smoking_history. Must be one of: {VALID_SMOKING}')
+        }
+        pipeline = FeaturePipeline(name, [columns.get(f) or Column(f) for f in feature_names],
+                                   DIABETES_REQUIRED_FIELDS)
+    else:
+        raise ValueError(f'No feature pipeline defined for model {name!r}')
+
+    return pipeline
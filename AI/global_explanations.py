@@ -0,0 +1,280 @@
+"""
+MedAssist Global Explanations
+Model-wide SHAP summaries computed over a reference sample of the training data
+
+For each model, a fixed random sample of its training dataset in dataset/ is
+encoded with the model's feature pipeline and explained with TreeSHAP. Per
+feature, the summary holds the mean |SHAP|, the distribution of its SHAP
+values and a dependence summary (mean SHAP value per range of the feature's
+value).
+
+The summaries of the shipped models are committed next to the model artifacts
+as global_explanations_<model>.json. A summary is recomputed only when the
+model file (its version hash) or the sampling settings change. The API never
+computes one inside a request. A new model version gets its summary in a
+background thread, started when the version is prepared or first asked for.
+Until it is ready the previous summary is served, marked stale. Summaries
+computed at runtime are written to GLOBAL_EXPLANATION_CACHE_DIR, outside the
+source tree, and reused on restart.
+
+Usage:
+    python global_explanations.py              # precompute both models into the model directory
+    python global_explanations.py --force      # recompute even if a summary is current
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import REFERENCE_DATASETS, load_dataset, widen_dtypes
+from feature_pipeline import shortest_decimal
+from model_store import MODEL_DIR, ModelBundle
+
+logger = logging.getLogger(__name__)
+
+
+REFERENCE_SAMPLE_SIZE = int(os.getenv('GLOBAL_EXPLANATION_SAMPLE_SIZE', '2000'))
+REFERENCE_SEED = 42
+
+# Dependence summaries use at most this many value bins per feature
+DEPENDENCE_BINS = 10
+DISTRIBUTION_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Where summaries computed at runtime are written
+GLOBAL_EXPLANATION_CACHE_DIR = os.getenv('GLOBAL_EXPLANATION_CACHE_DIR',
+                                         os.path.join(tempfile.gettempdir(), 'medassist-global-explanations'))
+
+# Latest summary per model, possibly of an earlier model version
+_summaries: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+# Model version whose summary is being computed in the background, per model
+_refreshing: Dict[str, str] = {}
+_refresh_lock = threading.Lock()
+
+
+def summary_path(name: str, directory: str = MODEL_DIR) -> str:
+    """Where the summary for one model is stored in a directory"""
+    return os.path.join(directory, f'global_explanations_{name}.json')
+
+
+def load_reference_sample(name: str, sample_size: int = REFERENCE_SAMPLE_SIZE,
+                          seed: int = REFERENCE_SEED) -> pd.DataFrame:
+    """Read a model's training dataset and draw the reference sample"""
+    frame = load_dataset(name)
+
+    if name == 'cardiovascular':
+        # Same outlier filter as the training notebook
+        frame = frame[(frame['ap_hi'] < 250) & (frame['ap_lo'] < 200) & (frame['ap_hi'] > 0) & (frame['ap_lo'] > 0)]
+
+    # The sample is returned with read_csv's dtypes: it becomes JSON requests and database rows
+    return widen_dtypes(frame.sample(n=min(sample_size, len(frame)), random_state=seed))
+
+
+def dependence_summary(values: np.ndarray, shap_values: np.ndarray) -> List[Dict[str, Any]]:
+    """Mean SHAP value per distinct value (few values) or per quantile bin of the feature"""
+    distinct = np.unique(values)
+    if len(distinct) <= DEPENDENCE_BINS:
+        bins = [(v, v, values == v) for v in distinct]
+    else:
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, DEPENDENCE_BINS + 1)))
+        # Every value falls into exactly one bin; the last bin includes its upper edge
+        index = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        bins = [(edges[k], edges[k + 1], index == k) for k in range(len(edges) - 1)]
+
+    summary = []
+    for low, high, mask in bins:
+        count = int(mask.sum())
+        if count == 0:
+            continue
+        summary.append({
+            'value_min': float(low),
+            'value_max': float(high),
+            'count': count,
+            'mean_shap': float(shap_values[mask].mean())
+        })
+    return summary
+
+
+def compute_summary(bundle: ModelBundle, sample_size: int = REFERENCE_SAMPLE_SIZE,
+                    seed: int = REFERENCE_SEED) -> Dict[str, Any]:
+    """Explain the reference sample and aggregate the SHAP values per feature"""
+    started = time.perf_counter()
+    frame = load_reference_sample(bundle.name, sample_size, seed)
+    features, errors = bundle.pipeline.transform_frame(frame)
+    features = features[np.array([error is None for error in errors], dtype=bool)]
+
+    # XGBoost's native TreeSHAP gives the same values as shap.TreeExplainer
+    shap_values = bundle.engine.contributions(features, 'native')
+    risk = bundle.model.predict_proba(features)[:, 1]
+
+    feature_values = shortest_decimal(features)
+    mean_abs = np.abs(shap_values).mean(axis=0)
+    per_feature = []
+    for j in np.argsort(-mean_abs, kind='stable'):
+        column = shap_values[:, j]
+        quantiles = np.quantile(column, DISTRIBUTION_QUANTILES)
+        per_feature.append({
+            'feature': bundle.feature_names[j],
+            'mean_abs_shap': float(mean_abs[j]),
+            'mean_shap': float(column.mean()),
+            'shap_distribution': {
+                'min': float(column.min()),
+                **{f'p{int(q * 100)}': float(v) for q, v in zip(DISTRIBUTION_QUANTILES, quantiles)},
+                'max': float(column.max())
+            },
+            'dependence': dependence_summary(feature_values[:, j], column)
+        })
+
+    return {
+        'model': bundle.name,
+        'model_version': bundle.version,
+        'sample_size': int(len(features)),
+        'requested_sample_size': sample_size,
+        'seed': seed,
+        'dataset': REFERENCE_DATASETS[bundle.name][0],
+        'mean_risk_probability': float(risk.mean()),
+        'features': per_feature,
+        'computed_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'compute_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _is_current(summary: Optional[Dict[str, Any]], bundle: ModelBundle, sample_size: int, seed: int) -> bool:
+    return (summary is not None and summary.get('model_version') == bundle.version
+            and summary.get('requested_sample_size') == sample_size and summary.get('seed') == seed)
+
+
+def load_stored(bundle: ModelBundle, sample_size: int = REFERENCE_SAMPLE_SIZE, seed: int = REFERENCE_SEED,
+                cache_dir: str = GLOBAL_EXPLANATION_CACHE_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Read a model's summary from disk: the runtime cache first, then the one shipped next to the model.
+
+    Returns the first current summary found, else any stored summary (of an
+    earlier model version), else None.
+    """
+    found = None
+    for directory in dict.fromkeys((cache_dir, MODEL_DIR)):
+        path = summary_path(bundle.name, directory)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _is_current(summary, bundle, sample_size, seed):
+            return summary
+        found = found or summary
+    return found
+
+
+def get_summary(bundle: ModelBundle, sample_size: int = REFERENCE_SAMPLE_SIZE, seed: int = REFERENCE_SEED,
+                force: bool = False, cache_dir: str = GLOBAL_EXPLANATION_CACHE_DIR) -> Dict[str, Any]:
+    """
+    Return the global explanation for a model, from memory, from disk or freshly computed.
+
+    A stored summary is reused as long as it was computed for the same model
+    version and sampling settings; otherwise it is recomputed and saved to `cache_dir`.
+    """
+    summary = _summaries.get(bundle.name)
+    if not force and _is_current(summary, bundle, sample_size, seed):
+        return summary
+
+    with _lock:
+        summary = _summaries.get(bundle.name)
+        if not force and _is_current(summary, bundle, sample_size, seed):
+            return summary
+
+        summary = None if force else load_stored(bundle, sample_size, seed, cache_dir)
+        if not _is_current(summary, bundle, sample_size, seed):
+            summary = compute_summary(bundle, sample_size, seed)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = summary_path(bundle.name, cache_dir)
+            # Write to a temporary file first so a crash never leaves a truncated summary
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_path, path)
+            logger.info(f"Global explanation for {bundle.name} computed in {summary['compute_seconds']}s")
+
+        _summaries[bundle.name] = summary
+        return summary
+
+
+def refresh(bundle: ModelBundle, sample_size: int = REFERENCE_SAMPLE_SIZE, seed: int = REFERENCE_SEED,
+            cache_dir: str = GLOBAL_EXPLANATION_CACHE_DIR):
+    """Bring a model version's summary up to date in a background thread (once per version)"""
+    if _is_current(_summaries.get(bundle.name), bundle, sample_size, seed):
+        return
+    with _refresh_lock:
+        if _refreshing.get(bundle.name) == bundle.version:
+            return
+        _refreshing[bundle.name] = bundle.version
+
+    def run():
+        try:
+            get_summary(bundle, sample_size, seed, cache_dir=cache_dir)
+        except Exception as e:
+            logger.error(f"Could not compute the global explanation for {bundle.name}: {str(e)}")
+        finally:
+            with _refresh_lock:
+                if _refreshing.get(bundle.name) == bundle.version:
+                    del _refreshing[bundle.name]
+
+    threading.Thread(target=run, name=f'global-explanations-{bundle.name}', daemon=True).start()
+
+
+def serving_summary(bundle: ModelBundle, sample_size: int = REFERENCE_SAMPLE_SIZE, seed: int = REFERENCE_SEED,
+                    cache_dir: str = GLOBAL_EXPLANATION_CACHE_DIR) -> Dict[str, Any]:
+    """
+    The summary to answer a request with, never computed in the caller's thread.
+
+    Returns the current summary when there is one. Otherwise a background
+    refresh is started, and the latest summary of an earlier version is
+    returned with 'stale': true, or a 'computing' status when there is none.
+    """
+    summary = _summaries.get(bundle.name)
+    if summary is None:
+        # First request in this process: the stored summary, current or not, is read once
+        summary = load_stored(bundle, sample_size, seed, cache_dir)
+        if summary is not None:
+            _summaries.setdefault(bundle.name, summary)
+    if _is_current(summary, bundle, sample_size, seed):
+        return summary
+
+    refresh(bundle, sample_size, seed, cache_dir)
+    if summary is None:
+        return {'model': bundle.name, 'model_version': bundle.version, 'status': 'computing'}
+    return {**summary, 'stale': True, 'serving_model_version': bundle.version}
+
+
+def main(argv: Optional[List[str]] = None):
+    from model_store import load_bundle
+
+    parser = argparse.ArgumentParser(description='Precompute global SHAP explanations for the models')
+    parser.add_argument('--sample-size', type=int, default=REFERENCE_SAMPLE_SIZE)
+    parser.add_argument('--seed', type=int, default=REFERENCE_SEED)
+    parser.add_argument('--force', action='store_true', help='Recompute even if the stored summary is current')
+    parser.add_argument('--output-dir', default=MODEL_DIR,
+                        help='Where to write the summaries (default: next to the models, where they are committed)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for name in REFERENCE_DATASETS:
+        summary = get_summary(load_bundle(name), args.sample_size, args.seed, force=args.force,
+                              cache_dir=args.output_dir)
+        top = ', '.join(f"{f['feature']} ({f['mean_abs_shap']:.3f})" for f in summary['features'][:3])
+        logger.info(f"{name}: {summary['sample_size']} rows, top features by mean |SHAP|: {top}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for the MedAssist Prediction API
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment variables:
+    BIND              address to listen on (default 0.0.0.0:5001)
+    WEB_CONCURRENCY   number of worker processes (default: number of usable cores)
+    GUNICORN_THREADS  request threads per worker (default 4)
+    XGBOOST_NTHREAD   XGBoost threads per worker (default: cores // workers, at least 1)
+    MODEL_REGISTRY_WATCH / MODEL_REGISTRY_POLL_SECONDS  hot reload of new model versions (see model_registry.py)
+"""
+
+import os
+
+
+def _usable_cores() -> int:
+    """Cores this process may run on (respects CPU affinity / container limits)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv('BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_CONCURRENCY', str(_usable_cores())))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = 60
+
+# Load the models in the master (wsgi.py) so workers inherit them copy-on-write
+preload_app = True
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+
+def post_fork(server, worker):
+    """Give each worker its share of the cores and warm its models up before it takes traffic"""
+    import prediction_api
+
+    # workers * nthread should not exceed the cores, or the XGBoost thread pools fight each other
+    nthread = int(os.getenv('XGBOOST_NTHREAD', str(max(1, _usable_cores() // workers))))
+    prediction_api.configure_threads(nthread)
+    prediction_api.warm_up_models()
+    # Threads do not survive the fork, so every worker watches the registry and publishes its drift counts itself
+    prediction_api.start_registry_watcher()
+    prediction_api.start_drift_monitor()
@@ -0,0 +1,380 @@
+"""
+MedAssist Hyperparameter Search
+Parallel random search over XGBoost hyperparameters for the training pipeline
+
+The data is loaded, cleaned and split once, with the same code and seed as
+train_models.py. The encoded float32 matrices are cached on disk
+(training_cache/<model>-<key>/*.npy). The key is derived from the CSV's
+contents and the split settings, so a changed dataset gets a new cache and
+an unchanged one is never parsed again.
+
+Trials run in a pool of worker processes, each with its own XGBoost thread
+budget (`--workers` x `--threads-per-trial` should not exceed the cores).
+Each worker memory-maps the cached matrices and builds one quantized
+QuantileDMatrix per distinct max_bin, reused by every trial it runs with that
+max_bin. Trials therefore neither re-parse the CSV nor rebuild the DMatrix.
+
+Weak trials are pruned with a median stopping rule. After a warm-up, every
+`--prune-interval` rounds a trial's best validation log loss is compared with
+the median of the trials completed so far at the same round. A trial that is
+worse stops there.
+
+The leaderboard ranks completed trials by validation AUC. Next to it are the
+test AUC and the prediction latency per row on one thread: for single-row
+calls as in the API, and per row in a 1,000-row batch. Single-row latency is
+mostly fixed per-call overhead. The batch figure reflects the cost of the trees
+themselves. Trials that no other trial beats on both validation AUC and batch
+latency are marked `pareto`.
+
+Usage:
+    python hyperparameter_search.py diabetes --trials 40 --workers 4 --threads-per-trial 2
+    python hyperparameter_search.py diabetes --trials 40 --output leaderboard.json --publish-best
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import xgboost as xgb
+
+from dataset_cache import DATASET_DIR, REFERENCE_DATASETS
+from model_registry import REGISTRY_DIR, publish
+from model_store import MODEL_DIR, LabelLookup
+from train_models import LOADERS, SEED, TEST_SIZE, VALIDATION_SIZE, split
+
+logger = logging.getLogger('hyperparameter_search')
+
+CACHE_DIR = os.getenv('TRAINING_CACHE_DIR', os.path.join(MODEL_DIR, 'training_cache'))
+SPLITS = ('fit', 'val', 'test')
+
+LATENCY_BATCH_ROWS = 1000
+LATENCY_SINGLE_CALLS = 200
+
+# Process-local state of a pool worker: the memory-mapped splits and the quantized matrices per max_bin
+_worker: Dict[str, Any] = {}
+
+
+def cache_key(name: str, dataset_dir: str = DATASET_DIR, seed: int = SEED) -> str:
+    """Hash of the dataset contents and the split settings"""
+    digest = hashlib.sha256(f'{name}:{seed}:{TEST_SIZE}:{VALIDATION_SIZE}'.encode())
+    with open(os.path.join(dataset_dir, REFERENCE_DATASETS[name][0]), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def build_cache(name: str, dataset_dir: str = DATASET_DIR, seed: int = SEED, cache_dir: str = CACHE_DIR) -> str:
+    """
+    Load, clean and split a dataset once and cache the encoded matrices.
+
+    Returns:
+        str: The cache directory (reused as is when it already exists).
+    """
+    path = os.path.join(cache_dir, f'{name}-{cache_key(name, dataset_dir, seed)}')
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        logger.info(f"Using cached {name} matrices in {path}")
+        return path
+
+    started = time.perf_counter()
+    X, y, encoders = LOADERS[name](dataset_dir)
+    parts = dict(zip(('X_fit', 'X_val', 'X_test', 'y_fit', 'y_val', 'y_test'), split(name, X, y, seed)))
+
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for key, part in parts.items():
+        np.save(os.path.join(tmp_path, f'{key}.npy'), np.ascontiguousarray(part.to_numpy(dtype=np.float32)))
+    meta = {
+        'model': name,
+        'dataset': REFERENCE_DATASETS[name][0],
+        'seed': seed,
+        'feature_names': list(X.columns),
+        'label_classes': {key: [str(c) for c in encoder.classes_] for key, encoder in encoders.items()},
+        'rows': {part: int(len(parts[f'y_{part}'])) for part in SPLITS}
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Cached {name} matrices in {path} ({time.perf_counter() - started:.2f}s)")
+    return path
+
+
+def read_cache_meta(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        return json.load(f)
+
+
+def sample_params(rng: random.Random) -> Dict[str, Any]:
+    """One random point of the search space"""
+    return {
+        'max_depth': rng.randint(2, 10),
+        'learning_rate': round(math.exp(rng.uniform(math.log(0.02), math.log(0.3))), 4),
+        'subsample': round(rng.uniform(0.6, 1.0), 2),
+        'colsample_bytree': round(rng.uniform(0.6, 1.0), 2),
+        'min_child_weight': round(math.exp(rng.uniform(0.0, math.log(10.0))), 2),
+        'reg_lambda': round(math.exp(rng.uniform(math.log(0.1), math.log(10.0))), 3),
+        'max_bin': rng.choice([64, 128, 256])
+    }
+
+
+class MedianPruner(xgb.callback.TrainingCallback):
+    """Stop a trial whose best validation log loss is worse than the median of completed trials"""
+
+    def __init__(self, reference: Dict[int, float], warmup: int, interval: int):
+        super().__init__()
+        self.reference = reference
+        self.warmup = warmup
+        self.interval = interval
+        self.pruned_at: Optional[int] = None
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        rounds = epoch + 1
+        if rounds < self.warmup or rounds % self.interval:
+            return False
+        median = self.reference.get(rounds)
+        if median is not None and min(evals_log['validation']['logloss']) > median:
+            self.pruned_at = rounds
+            return True
+        return False
+
+
+def pruning_reference(results: List[Dict[str, Any]], min_trials: int) -> Dict[int, float]:
+    """Median best-so-far validation log loss per round over the completed (not pruned) trials"""
+    curves = [row['curve'] for row in results if row['status'] == 'complete']
+    if len(curves) < min_trials:
+        return {}
+    longest = max(len(curve) for curve in curves)
+    # A trial that stopped early keeps its best value for the later rounds
+    padded = np.array([curve + [curve[-1]] * (longest - len(curve)) for curve in curves])
+    return {rounds: float(value) for rounds, value in enumerate(np.median(padded, axis=0), start=1)}
+
+
+def _init_worker(cache_path: str):
+    _worker['data'] = {f'{axis}_{part}': np.load(os.path.join(cache_path, f'{axis}_{part}.npy'), mmap_mode='r')
+                       for axis in ('X', 'y') for part in SPLITS}
+    _worker['feature_names'] = read_cache_meta(cache_path)['feature_names']
+    _worker['matrices'] = {}
+
+
+def _matrices(max_bin: int, nthread: int):
+    """The quantized fit/validation matrices of this worker for one max_bin"""
+    if max_bin not in _worker['matrices']:
+        data, names = _worker['data'], _worker['feature_names']
+        train = xgb.QuantileDMatrix(data['X_fit'], data['y_fit'], max_bin=max_bin, nthread=nthread,
+                                    feature_names=names)
+        validation = xgb.QuantileDMatrix(data['X_val'], data['y_val'], ref=train, max_bin=max_bin, nthread=nthread,
+                                         feature_names=names)
+        _worker['matrices'][max_bin] = (train, validation)
+    return _worker['matrices'][max_bin]
+
+
+def row_latency_us(booster, X: np.ndarray, repeat: int = 5) -> Dict[str, float]:
+    """Best-of-`repeat` prediction time per row, for single-row calls and in a batch"""
+    single, batch = np.ascontiguousarray(X[:1]), np.ascontiguousarray(X[:LATENCY_BATCH_ROWS])
+    booster.inplace_predict(batch)
+    single_best = batch_best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(LATENCY_SINGLE_CALLS):
+            booster.inplace_predict(single)
+        single_best = min(single_best, (time.perf_counter() - started) / LATENCY_SINGLE_CALLS)
+        started = time.perf_counter()
+        booster.inplace_predict(batch)
+        batch_best = min(batch_best, (time.perf_counter() - started) / len(batch))
+    return {'latency_us_single_row': round(single_best * 1e6, 1), 'latency_us_per_row_batch': round(batch_best * 1e6, 2)}
+
+
+def run_trial(trial: int, params: Dict[str, Any], settings: Dict[str, Any],
+              reference: Dict[int, float]) -> Dict[str, Any]:
+    """Train and score one trial in a pool worker"""
+    from sklearn.metrics import roc_auc_score
+
+    threads = settings['threads_per_trial']
+    train, validation = _matrices(params['max_bin'], threads)
+    booster_params = {
+        'objective': 'binary:logistic',
+        'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'nthread': threads,
+        'seed': settings['seed'],
+        **params
+    }
+    pruner = MedianPruner(reference, settings['prune_warmup'], settings['prune_interval'])
+    evals_log: Dict[str, Any] = {}
+
+    started = time.perf_counter()
+    booster = xgb.train(booster_params, train, num_boost_round=settings['max_rounds'],
+                        evals=[(validation, 'validation')], evals_result=evals_log,
+                        early_stopping_rounds=settings['early_stopping'], callbacks=[pruner],
+                        verbose_eval=False)
+    train_seconds = time.perf_counter() - started
+
+    history = evals_log['validation']['logloss']
+    row = {
+        'trial': trial,
+        'params': params,
+        'status': 'pruned' if pruner.pruned_at is not None else 'complete',
+        'rounds': len(history),
+        'train_seconds': round(train_seconds, 3),
+        'best_val_logloss': round(float(min(history)), 5),
+        'curve': np.minimum.accumulate(history).tolist()
+    }
+    if pruner.pruned_at is not None:
+        return row
+
+    booster = booster[:booster.best_iteration + 1]
+    data = _worker['data']
+    booster.set_param({'nthread': threads})
+    row.update({
+        'trees': booster.num_boosted_rounds(),
+        'val_auc': round(float(roc_auc_score(data['y_val'], booster.inplace_predict(data['X_val']))), 5),
+        'test_auc': round(float(roc_auc_score(data['y_test'], booster.inplace_predict(data['X_test']))), 5)
+    })
+    # Serving predicts on one thread per worker
+    booster.set_param({'nthread': 1})
+    row.update(row_latency_us(booster, data['X_test']))
+    row['model'] = bytes(booster.save_raw('ubj'))
+    return row
+
+
+def leaderboard(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Completed trials by validation AUC (Pareto-optimal ones marked), then pruned trials"""
+    complete = sorted((row for row in results if row['status'] == 'complete'), key=lambda row: -row['val_auc'])
+    for row in complete:
+        row['pareto'] = not any(other['val_auc'] >= row['val_auc'] and
+                                other['latency_us_per_row_batch'] < row['latency_us_per_row_batch']
+                                for other in complete if other is not row)
+    pruned = sorted((row for row in results if row['status'] != 'complete'), key=lambda row: row['best_val_logloss'])
+    return [{key: value for key, value in row.items() if key not in ('curve', 'model')} for row in complete + pruned]
+
+
+def search(name: str, trials: int = 20, workers: int = 1, threads_per_trial: int = 1, max_rounds: int = 1000,
+           early_stopping: int = 50, prune_warmup: int = 50, prune_interval: int = 25, min_trials: int = 3,
+           seed: int = SEED, dataset_dir: str = DATASET_DIR, cache_dir: str = CACHE_DIR) -> Dict[str, Any]:
+    """
+    Run a random search and return its leaderboard.
+
+    Returns:
+        dict: Settings, cache path, wall time and the leaderboard; under
+        'best_model' the serialized model of the top trial (None if every
+        trial was pruned).
+    """
+    started = time.perf_counter()
+    cache_path = build_cache(name, dataset_dir, seed, cache_dir)
+    cache_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    queue = [(trial, sample_params(rng)) for trial in range(trials)]
+    settings = {'threads_per_trial': threads_per_trial, 'max_rounds': max_rounds, 'early_stopping': early_stopping,
+                'prune_warmup': prune_warmup, 'prune_interval': prune_interval, 'seed': seed}
+
+    results: List[Dict[str, Any]] = []
+    # spawn, not fork: the workers start their own OpenMP runtime
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(cache_path,)) as pool:
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < workers:
+                trial, params = queue.pop(0)
+                reference = pruning_reference(results, min_trials)
+                pending[pool.submit(run_trial, trial, params, settings, reference)] = trial
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                row = future.result()
+                results.append(row)
+                if row['status'] == 'complete':
+                    logger.info(f"Trial {row['trial']}: val AUC {row['val_auc']}, {row['trees']} trees, "
+                                f"{row['latency_us_single_row']} us/row, {row['train_seconds']}s")
+                else:
+                    logger.info(f"Trial {row['trial']}: pruned after {row['rounds']} rounds "
+                                f"(val log loss {row['best_val_logloss']})")
+
+    board = leaderboard(results)
+    best = next((row for row in results if board and row['trial'] == board[0]['trial'] and 'model' in row), None)
+    return {
+        'model': name,
+        'cache': cache_path,
+        'cache_seconds': round(cache_seconds, 3),
+        'settings': {'trials': trials, 'workers': workers, **settings},
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        'pruned': sum(row['status'] == 'pruned' for row in results),
+        'leaderboard': board,
+        'best_model': best['model'] if best else None
+    }
+
+
+def publish_best(report: Dict[str, Any], registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """Publish the top trial of a search to the model registry"""
+    if report['best_model'] is None:
+        return None
+    meta = read_cache_meta(report['cache'])
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(report['best_model']))
+    encoders = {key: LabelLookup(classes) for key, classes in meta['label_classes'].items()}
+    training = {'dataset': meta['dataset'], 'rows': meta['rows'], 'search': report['leaderboard'][0]}
+    return publish(report['model'], model, meta['feature_names'], encoders, registry_dir, extra={'training': training})
+
+
+def print_leaderboard(board: List[Dict[str, Any]], limit: int = 15):
+    print(f"{'trial':>5} {'status':>8} {'val_auc':>8} {'test_auc':>8} {'trees':>5} {'us/row':>7} {'us/row@1k':>9} "
+          f"{'pareto':>6}  params")
+    for row in board[:limit]:
+        if row['status'] == 'complete':
+            print(f"{row['trial']:>5} {row['status']:>8} {row['val_auc']:>8.5f} {row['test_auc']:>8.5f} "
+                  f"{row['trees']:>5} {row['latency_us_single_row']:>7.1f} {row['latency_us_per_row_batch']:>9.2f} "
+                  f"{'yes' if row['pareto'] else '':>6}  {row['params']}")
+        else:
+            print(f"{row['trial']:>5} {row['status']:>8} {'':>8} {'':>8} {row['rounds']:>5} {'':>7} {'':>9} "
+                  f"{'':>6}  {row['params']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter search with cached training matrices')
+    parser.add_argument('model', choices=list(LOADERS))
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--threads-per-trial', type=int, default=None,
+                        help='XGBoost threads per trial (default: cores / workers)')
+    parser.add_argument('--max-rounds', type=int, default=1000)
+    parser.add_argument('--early-stopping', type=int, default=50)
+    parser.add_argument('--prune-warmup', type=int, default=50, help='Rounds before pruning can start')
+    parser.add_argument('--prune-interval', type=int, default=25)
+    parser.add_argument('--min-trials', type=int, default=3, help='Completed trials needed before pruning')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--output', default=None, help='Write the full report (without models) to this JSON file')
+    parser.add_argument('--publish-best', action='store_true', help='Publish the top trial to the model registry')
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    threads = args.threads_per_trial or max(1, (os.cpu_count() or 1) // args.workers)
+    report = search(args.model, args.trials, args.workers, threads, args.max_rounds, args.early_stopping,
+                    args.prune_warmup, args.prune_interval, args.min_trials, args.seed, args.dataset_dir,
+                    args.cache_dir)
+
+    print_leaderboard(report['leaderboard'])
+    print(f"\n{len(report['leaderboard'])} trials ({report['pruned']} pruned) in {report['wall_seconds']}s "
+          f"with {args.workers} workers x {threads} threads")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({key: value for key, value in report.items() if key != 'best_model'}, f, indent=2)
+    if args.publish_best:
+        version = publish_best(report, args.registry_dir)
+        print(f"Published {args.model} version {version}" if version else 'Every trial was pruned; nothing published')
+
+
+if __name__ == '__main__':
+    main()
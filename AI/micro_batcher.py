@@ -0,0 +1,168 @@
+"""
+MedAssist Micro-Batching Scheduler
+
+Collects concurrent single-patient prediction requests for a short window and
+scores them together as one feature matrix. Each caller blocks until its own
+row has been scored and then receives its own (result, error) pair, exactly as
+if it had been scored alone. A failure while scoring a batch is raised to every
+caller in it that has no outcome yet, and the scoring thread keeps running.
+
+A batch is flushed when either `max_batch_size` rows are queued or the oldest
+queued row has waited `max_wait_ms` milliseconds, whichever comes first.
+
+A batch is scored in a copy of the context of the first request in it, so
+context variables set by the request handler (such as metric labels) also
+apply to the shared scoring work.
+"""
+
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds of the batch-size and queue-wait histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250]
+
+
+def _bucket_index(buckets: List[float], value: float) -> int:
+    """Return the index of the first bucket whose upper bound holds value"""
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return len(buckets)
+
+
+class MicroBatcher:
+    """Queue single records for one model and score them in small batches"""
+
+    def __init__(self, name: str, score_fn: Callable[[List[Any]], List[Tuple[Any, Exception]]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.name = name
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue[Tuple[Any, Future, float, contextvars.Context]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        # Counters for tuning the batching window
+        self._batches = 0
+        self._rows = 0
+        self._max_batch = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._wait_counts = [0] * (len(QUEUE_WAIT_BUCKETS_MS) + 1)
+
+    def _ensure_worker(self):
+        """Start the scoring thread in this process if it is not running yet"""
+        # Threads do not survive fork(), so a forked worker process starts its own
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name=f'micro-batcher-{self.name}', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, record: Any, timeout: Optional[float] = None) -> Tuple[Any, Exception]:
+        """
+        Queue one record and block until its (result, error) pair is ready.
+
+        Raises concurrent.futures.TimeoutError when `timeout` seconds pass first.
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((record, future, time.perf_counter(), contextvars.copy_context()))
+        return future.result(timeout=timeout)
+
+    def _collect(self) -> List[Tuple[Any, Future, float, contextvars.Context]]:
+        """Block for the first queued item, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Rows that are already waiting always join, even once the window has closed
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Scoring loop executed by the background thread"""
+        while True:
+            batch = []
+            try:
+                batch = self._collect()
+                self._score(batch)
+            except Exception as e:
+                # The thread must outlive any failure, and no caller may be left waiting
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score(self, batch: List[Tuple[Any, Future, float, contextvars.Context]]):
+        """Score one batch and hand every caller its outcome"""
+        started = time.perf_counter()
+        self._record(len(batch), [(started - enqueued) * 1000.0 for _, _, enqueued, _ in batch])
+
+        records = [record for record, _, _, _ in batch]
+        try:
+            outcomes = batch[0][3].run(self.score_fn, records)
+        except Exception as e:
+            # A failure of the whole matrix is reported to every caller in it
+            outcomes = [(None, e)] * len(batch)
+        if len(outcomes) != len(batch):
+            raise RuntimeError(f'{self.name} scorer returned {len(outcomes)} outcomes for {len(batch)} rows')
+
+        for (_, future, _, _), outcome in zip(batch, outcomes):
+            future.set_result(outcome)
+
+    def _record(self, batch_size: int, waits_ms: List[float]):
+        """Update the batch-size and queue-wait counters"""
+        with self._lock:
+            self._batches += 1
+            self._rows += batch_size
+            self._max_batch = max(self._max_batch, batch_size)
+            self._batch_size_counts[_bucket_index(BATCH_SIZE_BUCKETS, batch_size)] += 1
+            for wait in waits_ms:
+                self._wait_total_ms += wait
+                self._wait_max_ms = max(self._wait_max_ms, wait)
+                self._wait_counts[_bucket_index(QUEUE_WAIT_BUCKETS_MS, wait)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the batching counters"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'rows': self._rows,
+                'queued': self._queue.qsize(),
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'max_observed_batch_size': self._max_batch,
+                'batch_size_histogram': _histogram(BATCH_SIZE_BUCKETS, self._batch_size_counts),
+                'mean_queue_wait_ms': self._wait_total_ms / self._rows if self._rows else 0.0,
+                'max_queue_wait_ms': self._wait_max_ms,
+                'queue_wait_ms_histogram': _histogram(QUEUE_WAIT_BUCKETS_MS, self._wait_counts)
+            }
+
+
+def _histogram(buckets: List[float], counts: List[int]) -> List[Dict[str, Any]]:
+    """Label histogram counts by bucket upper bound ("le" = less than or equal)"""
+    bounds = list(buckets) + ['+Inf']
+    return [{'le': bound, 'count': count} for bound, count in zip(bounds, counts)]
@@ -0,0 +1,332 @@
+"""
+MedAssist Model Registry
+Versioned model artifacts and hot reload without restarting the API
+
+The registry is a directory with one subdirectory per model and one per
+version below it:
+
+    model_registry/
+        cardiovascular/
+            20261018T120000Z/
+                model.ubj
+                metadata.json
+            ACTIVE              (optional: pins a version, e.g. for a rollback)
+        diabetes/
+            ...
+        diabetes_fast/      (distilled fast tier, see distill_models.py)
+            ...
+
+metadata.json holds the model file's checksum, the feature names and the label
+encoder classes, in the same form as the entries of model_manifest.json. It is
+written last, and the version directory is renamed into place in one step, so a
+version is never visible half-written. The active version is the one named in
+ACTIVE, or else the newest (versions sort by name; published versions are UTC
+timestamps). When a model has no version in the registry, the artifacts next to
+the API (native export or pickle) are used as before.
+
+Tiers other than the standard one are registered under '<model>_<tier>'. They
+are loaded with the base model's feature pipeline, and a tier has no fallback
+next to the API: it is served only once a version has been published.
+
+The API runs a RegistryWatcher thread that polls the registry. When the
+active version changes, it loads the new model in the background, lets the API
+warm it up, and only then swaps it into the model's slot. Requests in flight
+finish on the model they started with.
+
+Usage:
+    python model_registry.py publish cardiovascular          # publish the current model as a new version
+    python model_registry.py list
+    python model_registry.py activate diabetes 20261018T120000Z
+    python model_registry.py activate diabetes_fast latest
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from model_store import MODEL_DIR, ModelBundle, ModelSlot, file_checksum, load_bundle, load_native
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join(MODEL_DIR, 'model_registry'))
+METADATA_FILE = 'metadata.json'
+MODEL_FILE = 'model.ubj'
+ACTIVE_FILE = 'ACTIVE'
+
+MODEL_NAMES = ['cardiovascular', 'diabetes']
+# Serving tiers; 'fast' holds the distilled models
+MODEL_TIERS = ['standard', 'fast']
+
+
+def registry_name(name: str, tier: str = 'standard') -> str:
+    """Registry entry of a model tier: 'diabetes' for the standard tier, 'diabetes_fast' for the fast one"""
+    return name if tier == 'standard' else f'{name}_{tier}'
+
+
+def split_registry_name(entry: str) -> Tuple[str, str]:
+    """(model, tier) of a registry entry"""
+    name, _, tier = entry.rpartition('_')
+    if name in MODEL_NAMES and tier in MODEL_TIERS:
+        return name, tier
+    return entry, 'standard'
+
+
+REGISTRY_ENTRIES = [registry_name(name, tier) for tier in MODEL_TIERS for name in MODEL_NAMES]
+
+
+def list_versions(name: str, registry_dir: str = REGISTRY_DIR) -> List[str]:
+    """Complete versions of a model, oldest first"""
+    model_dir = os.path.join(registry_dir, name)
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(entry for entry in os.listdir(model_dir)
+                  if not entry.startswith('.') and os.path.exists(os.path.join(model_dir, entry, METADATA_FILE)))
+
+
+def active_version(name: str, registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """The pinned version if ACTIVE names one, otherwise the newest version (None if there is none)"""
+    versions = list_versions(name, registry_dir)
+    pin_path = os.path.join(registry_dir, name, ACTIVE_FILE)
+    if os.path.exists(pin_path):
+        with open(pin_path, 'r') as f:
+            pinned = f.read().strip()
+        if pinned in versions:
+            return pinned
+        logger.warning(f"{pin_path} names unknown version {pinned!r}; using the newest version")
+    return versions[-1] if versions else None
+
+
+def read_metadata(name: str, version: str, registry_dir: str = REGISTRY_DIR) -> Dict[str, Any]:
+    """Read the metadata of one version"""
+    with open(os.path.join(registry_dir, name, version, METADATA_FILE), 'r') as f:
+        return json.load(f)
+
+
+def load_version(name: str, version: str, registry_dir: str = REGISTRY_DIR) -> ModelBundle:
+    """Load one registry version, verifying its checksum"""
+    version_dir = os.path.join(registry_dir, name, version)
+    model, tier = split_registry_name(name)
+    bundle = load_native(model, read_metadata(name, version, registry_dir), version_dir)
+    bundle.tier = tier
+    bundle.version = version
+    bundle.source = f'registry:{name}/{version}'
+    return bundle
+
+
+def load_active(name: str, registry_dir: str = REGISTRY_DIR) -> ModelBundle:
+    """Load the active registry version of a model, or the artifacts next to the API when it has none"""
+    version = active_version(name, registry_dir)
+    if version is None:
+        if split_registry_name(name)[1] != 'standard':
+            raise FileNotFoundError(f'No {name} version in {registry_dir}')
+        return load_bundle(name)
+    return load_version(name, version, registry_dir)
+
+
+def publish(name: str, model: Any, feature_names: List[str], encoders: Optional[Dict[str, Any]] = None,
+            registry_dir: str = REGISTRY_DIR, version: Optional[str] = None,
+            extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Write a model to the registry as a new version.
+
+    Args:
+        name: Registry entry ('cardiovascular', 'diabetes' or a tier such as 'diabetes_fast').
+        model: Fitted XGBClassifier.
+        feature_names: Column order the model was trained with.
+        encoders: Label encoders (anything with classes_) keyed as in the API.
+        version: Version name; defaults to the current UTC time.
+        extra: Additional metadata (training metrics, data source, ...).
+
+    Returns:
+        str: The version that was written.
+    """
+    import xgboost as xgb
+
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    model_dir = os.path.join(registry_dir, name)
+    final_dir = os.path.join(model_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f'{name} version {version} already exists in {registry_dir}')
+
+    # Build the version in a hidden directory, then rename it into place in one step
+    tmp_dir = os.path.join(model_dir, f'.{version}.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        path = os.path.join(tmp_dir, MODEL_FILE)
+        model.save_model(path)
+        metadata = {
+            'model': name,
+            'version': version,
+            'file': MODEL_FILE,
+            'format': 'ubj',
+            'sha256': file_checksum(path, length=None),
+            'feature_names': list(feature_names),
+            'xgboost_version': xgb.__version__,
+            'published_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **(extra or {})
+        }
+        if encoders:
+            metadata['label_classes'] = {key: [str(c) for c in encoder.classes_]
+                                         for key, encoder in encoders.items()}
+        with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Published {name} version {version} to {registry_dir}")
+    return version
+
+
+def activate(name: str, version: Optional[str], registry_dir: str = REGISTRY_DIR):
+    """Pin the active version of a model (None removes the pin, so the newest version is active)"""
+    pin_path = os.path.join(registry_dir, name, ACTIVE_FILE)
+    if version is None:
+        if os.path.exists(pin_path):
+            os.remove(pin_path)
+        return
+    if version not in list_versions(name, registry_dir):
+        raise ValueError(f'Unknown {name} version: {version}')
+    tmp_path = f'{pin_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, pin_path)
+
+
+class RegistryWatcher:
+    """Poll the registry and hot-swap models whose active version changed"""
+
+    def __init__(self, slots: Dict[str, ModelSlot], prepare: Optional[Callable[[ModelBundle], None]] = None,
+                 registry_dir: str = REGISTRY_DIR, poll_seconds: float = 10.0):
+        self.slots = slots
+        # Tier slots are never loaded on first use, so the watcher loads their first version too
+        self.load_unloaded = {name for name in slots if split_registry_name(name)[1] != 'standard'}
+        # Called with a freshly loaded bundle before it is swapped in (explainer build, warm-up)
+        self.prepare = prepare
+        self.registry_dir = registry_dir
+        self.poll_seconds = poll_seconds
+        self.last_check: Optional[float] = None
+        self._status: Dict[str, Dict[str, Any]] = {name: {} for name in slots}
+        # Versions that failed to load are not retried until a different version becomes active
+        self._failed: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start polling in a daemon thread (once per process)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-registry-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.registry_dir} for new model versions every {self.poll_seconds:g}s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Model registry check failed")
+
+    def check(self) -> List[str]:
+        """Load, prepare and swap in every model whose active version changed; return the swapped names"""
+        swapped = []
+        for name, slot in self.slots.items():
+            version = active_version(name, self.registry_dir)
+            current = slot.peek()
+            # Lazily loaded slots pick up the active version on first use anyway
+            if version is None or (current is None and name not in self.load_unloaded):
+                continue
+            previous = current.version if current is not None else None
+            if previous == version or self._failed.get(name) == version:
+                continue
+
+            started = time.perf_counter()
+            try:
+                bundle = load_version(name, version, self.registry_dir)
+                if self.prepare is not None:
+                    self.prepare(bundle)
+            except Exception as e:
+                self._failed[name] = version
+                self._status[name] = {**self._status[name], 'last_error': f'{version}: {e}'}
+                logger.error(f"Could not load {name} version {version}; keeping {previous}: {str(e)}")
+                continue
+
+            slot.swap(bundle)
+            self._failed.pop(name, None)
+            self._status[name] = {
+                'previous_version': previous,
+                'swapped_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'load_seconds': round(time.perf_counter() - started, 4),
+                'last_error': None
+            }
+            swapped.append(name)
+            logger.info(f"{name} model swapped from {previous} to {version} "
+                        f"(loaded and warmed up in {self._status[name]['load_seconds']}s)")
+
+        self.last_check = time.time()
+        return swapped
+
+    def status(self) -> Dict[str, Any]:
+        """Registry location, available versions and the outcome of the last swap per model"""
+        return {
+            'directory': self.registry_dir,
+            'watching': self._thread is not None and self._thread.is_alive(),
+            'poll_seconds': self.poll_seconds,
+            'last_check': datetime.fromtimestamp(self.last_check, timezone.utc).isoformat(timespec='seconds')
+            if self.last_check is not None else None,
+            'models': {name: {'available_versions': list_versions(name, self.registry_dir),
+                              'active_version': active_version(name, self.registry_dir),
+                              **self._status[name]}
+                       for name in self.slots}
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Manage the versioned model registry')
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help='Publish the model currently next to the API')
+    publish_parser.add_argument('model', choices=MODEL_NAMES)
+    publish_parser.add_argument('--version', default=None)
+
+    subparsers.add_parser('list', help='List the versions of every model')
+
+    activate_parser = subparsers.add_parser('activate', help='Pin the active version of a model')
+    activate_parser.add_argument('model', choices=REGISTRY_ENTRIES)
+    activate_parser.add_argument('version', help="Version to serve, or 'latest' to remove the pin")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'publish':
+        bundle = load_bundle(args.model)
+        publish(args.model, bundle.model, bundle.feature_names, bundle.encoders, args.registry_dir,
+                args.version, extra={'published_from': bundle.source})
+    elif args.command == 'activate':
+        activate(args.model, None if args.version == 'latest' else args.version, args.registry_dir)
+        logger.info(f"{args.model}: active version is now {active_version(args.model, args.registry_dir)}")
+    else:
+        for name in REGISTRY_ENTRIES:
+            active = active_version(name, args.registry_dir)
+            versions = [f"{v} (active)" if v == active else v for v in list_versions(name, args.registry_dir)]
+            if split_registry_name(name)[1] == 'standard':
+                logger.info(f"{name}: {', '.join(versions) or 'no versions (serving the files next to the API)'}")
+            elif versions:
+                logger.info(f"{name}: {', '.join(versions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+MedAssist Model Store
+Loading of the prediction models, their explainers and their metadata
+
+Each model lives in a ModelSlot that loads it on first use (or eagerly, or in
+a background thread, depending on the startup mode). Models are read from
+XGBoost's native UBJ/JSON format when an export is listed in
+model_manifest.json with a matching checksum, and from the original joblib
+pickles otherwise. The pickles are also used when an export was written by a
+newer XGBoost than the one installed, or fails to load. The shap library is only imported, and a TreeExplainer
+only built, the first time an exact explanation is requested.
+
+Every load records how long deserialization and explainer construction took,
+so the startup report can show where cold-start time goes.
+"""
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from explanation_engine import ExplanationEngine
+from feature_pipeline import build_pipeline
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = 'model_manifest.json'
+
+# Original training artifacts (as written by ml_notebook.ipynb)
+PICKLE_FILES = {
+    'cardiovascular': {'model': 'xgboost_model.pkl'},
+    'diabetes': {
+        'model': 'diabetes_xgboost_model.pkl',
+        'encoders': 'diabetes_label_encoders.pkl',
+        'feature_info': 'diabetes_feature_info.pkl'
+    }
+}
+
+SHAP_AVAILABLE = importlib.util.find_spec('shap') is not None
+
+# Time spent importing shap, recorded the first time an explainer is built
+shap_import_seconds: Optional[float] = None
+
+
+def file_checksum(path: str, length: Optional[int] = 12) -> str:
+    """Return the SHA-256 hex digest of a file's contents (shortened to `length` characters)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+class LabelLookup:
+    """Drop-in for a fitted sklearn LabelEncoder when only its classes are needed"""
+
+    def __init__(self, classes: List[str]):
+        self.classes_ = list(classes)
+        self._codes = {label: code for code, label in enumerate(self.classes_)}
+
+    def transform(self, values: List[str]) -> List[int]:
+        try:
+            return [self._codes[value] for value in values]
+        except KeyError as e:
+            raise ValueError(f'y contains previously unseen labels: {e}')
+
+
+def shap_explainer_factory(model: Any) -> Any:
+    """Build a shap.TreeExplainer, importing shap on first use"""
+    global shap_import_seconds
+
+    started = time.perf_counter()
+    import shap
+    if shap_import_seconds is None:
+        shap_import_seconds = time.perf_counter() - started
+
+    return shap.TreeExplainer(model)
+
+
+class ModelBundle:
+    """A loaded model together with its feature pipeline, explanation engine and metadata"""
+
+    def __init__(self, name: str, model: Any, version: str, source: str, feature_names: List[str],
+                 encoders: Optional[Dict[str, Any]] = None, timings: Optional[Dict[str, float]] = None,
+                 tier: str = 'standard'):
+        self.name = name
+        # Serving tier: 'standard', or 'fast' for a distilled model
+        self.tier = tier
+        self.model = model
+        self.version = version
+        self.source = source
+        self.feature_names = feature_names
+        self.encoders = encoders or {}
+        self.timings = timings or {}
+        self.engine = ExplanationEngine(model, shap_explainer_factory if SHAP_AVAILABLE else None)
+        self.pipeline = build_pipeline(name, feature_names, self.encoders)
+
+    def report(self) -> Dict[str, Any]:
+        """Load timings and provenance for the startup report"""
+        explainer_seconds = self.engine.explainer_seconds
+        return {
+            'version': self.version,
+            'tier': self.tier,
+            'source': self.source,
+            'deserialize_seconds': round(self.timings['deserialize'], 4),
+            'explainer_seconds': round(explainer_seconds, 4) if explainer_seconds is not None else None
+        }
+
+
+def read_manifest(model_dir: str = MODEL_DIR) -> Dict[str, Any]:
+    """Read model_manifest.json, or return an empty manifest when there is none"""
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'models': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_native(name: str, entry: Dict[str, Any], model_dir: str = MODEL_DIR) -> ModelBundle:
+    """Load a model exported by export_models.py, verifying its checksum"""
+    import xgboost as xgb
+
+    path = os.path.join(model_dir, entry['file'])
+    started = time.perf_counter()
+    checksum = file_checksum(path, length=None)
+    if checksum != entry['sha256']:
+        raise ValueError(f"Checksum mismatch for {entry['file']}: expected {entry['sha256']}, got {checksum}")
+
+    model = xgb.XGBClassifier()
+    model.load_model(path)
+    encoders = {key: LabelLookup(classes) for key, classes in entry.get('label_classes', {}).items()}
+    timings = {'deserialize': time.perf_counter() - started}
+
+    return ModelBundle(name, model, checksum[:12], f"native:{entry['file']}",
+                       entry['feature_names'], encoders, timings)
+
+
+def load_pickle(name: str, model_dir: str = MODEL_DIR) -> ModelBundle:
+    """Load a model from the original joblib/pickle training artifacts"""
+    import pickle
+
+    import joblib
+
+    files = PICKLE_FILES[name]
+    path = os.path.join(model_dir, files['model'])
+    started = time.perf_counter()
+    model = joblib.load(path)
+
+    encoders = {}
+    feature_names = model.get_booster().feature_names
+    if 'encoders' in files:
+        with open(os.path.join(model_dir, files['encoders']), 'rb') as f:
+            encoders = pickle.load(f)
+    if 'feature_info' in files:
+        with open(os.path.join(model_dir, files['feature_info']), 'rb') as f:
+            feature_names = pickle.load(f)['feature_names']
+    timings = {'deserialize': time.perf_counter() - started}
+
+    return ModelBundle(name, model, file_checksum(path), f"pickle:{files['model']}",
+                       feature_names, encoders, timings)
+
+
+def version_tuple(version: str) -> tuple:
+    """Major and minor number of a version string ('3.0.5' -> (3, 0))"""
+    parts = []
+    for part in version.split('.')[:2]:
+        digits = ''.join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def load_bundle(name: str, model_dir: str = MODEL_DIR) -> ModelBundle:
+    """Load one model, preferring a current native export over the pickle"""
+    import xgboost as xgb
+
+    entry = read_manifest(model_dir).get('models', {}).get(name)
+    if entry is not None:
+        source_path = os.path.join(model_dir, PICKLE_FILES[name]['model'])
+        exported_with = entry.get('xgboost_version')
+        # An export older than the pickle it came from would silently serve a stale model
+        if os.path.exists(source_path) and file_checksum(source_path, length=None) != entry.get('source_sha256'):
+            logger.warning(f"Native export of the {name} model is stale; loading the pickle instead. "
+                           f"Re-run export_models.py.")
+        # XGBoost reads models saved by older versions, but does not promise to read newer ones
+        elif exported_with and version_tuple(exported_with) > version_tuple(xgb.__version__):
+            logger.warning(f"Native export of the {name} model was written by XGBoost {exported_with}, newer than "
+                           f"the installed {xgb.__version__}; loading the pickle instead.")
+        else:
+            try:
+                return load_native(name, entry, model_dir)
+            except Exception as e:
+                logger.error(f"Could not load the native export of the {name} model; loading the pickle instead: "
+                             f"{str(e)}")
+    return load_pickle(name, model_dir)
+
+
+class ModelSlot:
+    """Holds one model bundle and loads it, once, on first use"""
+
+    def __init__(self, name: str, loader: Callable[[str], ModelBundle] = load_bundle):
+        self.name = name
+        self._loader = loader
+        self._bundle: Optional[ModelBundle] = None
+        self._lock = threading.Lock()
+        self.error: Optional[Exception] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._bundle is not None
+
+    def peek(self) -> Optional[ModelBundle]:
+        """Return the bundle if it is loaded, without triggering a load"""
+        return self._bundle
+
+    def get(self) -> ModelBundle:
+        """Return the bundle, loading it first if needed (concurrent callers wait for one load)"""
+        bundle = self._bundle
+        if bundle is not None:
+            return bundle
+        with self._lock:
+            if self._bundle is None:
+                try:
+                    self._bundle = self._loader(self.name)
+                    self.error = None
+                    logger.info(f"{self.name} model loaded from {self._bundle.source} "
+                                f"in {self._bundle.timings['deserialize']:.3f}s")
+                except Exception as e:
+                    self.error = e
+                    raise
+            return self._bundle
+
+    def swap(self, bundle: ModelBundle) -> Optional[ModelBundle]:
+        """
+        Replace the bundle with a fully loaded one and return the previous bundle.
+
+        The swap is a single reference assignment: requests that already hold
+        the old bundle finish with it, and every later get() returns the new one.
+        """
+        with self._lock:
+            previous = self._bundle
+            self._bundle = bundle
+            self.error = None
+        return previous
@@ -9,17 +9,35 @@ This API provides endpoints for:
 Both endpoints return predictions, confidence scores, and SHAP explanations.
 """
 
-from flask import Flask, request, jsonify
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import joblib
-import pickle
 import numpy as np
 import pandas as pd
-import shap
 import warnings
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+
+import global_explanations
+import model_store
+import risk_sweep
+from drift_monitor import DriftMonitor
+from explanation_engine import DEFAULT_EXPLAIN_MODE, EXPLAIN_MODES, ExplanationEngine
+from feature_pipeline import CARDIO_FEATURE_NAMES, ValidationError, shortest_decimal
+from micro_batcher import MicroBatcher
+from model_registry import MODEL_TIERS, RegistryWatcher, active_version, load_active, registry_name
+from model_store import ModelBundle, ModelSlot
+from prediction_cache import PredictionCache
+from request_metrics import metrics
+from response_format import json_response, parse_projection
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
@@ -31,44 +49,207 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to store models and explainers
-cardio_model = None
-diabetes_model = None
-diabetes_encoders = None
-diabetes_features = None
-cardio_explainer = None
-diabetes_explainer = None
+# One slot per model; each holds the loaded model, its explainer and metadata.
+# Models come from the active version in the model registry when there is one.
+model_slots: Dict[str, ModelSlot] = {
+    'cardiovascular': ModelSlot('cardiovascular', load_active),
+    'diabetes': ModelSlot('diabetes', load_active)
+}
+
+# Distilled fast-tier models (distill_models.py), served to requests with ?tier=fast. A fast
+# slot stays empty until a version is published, and those requests get the standard model.
+fast_slots: Dict[str, ModelSlot] = {name: ModelSlot(registry_name(name, 'fast'), load_active) for name in model_slots}
+
+# Tier for requests without ?tier=
+DEFAULT_MODEL_TIER = os.getenv('DEFAULT_MODEL_TIER', 'standard').lower()
+
+# How models are loaded at startup: 'eager' (before serving), 'background'
+# (in a thread while the server starts) or 'lazy' (on the first request)
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'eager').lower()
+
+# Readiness (models loaded and warmed up) is reported separately from liveness (/health)
+models_ready = False
+startup_seconds = None
+
+# Optional micro-batching of concurrent single-patient requests
+MICRO_BATCH_ENABLED = os.getenv('MICRO_BATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+MICRO_BATCH_WINDOW_MS = float(os.getenv('MICRO_BATCH_WINDOW_MS', '2'))
+MICRO_BATCH_MAX_ROWS = int(os.getenv('MICRO_BATCH_MAX_ROWS', '64'))
+# Longest a request waits for its batched result before failing
+MICRO_BATCH_TIMEOUT_SECONDS = float(os.getenv('MICRO_BATCH_TIMEOUT_SECONDS', '30'))
+micro_batchers: Dict[str, MicroBatcher] = {}
+
+# In-process cache of full prediction responses (PREDICTION_CACHE_ENABLED=false to turn off)
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('PREDICTION_CACHE_MAX_MB', '64')) * 1024 * 1024,
+    ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '300'))
+) if PREDICTION_CACHE_ENABLED else None
+
+# Hot reload of new model versions published to the registry (MODEL_REGISTRY_WATCH=false to turn off)
+MODEL_REGISTRY_WATCH = os.getenv('MODEL_REGISTRY_WATCH', 'true').lower() in ('1', 'true', 'yes')
+registry_watcher = RegistryWatcher(
+    {slot.name: slot for slot in (*model_slots.values(), *fast_slots.values())},
+    prepare=lambda bundle: prepare_bundle(bundle),
+    poll_seconds=float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10'))
+)
+
+# Live input drift against the training distributions (DRIFT_MONITOR_ENABLED=false to turn off)
+DRIFT_MONITOR_ENABLED = os.getenv('DRIFT_MONITOR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+drift_monitor = DriftMonitor() if DRIFT_MONITOR_ENABLED else None
 
-def load_models():
+# XGBoost threads per model, once configure_threads has set them; new model versions get the same
+xgboost_nthread: Optional[int] = None
+
+def get_bundle(name: str) -> ModelBundle:
+    """Return a loaded model bundle, loading it on first use"""
+    return model_slots[name].get()
+
+def get_tier_bundle(name: str, tier: str = 'standard') -> ModelBundle:
+    """Return the bundle serving a tier; the standard model while the fast tier has no version"""
+    if tier == 'fast':
+        bundle = fast_slots[name].peek()
+        if bundle is not None:
+            return bundle
+    return get_bundle(name)
+
+def load_fast_tiers(build_explainers: bool = True):
+    """Load the fast tier of every model that has a published version (a failure keeps the tier empty)"""
+    for name, slot in fast_slots.items():
+        if active_version(slot.name) is None:
+            continue
+        try:
+            bundle = slot.get()
+            # Warm-up happens in warm_up_models: under gunicorn this runs in the master, before the fork
+            if build_explainers and model_store.SHAP_AVAILABLE:
+                bundle.engine.explainer
+        except Exception as e:
+            logger.error(f"Could not load the {name} fast tier; serving the standard model: {str(e)}")
+
+def load_models(build_explainers: bool = True):
     """Load all models and create SHAP explainers"""
-    global cardio_model, diabetes_model, diabetes_encoders, diabetes_features
-    global cardio_explainer, diabetes_explainer
-    
+    global startup_seconds
+    started = time.perf_counter()
+
     try:
-        # Load cardiovascular model
-        cardio_model = joblib.load('xgboost_model.pkl')
-        logger.info("Cardiovascular model loaded successfully")
-        
-        # Load diabetes model and encoders
-        diabetes_model = joblib.load('diabetes_xgboost_model.pkl')
-        
-        with open('diabetes_label_encoders.pkl', 'rb') as f:
-            diabetes_encoders = pickle.load(f)
-            
-        with open('diabetes_feature_info.pkl', 'rb') as f:
-            diabetes_features = pickle.load(f)
-            
-        logger.info("Diabetes model and encoders loaded successfully")
-        
-        # Create SHAP explainers
-        cardio_explainer = shap.TreeExplainer(cardio_model)
-        diabetes_explainer = shap.TreeExplainer(diabetes_model)
-        logger.info("SHAP explainers created successfully")
-        
+        for name, slot in model_slots.items():
+            bundle = slot.get()
+            if build_explainers:
+                # Build the TreeExplainer now instead of on the first exact request
+                bundle.engine.explainer
+            logger.info(f"{name.title()} model ready (version {bundle.version})")
+
+        load_fast_tiers(build_explainers)
+
+        if not model_store.SHAP_AVAILABLE:
+            logger.info("shap is not installed; exact explanations use XGBoost's native TreeSHAP")
+
+        # Responses computed by a previous model must not be served
+        if prediction_cache is not None:
+            prediction_cache.clear()
+
     except Exception as e:
         logger.error(f"Error loading models: {str(e)}")
         raise e
 
+    startup_seconds = time.perf_counter() - started
+
+def start_models():
+    """Load the models according to MODEL_LOADING and log the startup report"""
+    global models_ready
+
+    if MODEL_LOADING == 'lazy':
+        # Each model (and its explainer) is loaded by the first request that needs it
+        models_ready = True
+        logger.info("Lazy model loading: models load on first use")
+    elif MODEL_LOADING == 'background':
+        def load_in_background():
+            try:
+                load_models()
+                warm_up_models()
+                logger.info(f"Startup report: {startup_report()}")
+            except Exception:
+                logger.exception("Background model loading failed")
+
+        threading.Thread(target=load_in_background, name='model-loader', daemon=True).start()
+        logger.info("Loading models in the background; /ready reports 503 until they are warmed up")
+    else:
+        load_models()
+        warm_up_models()
+        logger.info(f"Startup report: {startup_report()}")
+
+def startup_report() -> Dict[str, Any]:
+    """Break cold-start time down into imports, deserialization and explainer construction"""
+    models = {name: slot.peek().report() if slot.loaded else {'loaded': False}
+              for name, slot in model_slots.items()}
+    return {
+        'loading_mode': MODEL_LOADING,
+        'imports_seconds': round(IMPORT_SECONDS, 4),
+        'shap_import_seconds': round(model_store.shap_import_seconds, 4) if model_store.shap_import_seconds else None,
+        'models': models,
+        'load_models_seconds': round(startup_seconds, 4) if startup_seconds is not None else None
+    }
+
+def set_model_threads(bundle: ModelBundle, nthread: int):
+    bundle.model.set_params(n_jobs=nthread)
+    bundle.model.get_booster().set_param({'nthread': nthread})
+
+def configure_threads(nthread: int):
+    """Limit the number of threads each XGBoost model uses for prediction"""
+    global xgboost_nthread
+    xgboost_nthread = nthread
+    for slot in (*model_slots.values(), *fast_slots.values()):
+        bundle = slot.peek()
+        if bundle is not None:
+            set_model_threads(bundle, nthread)
+    logger.info(f"XGBoost prediction threads set to {nthread}")
+
+def warm_up_bundle(bundle: ModelBundle):
+    """Score synthetic rows (a single row and a small batch) through one model bundle"""
+    data, build_result = WARM_UP_RECORDS[bundle.name]
+    metrics.set_labels('warm_up', bundle.name)
+    for records in ([data], [data] * 16):
+        features, _, derived, _ = bundle.pipeline.transform(records)
+        # Bypass the cache so warm-up rows never show up in its statistics
+        predict_and_explain(records, derived, features, bundle.model, bundle.engine,
+                            bundle.feature_names, build_result, DEFAULT_EXPLAIN_MODE, bundle.version, bundle.tier)
+
+def warm_up_models():
+    """Score synthetic rows through every model so the first real request is fast, then mark the process ready"""
+    global models_ready
+
+    for name in model_slots:
+        warm_up_bundle(get_bundle(name))
+    for slot in fast_slots.values():
+        bundle = slot.peek()
+        if bundle is not None:
+            warm_up_bundle(bundle)
+
+    models_ready = True
+    logger.info("Models warmed up; process is ready for traffic")
+
+def prepare_bundle(bundle: ModelBundle):
+    """Get a newly loaded model version ready for traffic before the registry watcher swaps it in"""
+    if xgboost_nthread is not None:
+        set_model_threads(bundle, xgboost_nthread)
+    if model_store.SHAP_AVAILABLE:
+        bundle.engine.explainer
+    warm_up_bundle(bundle)
+    if bundle.tier == 'standard':
+        # /model/explanations/global serves the previous summary, marked stale, until this one is ready
+        global_explanations.refresh(bundle)
+
+def start_registry_watcher():
+    """Start polling the model registry for new versions, unless MODEL_REGISTRY_WATCH is off"""
+    if MODEL_REGISTRY_WATCH:
+        registry_watcher.start()
+
+def start_drift_monitor():
+    """Start publishing this process's drift counts for the other workers (with DRIFT_STATE_DIR set)"""
+    if drift_monitor is not None:
+        drift_monitor.start()
+
 def get_risk_category(probability: float) -> str:
     """Categorize risk based on probability"""
     if probability < 0.3:
@@ -81,8 +262,6 @@ def get_risk_category(probability: float) -> str:
 def format_shap_explanation(shap_values: np.ndarray, feature_names: List[str], 
                           feature_values: np.ndarray) -> Dict[str, Any]:
     """Format SHAP values into interpretable explanations"""
-    explanations = []
-    
     # Get the SHAP values for the first sample
     # For XGBoost binary classification, shap_values is 2D: (samples, features)
     if len(shap_values.shape) == 2:
@@ -90,26 +269,34 @@ def format_shap_explanation(shap_values: np.ndarray, feature_names: List[str],
     else:
         # Handle other cases (e.g., 1D array)
         shap_vals = shap_values
-    
-    for i, (feature, shap_val, feature_val) in enumerate(zip(feature_names, shap_vals, feature_values[0])):
-        impact = "increases" if shap_val > 0 else "decreases"
-        explanations.append({
-            'feature': feature,
-            'value': float(feature_val),
-            'shap_value': float(shap_val),
-            'impact': impact,
-            'importance': abs(float(shap_val))
-        })
-    
-    # Sort by importance (absolute SHAP value)
-    explanations.sort(key=lambda x: x['importance'], reverse=True)
-    
+
+    # Sort by importance (absolute SHAP value) in NumPy, then convert to Python floats in one pass
+    order = np.argsort(-np.abs(shap_vals), kind='stable').tolist()
+    shap_list = shap_vals.tolist()
+    value_list = shortest_decimal(feature_values[0]).tolist()
+
+    explanations = [{
+        'feature': feature_names[i],
+        'value': value_list[i],
+        'shap_value': shap_list[i],
+        'impact': "increases" if shap_list[i] > 0 else "decreases",
+        'importance': abs(shap_list[i])
+    } for i in order]
+
     return {
         'explanations': explanations,
         'top_factors': explanations[:5],  # Top 5 most important factors
         'summary': generate_explanation_summary(explanations[:3])
     }
 
+def empty_explanation() -> Dict[str, Any]:
+    """Explanation block returned when explain mode is 'none'"""
+    return {
+        'explanations': [],
+        'top_factors': [],
+        'summary': 'Explanations were not requested for this prediction.'
+    }
+
 def generate_explanation_summary(top_explanations: List[Dict]) -> str:
     """Generate human-readable explanation summary"""
     if not top_explanations:
@@ -131,17 +318,451 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'MedAssist Prediction API is running',
-        'models_loaded': {
-            'cardiovascular': cardio_model is not None,
-            'diabetes': diabetes_model is not None
-        }
+        'models_loaded': {name: slot.loaded for name, slot in model_slots.items()},
+        'micro_batching': bool(micro_batchers),
+        'cache': prediction_cache.stats() if prediction_cache is not None else None
+    })
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 until then"""
+    if not models_ready:
+        return jsonify({'ready': False, 'message': 'Models are still loading'}), 503
+    return jsonify({'ready': True, 'pid': os.getpid()})
+
+@app.route('/stats', methods=['GET'])
+def runtime_stats():
+    """Runtime counters for tuning the serving layer"""
+    return jsonify({
+        'micro_batching': {
+            'enabled': bool(micro_batchers),
+            'models': {name: batcher.stats() for name, batcher in micro_batchers.items()}
+        },
+        'cache': {
+            'enabled': prediction_cache is not None,
+            **(prediction_cache.stats() if prediction_cache is not None else {})
+        },
+        'startup': startup_report()
     })
 
+def request_endpoint() -> str:
+    """Route pattern of the current request (unmatched paths share one label)"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    """Count the request as in flight and start its timer"""
+    g.request_started = time.perf_counter()
+    metrics.request_started(request_endpoint())
+
+@app.after_request
+def record_request(response):
+    """Record the request's status and total duration"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.request_finished(request_endpoint(), response.status_code, time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Per-stage latency histograms, request counters and model load times in Prometheus text format"""
+    report = startup_report()
+    load_seconds, loaded = {}, {}
+    for name, slot in model_slots.items():
+        loaded[(('model', name),)] = int(slot.loaded)
+        model_report = report['models'][name]
+        for phase in ('deserialize', 'explainer'):
+            load_seconds[(('model', name), ('phase', phase))] = model_report.get(f'{phase}_seconds')
+
+    gauges = [
+        ('medassist_model_loaded', 'Whether the model is loaded in this process', loaded),
+        ('medassist_model_load_seconds', 'Time spent loading each model, by phase', load_seconds),
+        ('medassist_import_seconds', 'Time spent importing the API modules at startup', {(): report['imports_seconds']}),
+        ('medassist_ready', 'Whether this process has loaded and warmed up its models', {(): int(models_ready)})
+    ]
+    if prediction_cache is not None:
+        cache_stats = prediction_cache.stats()
+        gauges.append(('medassist_prediction_cache', 'Prediction cache counters',
+                       {(('counter', key),): cache_stats[key]
+                        for key in ('entries', 'bytes', 'hits', 'misses', 'coalesced', 'evictions', 'expirations')}))
+
+    if drift_monitor is not None:
+        drift = drift_monitor.report()['models']
+        gauges.append(('medassist_drift_rows', 'Live rows in the drift window, all workers',
+                       {(('model', name),): report['rows'] for name, report in drift.items() if 'rows' in report}))
+        gauges.append(('medassist_feature_drift_psi', 'Population stability index of each feature against its training data',
+                       {(('model', name), ('feature', entry['feature'])): entry['psi']
+                        for name, report in drift.items() for entry in report.get('features', [])}))
+
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+# Synthetic patients used to warm up the models before a process takes traffic
+WARM_UP_CARDIO = {'age': 50, 'gender': 2, 'height': 175, 'weight': 80, 'ap_hi': 130, 'ap_lo': 85,
+                  'cholesterol': 1, 'gluc': 1, 'smoke': 0, 'alco': 0, 'active': 1}
+WARM_UP_DIABETES = {'age': 45.0, 'gender': 'Female', 'hypertension': 0, 'heart_disease': 0,
+                    'smoking_history': 'never', 'bmi': 25.0, 'HbA1c_level': 5.5, 'blood_glucose_level': 100}
+
+# Upper bound on the number of patients accepted by a single batch request
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '10000'))
+
+
+def cardio_input_data(data: Dict[str, Any], derived: Dict[str, float]) -> Dict[str, Any]:
+    """The request's own values, echoed back in the cardiovascular response"""
+    return {
+        'age_years': round(derived['age_years'], 1),
+        'bmi': round(derived['bmi'], 2),
+        'gender': 'Female' if data['gender'] == 1 else 'Male',
+        'systolic_bp': data['ap_hi'],
+        'diastolic_bp': data['ap_lo'],
+        'cholesterol_level': data['cholesterol'],
+        'glucose_level': data['gluc'],
+        'smoking': bool(data['smoke']),
+        'alcohol': bool(data['alco']),
+        'physical_activity': bool(data['active'])
+    }
+
+
+def diabetes_input_data(data: Dict[str, Any], derived: Dict[str, float]) -> Dict[str, Any]:
+    """The request's own values, echoed back in the diabetes response"""
+    return {
+        'age': data['age'],
+        'gender': data['gender'],
+        'bmi': data['bmi'],
+        'bmi_category': get_bmi_category(data['bmi']),
+        'hypertension': bool(data['hypertension']),
+        'heart_disease': bool(data['heart_disease']),
+        'smoking_history': data['smoking_history'],
+        'HbA1c_level': data['HbA1c_level'],
+        'HbA1c_category': get_hba1c_category(data['HbA1c_level']),
+        'blood_glucose_level': data['blood_glucose_level'],
+        'glucose_category': get_glucose_category(data['blood_glucose_level'])
+    }
+
+
+# Cached responses are shared by every request that encodes the same, so input_data is rebuilt per request
+INPUT_DATA_BUILDERS = {'cardiovascular': cardio_input_data, 'diabetes': diabetes_input_data}
+
+
+def build_cardio_result(data: Dict[str, Any], derived: Dict[str, float], prediction: int,
+                        prediction_proba: np.ndarray, explanations: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the cardiovascular response document for one patient"""
+    confidence = float(max(prediction_proba))
+    risk_probability = float(prediction_proba[1])  # Probability of having cardiovascular disease
+
+    # Determine risk category
+    risk_category = get_risk_category(risk_probability)
+
+    return {
+        'prediction': int(prediction),
+        'risk_probability': risk_probability,
+        'confidence_score': confidence,
+        'risk_category': risk_category,
+        'input_data': cardio_input_data(data, derived),
+        'explanations': explanations,
+        'interpretation': {
+            'result': 'High risk of cardiovascular disease' if prediction == 1 else 'Low risk of cardiovascular disease',
+            'recommendation': get_cardio_recommendations(risk_category, explanations['top_factors'])
+        }
+    }
+
+
+def build_diabetes_result(data: Dict[str, Any], derived: Dict[str, float], prediction: int,
+                          prediction_proba: np.ndarray, explanations: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the diabetes response document for one patient"""
+    confidence = float(max(prediction_proba))
+    risk_probability = float(prediction_proba[1])  # Probability of having diabetes
+
+    # Determine risk category
+    risk_category = get_risk_category(risk_probability)
+
+    return {
+        'prediction': int(prediction),
+        'risk_probability': risk_probability,
+        'confidence_score': confidence,
+        'risk_category': risk_category,
+        'input_data': diabetes_input_data(data, derived),
+        'explanations': explanations,
+        'interpretation': {
+            'result': 'High risk of diabetes' if prediction == 1 else 'Low risk of diabetes',
+            'recommendation': get_diabetes_recommendations(risk_category, explanations['top_factors'])
+        }
+    }
+
+
+# Warm-up row and result builder per model
+WARM_UP_RECORDS = {
+    'cardiovascular': (WARM_UP_CARDIO, build_cardio_result),
+    'diabetes': (WARM_UP_DIABETES, build_diabetes_result)
+}
+
+
+def score_records(bundle: ModelBundle, records: List[Any], build_result,
+                  explain_mode: str = DEFAULT_EXPLAIN_MODE) -> List[Tuple[Dict[str, Any], Exception]]:
+    """
+    Score a list of patient records as a single feature matrix.
+
+    Records are encoded by the model's feature pipeline, which validates each
+    row on its own so that a bad row only fails itself. Rows whose encoded feature vector is already cached (for the
+    same model version and explain mode) are answered from the cache; the rest
+    are stacked and sent through one predict_proba call and one explanation
+    call in the requested mode.
+
+    Returns:
+        list: One (result, error) pair per input record, in input order.
+    """
+    timings: Dict[str, float] = {}
+    features, positions, derived, errors = bundle.pipeline.transform(records, timings=timings)
+    metrics.observe_stage('validation', timings['validation'])
+    metrics.observe_stage('encoding', timings['encoding'])
+    outcomes: List[Tuple[Dict[str, Any], Exception]] = [(None, error) for error in errors]
+
+    if not positions:
+        return outcomes
+
+    if drift_monitor is not None:
+        drift_monitor.observe(bundle, features)
+
+    used_mode = bundle.engine.resolve_mode(explain_mode)
+
+    # Look every row up in the cache; only rows this call claims are scored here
+    keys = [None] * len(positions)
+    owned, waiting = [], []
+    if prediction_cache is not None:
+        cache_started = time.perf_counter()
+        for j, i in enumerate(positions):
+            keys[j] = (bundle.name, bundle.tier, bundle.version, used_mode, features[j].tobytes())
+            status, payload = prediction_cache.acquire(keys[j])
+            if status == 'hit':
+                outcomes[i] = (with_input_data(bundle, payload, records[i], derived[j]), None)
+            elif status == 'wait':
+                waiting.append((i, j, payload))
+            else:
+                owned.append(j)
+        metrics.observe_stage('cache', time.perf_counter() - cache_started)
+    else:
+        owned = list(range(len(positions)))
+
+    if owned:
+        try:
+            scored = predict_and_explain(
+                [records[positions[j]] for j in owned], [derived[j] for j in owned], features[owned],
+                bundle.model, bundle.engine, bundle.feature_names, build_result, used_mode, bundle.version,
+                bundle.tier)
+        except Exception as e:
+            for j in owned:
+                if keys[j] is not None:
+                    prediction_cache.release(keys[j], e)
+            raise
+
+        for j, (result, error) in zip(owned, scored):
+            outcomes[positions[j]] = (result, error)
+            if keys[j] is not None:
+                if error is None:
+                    # Responses differ only by the encoded row: size them once per model version and mode
+                    prediction_cache.put(keys[j], result, shape=keys[j][:-1])
+                else:
+                    prediction_cache.release(keys[j], error)
+
+    # Rows that another request (or an earlier duplicate row) was already computing
+    for i, j, future in waiting:
+        try:
+            outcomes[i] = (with_input_data(bundle, future.result(), records[i], derived[j]), None)
+        except Exception as e:
+            outcomes[i] = (None, e)
+
+    return outcomes
+
+
+def with_input_data(bundle: ModelBundle, result: Dict[str, Any], data: Dict[str, Any],
+                    derived: Dict[str, float]) -> Dict[str, Any]:
+    """Copy of a cached result echoing this request's input instead of the one that computed it"""
+    return {**result, 'input_data': INPUT_DATA_BUILDERS[bundle.name](data, derived)}
+
+
+def predict_and_explain(records: List[Dict[str, Any]], derived: List[Dict[str, float]], features: np.ndarray,
+                        model, engine: ExplanationEngine, feature_names: List[str], build_result,
+                        explain_mode: str, model_version: str,
+                        model_tier: str = 'standard') -> List[Tuple[Dict[str, Any], Exception]]:
+    """Run one predict_proba and one explanation call over a feature matrix and build each row's result"""
+    outcomes: List[Tuple[Dict[str, Any], Exception]] = []
+
+    # Make predictions for the whole matrix at once
+    with metrics.stage('predict_proba'):
+        prediction_proba = model.predict_proba(features)
+        predictions = (prediction_proba[:, 1] > 0.5).astype(int)
+
+    # Generate explanations for the whole matrix at once
+    with metrics.stage('shap'):
+        shap_values = engine.contributions(features, explain_mode)
+
+    # Per-row formatting and result building, timed as one observation each for the whole matrix
+    format_seconds = build_seconds = 0.0
+    for j in range(len(records)):
+        try:
+            started = time.perf_counter()
+            if shap_values is None:
+                explanations = empty_explanation()
+            else:
+                explanations = format_shap_explanation(shap_values[j:j + 1], feature_names, features[j:j + 1])
+            formatted = time.perf_counter()
+            format_seconds += formatted - started
+            result = build_result(records[j], derived[j], predictions[j], prediction_proba[j], explanations)
+            result['explain_mode'] = explain_mode
+            result['model_version'] = model_version
+            result['model_tier'] = model_tier
+            build_seconds += time.perf_counter() - formatted
+            outcomes.append((result, None))
+        except Exception as e:
+            outcomes.append((None, e))
+
+    metrics.observe_stage('format', format_seconds)
+    metrics.observe_stage('recommendations', build_seconds)
+
+    return outcomes
+
+
+def score_cardio_records(records: List[Any], explain_mode: str = DEFAULT_EXPLAIN_MODE,
+                         tier: str = 'standard') -> List[Tuple[Dict[str, Any], Exception]]:
+    """Score cardiovascular records in one vectorized pass"""
+    return score_records(get_tier_bundle('cardiovascular', tier), records, build_cardio_result, explain_mode)
+
+
+def score_diabetes_records(records: List[Any], explain_mode: str = DEFAULT_EXPLAIN_MODE,
+                           tier: str = 'standard') -> List[Tuple[Dict[str, Any], Exception]]:
+    """Score diabetes records in one vectorized pass"""
+    return score_records(get_tier_bundle('diabetes', tier), records, build_diabetes_result, explain_mode)
+
+
+def score_by_explain_mode(scorer, items: List[Tuple[Any, str]]) -> List[Tuple[Dict[str, Any], Exception]]:
+    """Score (record, explain_mode) pairs with one matrix per distinct explain mode"""
+    outcomes: List[Tuple[Dict[str, Any], Exception]] = [(None, None)] * len(items)
+    by_mode: Dict[str, List[int]] = {}
+    for i, (_, mode) in enumerate(items):
+        by_mode.setdefault(mode, []).append(i)
+
+    for mode, positions in by_mode.items():
+        for i, outcome in zip(positions, scorer([items[i][0] for i in positions], mode)):
+            outcomes[i] = outcome
+
+    return outcomes
+
+
+def init_micro_batching(window_ms: float = MICRO_BATCH_WINDOW_MS, max_rows: int = MICRO_BATCH_MAX_ROWS):
+    """Route single-patient requests through per-model micro-batchers"""
+    micro_batchers['cardiovascular'] = MicroBatcher(
+        'cardiovascular', lambda items: score_by_explain_mode(score_cardio_records, items), max_rows, window_ms)
+    micro_batchers['diabetes'] = MicroBatcher(
+        'diabetes', lambda items: score_by_explain_mode(score_diabetes_records, items), max_rows, window_ms)
+    logger.info(f"Micro-batching enabled (window {window_ms} ms, max {max_rows} rows)")
+
+
+def get_explain_mode() -> str:
+    """Read the explanation mode from the ?explain= query parameter"""
+    mode = request.args.get('explain', DEFAULT_EXPLAIN_MODE).lower()
+    if mode not in EXPLAIN_MODES:
+        raise ValidationError(f'Invalid explain mode. Must be one of: {list(EXPLAIN_MODES)}')
+    return mode
+
+
+def get_model_tier() -> str:
+    """Read the serving tier from the ?tier= query parameter"""
+    tier = request.args.get('tier', DEFAULT_MODEL_TIER).lower()
+    if tier not in MODEL_TIERS:
+        raise ValidationError(f'Invalid tier. Must be one of: {MODEL_TIERS}')
+    return tier
+
+
+def single_prediction_response(scorer, label: str):
+    """Run a single-patient request through the batch scorer and shape the HTTP response"""
+    try:
+        metrics.set_labels(request.url_rule.rule, label)
+        with metrics.stage('parse'):
+            data = request.get_json()
+
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        try:
+            explain_mode = get_explain_mode()
+            tier = get_model_tier()
+            projection = parse_projection(request.args)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Concurrent requests share one matrix when micro-batching is on; the fast tier never waits for a batch
+        batcher = micro_batchers.get(label) if tier == 'standard' else None
+        if batcher is not None:
+            result, error = batcher.submit((data, explain_mode), timeout=MICRO_BATCH_TIMEOUT_SECONDS)
+        else:
+            result, error = scorer([data], explain_mode, tier)[0]
+        if isinstance(error, ValidationError):
+            return jsonify({'error': str(error)}), 400
+        if error is not None:
+            raise error
+
+        with metrics.stage('serialization'):
+            return json_response(projection.apply(result))
+
+    except Exception as e:
+        logger.error(f"Error in {label} prediction: {str(e)}")
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+
+
+def batch_prediction_response(scorer, label: str):
+    """
+    Score a list of patients and return one entry per patient.
+
+    Accepts either a bare JSON list or an object of the form {"patients": [...]}.
+    Each entry of "results" is the single-patient response for that row plus its
+    "index", or {"index": i, "error": "..."} when that row could not be scored.
+    """
+    try:
+        metrics.set_labels(request.url_rule.rule, label)
+        with metrics.stage('parse'):
+            data = request.get_json()
+
+        records = data.get('patients') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'Expected a non-empty list of patients'}), 400
+
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({
+                'error': f'Batch too large: {len(records)} patients (maximum {MAX_BATCH_SIZE})'
+            }), 413
+
+        try:
+            explain_mode = get_explain_mode()
+            tier = get_model_tier()
+            projection = parse_projection(request.args)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+
+        results = []
+        for i, (result, error) in enumerate(scorer(records, explain_mode, tier)):
+            if error is not None:
+                results.append({'index': i, 'error': str(error)})
+            else:
+                results.append({'index': i, **projection.apply(result)})
+
+        failed = sum(1 for r in results if 'error' in r)
+        with metrics.stage('serialization'):
+            return json_response({
+                'count': len(results),
+                'succeeded': len(results) - failed,
+                'failed': failed,
+                'results': results
+            })
+
+    except Exception as e:
+        logger.error(f"Error in {label} batch prediction: {str(e)}")
+        return jsonify({'error': f'Batch prediction failed: {str(e)}'}), 500
+
+
 @app.route('/predict/cardiovascular', methods=['POST'])
 def predict_cardiovascular():
     """
     Predict cardiovascular disease risk
-    
+
     Expected JSON input:
     {
         "age": float (in days, will be converted to years),
@@ -156,97 +777,32 @@ def predict_cardiovascular():
         "alco": int (0=no, 1=yes),
         "active": int (0=no, 1=yes)
     }
+
+    Optional query parameters:
+        explain: "exact" (default), "native", "approx" or "none"
+        tier: "standard" (default) or "fast" for the distilled model, when one is published
+        fields: comma-separated response fields to return, e.g. "risk_probability,top_factors"
+        top_k: number of explanation factors to return
     """
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
-        
-        # Validate required fields
-        required_fields = ['age', 'gender', 'height', 'weight', 'ap_hi', 'ap_lo', 
-                          'cholesterol', 'gluc', 'smoke', 'alco', 'active']
-        
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'error': f'Missing required fields: {missing_fields}'
-            }), 400
-        
-        # Convert age from days to years if needed (assuming input is in days as per original dataset)
-        age_years = data['age'] / 365.25 if data['age'] > 150 else data['age']
-        
-        # Calculate BMI
-        height_m = data['height'] / 100  # Convert cm to meters
-        bmi = data['weight'] / (height_m ** 2)
-        
-        # Prepare features for prediction
-        # Note: The exact feature order should match the training data
-        features = np.array([[
-            age_years,
-            data['gender'],
-            data['height'],
-            data['weight'],
-            data['ap_hi'],
-            data['ap_lo'],
-            data['cholesterol'],
-            data['gluc'],
-            data['smoke'],
-            data['alco'],
-            data['active']
-        ]])
-        
-        feature_names = ['age', 'gender', 'height', 'weight', 'ap_hi', 'ap_lo', 
-                        'cholesterol', 'gluc', 'smoke', 'alco', 'active']
-        
-        # Make prediction
-        prediction = cardio_model.predict(features)[0]
-        prediction_proba = cardio_model.predict_proba(features)[0]
-        confidence = float(max(prediction_proba))
-        risk_probability = float(prediction_proba[1])  # Probability of having cardiovascular disease
-        
-        # Generate SHAP explanations
-        shap_values = cardio_explainer.shap_values(features)
-        explanations = format_shap_explanation(shap_values, feature_names, features)
-        
-        # Determine risk category
-        risk_category = get_risk_category(risk_probability)
-        
-        result = {
-            'prediction': int(prediction),
-            'risk_probability': risk_probability,
-            'confidence_score': confidence,
-            'risk_category': risk_category,
-            'input_data': {
-                'age_years': round(age_years, 1),
-                'bmi': round(bmi, 2),
-                'gender': 'Female' if data['gender'] == 1 else 'Male',
-                'systolic_bp': data['ap_hi'],
-                'diastolic_bp': data['ap_lo'],
-                'cholesterol_level': data['cholesterol'],
-                'glucose_level': data['gluc'],
-                'smoking': bool(data['smoke']),
-                'alcohol': bool(data['alco']),
-                'physical_activity': bool(data['active'])
-            },
-            'explanations': explanations,
-            'interpretation': {
-                'result': 'High risk of cardiovascular disease' if prediction == 1 else 'Low risk of cardiovascular disease',
-                'recommendation': get_cardio_recommendations(risk_category, explanations['top_factors'])
-            }
-        }
-        
-        return jsonify(result)
-        
-    except Exception as e:
-        logger.error(f"Error in cardiovascular prediction: {str(e)}")
-        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+    return single_prediction_response(score_cardio_records, 'cardiovascular')
+
+@app.route('/predict/cardiovascular/batch', methods=['POST'])
+def predict_cardiovascular_batch():
+    """
+    Predict cardiovascular disease risk for many patients at once
+
+    Expected JSON input:
+    {
+        "patients": [ {same fields as /predict/cardiovascular}, ... ]
+    }
+    """
+    return batch_prediction_response(score_cardio_records, 'cardiovascular')
 
 @app.route('/predict/diabetes', methods=['POST'])
 def predict_diabetes():
     """
     Predict diabetes risk
-    
+
     Expected JSON input:
     {
         "age": float,
@@ -258,103 +814,71 @@ def predict_diabetes():
         "HbA1c_level": float,
         "blood_glucose_level": int
     }
+
+    Optional query parameters:
+        explain: "exact" (default), "native", "approx" or "none"
+        tier: "standard" (default) or "fast", as for /predict/cardiovascular
+        fields, top_k: response projection, as for /predict/cardiovascular
+    """
+    return single_prediction_response(score_diabetes_records, 'diabetes')
+
+@app.route('/predict/diabetes/batch', methods=['POST'])
+def predict_diabetes_batch():
+    """
+    Predict diabetes risk for many patients at once
+
+    Expected JSON input:
+    {
+        "patients": [ {same fields as /predict/diabetes}, ... ]
+    }
+    """
+    return batch_prediction_response(score_diabetes_records, 'diabetes')
+
+
+@app.route('/predict/<model>/sweep', methods=['POST'])
+def predict_sweep(model: str):
+    """
+    What-if sweep: risk of one patient as one or two features vary
+
+    Expected JSON input:
+    {
+        "patient": {same fields as /predict/<model>},
+        "sweep": [
+            {"feature": "ap_hi", "start": 100, "stop": 200, "steps": 51},
+            {"feature": "cholesterol", "values": [1, 2, 3]}       (optional second axis)
+        ]
+    }
+
+    Optional query parameters:
+        explain: "none" (default), "native", "approx" or "exact"
+        tier: "standard" (default) or "fast", as for /predict/cardiovascular
     """
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
-        
-        # Validate required fields
-        required_fields = ['age', 'gender', 'hypertension', 'heart_disease', 
-                          'smoking_history', 'bmi', 'HbA1c_level', 'blood_glucose_level']
-        
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'error': f'Missing required fields: {missing_fields}'
-            }), 400
-        
-        # Validate categorical values
-        valid_genders = ['Female', 'Male', 'Other']
-        valid_smoking = ['never', 'No Info', 'current', 'former', 'ever', 'not current']
-        
-        if data['gender'] not in valid_genders:
-            return jsonify({
-                'error': f'Invalid gender. Must be one of: {valid_genders}'
-            }), 400
-            
-        if data['smoking_history'] not in valid_smoking:
-            return jsonify({
-                'error': f'Invalid smoking_history. Must be one of: {valid_smoking}'
-            }), 400
-        
-        # Encode categorical variables
+        if model not in model_slots:
+            return jsonify({'error': f'Unknown model. Must be one of: {list(model_slots)}'}), 400
+
+        metrics.set_labels(request.url_rule.rule, model)
+        with metrics.stage('parse'):
+            data = request.get_json()
+
+        explain_mode = request.args.get('explain', 'none').lower()
+        if explain_mode not in EXPLAIN_MODES:
+            return jsonify({'error': f'Invalid explain mode. Must be one of: {list(EXPLAIN_MODES)}'}), 400
+
         try:
-            gender_encoded = diabetes_encoders['gender_encoder'].transform([data['gender']])[0]
-            smoking_encoded = diabetes_encoders['smoking_encoder'].transform([data['smoking_history']])[0]
-        except ValueError as e:
-            return jsonify({
-                'error': f'Invalid categorical value: {str(e)}'
-            }), 400
-        
-        # Prepare features for prediction
-        features = np.array([[
-            data['age'],
-            data['hypertension'], 
-            data['heart_disease'],
-            data['bmi'],
-            data['HbA1c_level'],
-            data['blood_glucose_level'],
-            gender_encoded,
-            smoking_encoded
-        ]])
-        
-        feature_names = diabetes_features['feature_names']
-        
-        # Make prediction
-        prediction = diabetes_model.predict(features)[0]
-        prediction_proba = diabetes_model.predict_proba(features)[0]
-        confidence = float(max(prediction_proba))
-        risk_probability = float(prediction_proba[1])  # Probability of having diabetes
-        
-        # Generate SHAP explanations
-        shap_values = diabetes_explainer.shap_values(features)
-        explanations = format_shap_explanation(shap_values, feature_names, features)
-        
-        # Determine risk category
-        risk_category = get_risk_category(risk_probability)
-        
-        result = {
-            'prediction': int(prediction),
-            'risk_probability': risk_probability,
-            'confidence_score': confidence,
-            'risk_category': risk_category,
-            'input_data': {
-                'age': data['age'],
-                'gender': data['gender'],
-                'bmi': data['bmi'],
-                'bmi_category': get_bmi_category(data['bmi']),
-                'hypertension': bool(data['hypertension']),
-                'heart_disease': bool(data['heart_disease']),
-                'smoking_history': data['smoking_history'],
-                'HbA1c_level': data['HbA1c_level'],
-                'HbA1c_category': get_hba1c_category(data['HbA1c_level']),
-                'blood_glucose_level': data['blood_glucose_level'],
-                'glucose_category': get_glucose_category(data['blood_glucose_level'])
-            },
-            'explanations': explanations,
-            'interpretation': {
-                'result': 'High risk of diabetes' if prediction == 1 else 'Low risk of diabetes',
-                'recommendation': get_diabetes_recommendations(risk_category, explanations['top_factors'])
-            }
-        }
-        
-        return jsonify(result)
-        
+            tier = get_model_tier()
+            patient, axes = risk_sweep.parse_sweep(data)
+            result = risk_sweep.sweep(get_tier_bundle(model, tier), patient, axes, explain_mode)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with metrics.stage('serialization'):
+            return json_response(result)
+
     except Exception as e:
-        logger.error(f"Error in diabetes prediction: {str(e)}")
-        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+        logger.error(f"Error in {model} sweep: {str(e)}")
+        return jsonify({'error': f'Sweep failed: {str(e)}'}), 500
+
 
 def get_bmi_category(bmi: float) -> str:
     """Categorize BMI"""
@@ -441,31 +965,98 @@ def get_diabetes_recommendations(risk_category: str, top_factors: List[Dict]) ->
     
     return recommendations
 
+def fast_tier_info(name: str) -> Dict[str, Any]:
+    """The fast tier serving a model, if one is loaded"""
+    bundle = fast_slots[name].peek()
+    return {
+        'loaded': bundle is not None,
+        'version': bundle.version if bundle else None,
+        'source': bundle.source if bundle else None
+    }
+
 @app.route('/model/info', methods=['GET'])
 def model_info():
     """Get information about the loaded models"""
+    cardio_bundle = model_slots['cardiovascular'].peek()
     cardio_info = {
-        'loaded': cardio_model is not None,
+        'loaded': cardio_bundle is not None,
         'type': 'XGBoost Classifier',
         'purpose': 'Cardiovascular Disease Prediction',
-        'features': ['age', 'gender', 'height', 'weight', 'ap_hi', 'ap_lo', 
-                    'cholesterol', 'gluc', 'smoke', 'alco', 'active']
+        'version': cardio_bundle.version if cardio_bundle else None,
+        'source': cardio_bundle.source if cardio_bundle else None,
+        'features': CARDIO_FEATURE_NAMES,
+        'fast_tier': fast_tier_info('cardiovascular')
     }
     
+    diabetes_bundle = model_slots['diabetes'].peek()
     diabetes_info = {
-        'loaded': diabetes_model is not None,
+        'loaded': diabetes_bundle is not None,
         'type': 'XGBoost Classifier', 
         'purpose': 'Diabetes Risk Prediction',
-        'features': diabetes_features['feature_names'] if diabetes_features else []
+        'version': diabetes_bundle.version if diabetes_bundle else None,
+        'source': diabetes_bundle.source if diabetes_bundle else None,
+        'features': diabetes_bundle.feature_names if diabetes_bundle else [],
+        'fast_tier': fast_tier_info('diabetes')
     }
     
     return jsonify({
         'cardiovascular_model': cardio_info,
         'diabetes_model': diabetes_info,
-        'shap_explanations': 'Available for both models'
+        'shap_explanations': 'Available for both models',
+        'explain_modes': list(EXPLAIN_MODES),
+        'default_explain_mode': DEFAULT_EXPLAIN_MODE,
+        'model_tiers': MODEL_TIERS,
+        'default_model_tier': DEFAULT_MODEL_TIER,
+        'model_registry': registry_watcher.status()
     })
 
 
+@app.route('/model/explanations/global', methods=['GET'])
+def global_explanation():
+    """
+    Model-wide explanation: mean |SHAP|, SHAP distributions and dependence summaries per feature
+
+    Computed once per model version over a reference sample of the training data, in the
+    background; pass ?model=cardiovascular or ?model=diabetes for one model.
+    """
+    try:
+        name = request.args.get('model')
+        if name is not None and name not in model_slots:
+            return jsonify({'error': f'Unknown model. Must be one of: {list(model_slots)}'}), 400
+
+        names = [name] if name is not None else list(model_slots)
+        return jsonify({
+            'models': {n: global_explanations.serving_summary(get_bundle(n)) for n in names}
+        })
+
+    except Exception as e:
+        logger.error(f"Error computing global explanations: {str(e)}")
+        return jsonify({'error': f'Global explanation failed: {str(e)}'}), 500
+
+
+@app.route('/model/drift', methods=['GET'])
+def model_drift():
+    """
+    Input drift of live prediction traffic against the training data
+
+    PSI and KS distance per feature over the last one to two drift windows,
+    merged across workers when DRIFT_STATE_DIR is set; pass ?model= for one model.
+    """
+    try:
+        if drift_monitor is None:
+            return jsonify({'error': 'Drift monitoring is disabled (DRIFT_MONITOR_ENABLED=false)'}), 404
+
+        name = request.args.get('model')
+        if name is not None and name not in model_slots:
+            return jsonify({'error': f'Unknown model. Must be one of: {list(model_slots)}'}), 400
+
+        return jsonify(drift_monitor.report([name] if name is not None else list(model_slots)))
+
+    except Exception as e:
+        logger.error(f"Error computing drift report: {str(e)}")
+        return jsonify({'error': f'Drift report failed: {str(e)}'}), 500
+
+
 NORMAL_RANGES = {
     'male': {
         'rbc': (4.5, 5.9),        # Red Blood Cell Count (x10^12/L)
@@ -500,6 +1091,23 @@ UNITS = {
     'rdw': '%'
 }
 
+# Ranges per sex, merged once instead of on every call
+APPLICABLE_RANGES = {sex: {**NORMAL_RANGES['common'], **NORMAL_RANGES[sex]} for sex in ('male', 'female')}
+
+# Column layout of the panel matrix used by the batch analysis
+CBC_SEXES = ['male', 'female']
+CBC_PARAMETERS = list(APPLICABLE_RANGES['male'])
+CBC_COLUMNS = {param: i for i, param in enumerate(CBC_PARAMETERS)}
+
+# Bounds as (sex, parameter) arrays, so all panels are range-checked in one comparison
+CBC_LOW = np.array([[APPLICABLE_RANGES[sex][param][0] for param in CBC_PARAMETERS] for sex in CBC_SEXES])
+CBC_HIGH = np.array([[APPLICABLE_RANGES[sex][param][1] for param in CBC_PARAMETERS] for sex in CBC_SEXES])
+CBC_RANGE_LABELS = {
+    sex: {param: f"{low} - {high} {UNITS.get(param, '')}" for param, (low, high) in APPLICABLE_RANGES[sex].items()}
+    for sex in CBC_SEXES
+}
+CBC_STATUSES = ('Normal', 'Low', 'High')
+
 # --- Core Analysis Logic ---
 
 def analyze_cbc(sex: str, cbc_data: dict) -> dict:
@@ -516,8 +1124,8 @@ def analyze_cbc(sex: str, cbc_data: dict) -> dict:
     findings = []
     abnormalities = []
 
-    # Combine common ranges with the appropriate sex-specific ranges
-    applicable_ranges = {**NORMAL_RANGES['common'], **NORMAL_RANGES[sex]}
+    # Common ranges combined with the appropriate sex-specific ranges
+    applicable_ranges = APPLICABLE_RANGES[sex]
 
     for param, value in cbc_data.items():
         param_lower = param.lower()
@@ -550,6 +1158,81 @@ def analyze_cbc(sex: str, cbc_data: dict) -> dict:
     return {"summary": summary, "detailed_analysis": findings}
 
 
+def analyze_cbc_batch(panels: List[Tuple[str, Dict[str, float]]]) -> List[dict]:
+    """
+    Analyze many CBC panels at once; each result matches analyze_cbc for that panel.
+
+    Args:
+        panels: (sex, cbc_data) pairs as accepted by analyze_cbc.
+
+    Returns:
+        list: One {"summary", "detailed_analysis"} dict per panel, in input order.
+    """
+    # Panel matrix with NaN for parameters a panel does not report
+    values = np.full((len(panels), len(CBC_PARAMETERS)), np.nan)
+    sex_codes = np.empty(len(panels), dtype=np.intp)
+    for i, (sex, cbc_data) in enumerate(panels):
+        sex_codes[i] = CBC_SEXES.index(sex)
+        for param, value in cbc_data.items():
+            column = CBC_COLUMNS.get(param.lower())
+            if column is not None:
+                values[i, column] = value
+
+    # 0 = Normal, 1 = Low, 2 = High for every (panel, parameter) in one pass
+    status_codes = np.where(values < CBC_LOW[sex_codes], 1, np.where(values > CBC_HIGH[sex_codes], 2, 0)).tolist()
+
+    results = []
+    for i, (sex, cbc_data) in enumerate(panels):
+        range_labels = CBC_RANGE_LABELS[sex]
+        row_codes = status_codes[i]
+        findings = []
+        abnormalities = []
+        for param, value in cbc_data.items():
+            param_lower = param.lower()
+            column = CBC_COLUMNS.get(param_lower)
+            if column is None:
+                continue
+            status = CBC_STATUSES[row_codes[column]]
+            if status != "Normal":
+                abnormalities.append(f"{param.upper()} is {status.lower()}")
+            findings.append({
+                "parameter": param.upper(),
+                "value": value,
+                "status": status,
+                "normal_range": range_labels[param_lower]
+            })
+
+        if not abnormalities:
+            summary = "All provided CBC parameters are within the normal range."
+        else:
+            summary = ". ".join(abnormalities) + "."
+        results.append({"summary": summary, "detailed_analysis": findings})
+
+    return results
+
+
+def parse_cbc_panel(data: Any) -> Tuple[str, Dict[str, float]]:
+    """Validate one CBC request body and return (sex, numeric parameters)"""
+    if not data or not isinstance(data, dict):
+        raise ValidationError("Invalid JSON payload")
+
+    sex = data.get('sex', '')
+    sex = sex.lower() if isinstance(sex, str) else ''
+    if sex not in ['male', 'female']:
+        raise ValidationError("Mandatory parameter 'sex' is missing or invalid. Must be 'male' or 'female'.")
+
+    # CBC parameters, excluding 'sex'
+    cbc_params = {k.lower(): v for k, v in data.items() if k.lower() != 'sex'}
+    if not cbc_params:
+        raise ValidationError("No CBC parameters provided for analysis.")
+
+    # All provided CBC values must be numeric
+    try:
+        return sex, {k: float(v) for k, v in cbc_params.items()}
+    except (ValueError, TypeError):
+        raise ValidationError("All CBC parameter values must be numeric.")
+
+
 # --- API Endpoint Definition ---
 
 @app.route('/analyze_cbc', methods=['POST'])
@@ -557,40 +1240,240 @@ def cbc_analyzer_api():
     """
     API endpoint to receive and process a CBC analysis request.
     """
-    # 1. Get and validate the JSON payload from the request
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON payload"}), 400
+    # 1. Get and validate the JSON payload: 'sex' is mandatory and all CBC values must be numeric
+    try:
+        sex, cbc_params_numeric = parse_cbc_panel(request.get_json())
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 2. Call the analysis function and return the result
+    result = analyze_cbc(sex, cbc_params_numeric)
+    return jsonify(result), 200
+
+
+@app.route('/analyze_cbc/batch', methods=['POST'])
+def cbc_batch_analyzer_api():
+    """
+    Analyze a list of CBC panels in one request.
+
+    Accepts either a bare JSON list or an object of the form {"panels": [...]}.
+    Each entry of "results" is the /analyze_cbc response for that panel plus its
+    "index", or {"index": i, "error": "..."} when that panel is invalid.
+    """
+    try:
+        data = request.get_json()
+
+        items = data.get('panels') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Expected a non-empty list of CBC panels'}), 400
+
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({
+                'error': f'Batch too large: {len(items)} panels (maximum {MAX_BATCH_SIZE})'
+            }), 413
+
+        results = [None] * len(items)
+        valid_indices, panels = [], []
+        for i, item in enumerate(items):
+            try:
+                panels.append(parse_cbc_panel(item))
+                valid_indices.append(i)
+            except ValidationError as e:
+                results[i] = {'index': i, 'error': str(e)}
+
+        if panels:
+            for i, result in zip(valid_indices, analyze_cbc_batch(panels)):
+                results[i] = {'index': i, **result}
 
-    # 2. Validate mandatory 'sex' parameter
-    sex = data.get('sex', '').lower()
-    if sex not in ['male', 'female']:
         return jsonify({
-            "error": "Mandatory parameter 'sex' is missing or invalid. Must be 'male' or 'female'."
-        }), 400
+            'count': len(results),
+            'succeeded': len(panels),
+            'failed': len(results) - len(panels),
+            'results': results
+        })
 
-    # 3. Extract CBC parameters, excluding 'sex'
-    cbc_params = {k.lower(): v for k, v in data.items() if k.lower() != 'sex'}
+    except Exception as e:
+        logger.error(f"Error in CBC batch analysis: {str(e)}")
+        return jsonify({'error': f'Batch analysis failed: {str(e)}'}), 500
 
-    if not cbc_params:
-        return jsonify({"error": "No CBC parameters provided for analysis."}), 400
 
-    # 4. Ensure all provided CBC values are numeric
+# --- Combined Assessment ---
+
+# Inputs only the cardiovascular or only the diabetes model uses; a part runs when any of its inputs is given
+CARDIO_ONLY_FIELDS = ['height', 'weight', 'ap_hi', 'ap_lo', 'cholesterol', 'gluc', 'smoke', 'alco', 'active']
+DIABETES_ONLY_FIELDS = ['hypertension', 'heart_disease', 'smoking_history', 'HbA1c_level', 'blood_glucose_level']
+
+CARDIO_GENDER_CODES = {'Female': 1, 'Male': 2}
+GENDER_LABELS = {1: 'Female', 2: 'Male'}
+
+# Threads scoring the model parts of assessments; the CBC part runs on the request thread
+ASSESSMENT_WORKERS = int(os.getenv('ASSESSMENT_WORKERS', '8'))
+assessment_executor = ThreadPoolExecutor(max_workers=ASSESSMENT_WORKERS, thread_name_prefix='assessment')
+
+
+def derive_shared_features(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse the demographics shared by every part of an assessment, once.
+
+    Returns:
+        dict: gender label, cardiovascular gender code, CBC sex, age as given
+        (days or years) and in years, and BMI (given, or from height and weight).
+    """
+    gender = data.get('gender')
+    if isinstance(gender, str) and gender.capitalize() in ('Female', 'Male', 'Other'):
+        label = gender.capitalize()
+    elif gender in GENDER_LABELS:
+        label = GENDER_LABELS[gender]
+    else:
+        raise ValidationError("Field 'gender' must be 'Female', 'Male', 'Other', 1 (female) or 2 (male)")
+
+    shared: Dict[str, Any] = {'gender': label, 'gender_code': CARDIO_GENDER_CODES.get(label), 'sex': label.lower()}
+
     try:
-        cbc_params_numeric = {k: float(v) for k, v in cbc_params.items()}
-    except (ValueError, TypeError):
-        return jsonify({"error": "All CBC parameter values must be numeric."}), 400
+        age = float(data['age'])
+    except KeyError:
+        raise ValidationError("Missing required fields: ['age']")
+    except (TypeError, ValueError):
+        raise ValidationError("Field 'age' must be numeric")
+    shared['age'] = data['age']
+    # Same heuristic as the cardiovascular pipeline: above 150 the age is in days
+    shared['age_years'] = age / 365.25 if age > 150 else age
 
-    # 5. Call the analysis function and return the result
-    result = analyze_cbc(sex, cbc_params_numeric)
-    return jsonify(result), 200
+    if data.get('bmi') is not None:
+        shared['bmi'] = data['bmi']
+    elif data.get('height') is not None and data.get('weight') is not None:
+        try:
+            shared['bmi'] = round(float(data['weight']) / (float(data['height']) / 100) ** 2, 2)
+        except (TypeError, ValueError, ZeroDivisionError):
+            raise ValidationError("Fields 'height' and 'weight' must be numeric and height greater than 0")
+    return shared
+
+
+def run_assessment_part(name: str, work, *args) -> Tuple[Dict[str, Any], float]:
+    """Run one part of an assessment and return (section, seconds)"""
+    started = time.perf_counter()
+    metrics.set_labels('/predict/assessment', name)
+    try:
+        section = work(*args)
+    except ValidationError as e:
+        section = {'error': str(e)}
+    except Exception as e:
+        logger.error(f"Error in assessment part {name}: {str(e)}")
+        section = {'error': f'{name} failed: {str(e)}'}
+    return section, time.perf_counter() - started
+
+
+def score_assessment_model(scorer, record: Dict[str, Any], explain_mode: str, tier: str,
+                           projection) -> Dict[str, Any]:
+    result, error = scorer([record], explain_mode, tier)[0]
+    if error is not None:
+        raise error
+    return projection.apply(result)
 
 
+def analyze_assessment_cbc(sex: str, cbc: Any) -> Dict[str, Any]:
+    if isinstance(cbc, dict) and 'sex' not in cbc:
+        cbc = {'sex': sex, **cbc}
+    return analyze_cbc(*parse_cbc_panel(cbc))
+
+
+@app.route('/predict/assessment', methods=['POST'])
+def predict_assessment():
+    """
+    Combined intake assessment: cardiovascular, diabetes and CBC for one patient
+
+    Expected JSON input: one patient record with the shared fields (age, gender
+    as 'Female'/'Male' or 1/2, height and weight or bmi), the fields of
+    /predict/cardiovascular and /predict/diabetes, and optionally a "cbc"
+    object with the parameters of /analyze_cbc. Each part runs when its inputs
+    are present; the parts run concurrently.
+
+    Optional query parameters:
+        explain, tier, fields, top_k: as for /predict/cardiovascular, applied to both models
+    """
+    try:
+        started = time.perf_counter()
+        metrics.set_labels(request.url_rule.rule, 'assessment')
+        with metrics.stage('parse'):
+            data = request.get_json()
+
+        if not data or not isinstance(data, dict):
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        try:
+            explain_mode = get_explain_mode()
+            tier = get_model_tier()
+            projection = parse_projection(request.args)
+            shared = derive_shared_features(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Every part gets its own copy of the record, with the shared values in its model's encoding
+        parts = {}
+        if any(field in data for field in CARDIO_ONLY_FIELDS):
+            if shared['gender_code'] is None:
+                parts['cardiovascular'] = None
+            else:
+                record = {**data, 'gender': shared['gender_code'], 'age': shared['age']}
+                parts['cardiovascular'] = (score_assessment_model, score_cardio_records, record, explain_mode, tier,
+                                           projection)
+        if any(field in data for field in DIABETES_ONLY_FIELDS):
+            record = {**data, 'gender': shared['gender'], 'age': round(shared['age_years'], 1)}
+            if 'bmi' in shared:
+                record['bmi'] = shared['bmi']
+            parts['diabetes'] = (score_assessment_model, score_diabetes_records, record, explain_mode, tier, projection)
+        if data.get('cbc') is not None:
+            parts['cbc'] = (analyze_assessment_cbc, shared['sex'], data['cbc'])
+
+        if not parts:
+            return jsonify({'error': 'Nothing to assess: provide the inputs of at least one of the cardiovascular '
+                                     'model, the diabetes model or a "cbc" panel'}), 400
+
+        # The model parts run on the executor (XGBoost releases the GIL); the CBC part on this thread
+        futures, sections, seconds = {}, {}, {}
+        for name, part in parts.items():
+            if part is not None and name != 'cbc':
+                futures[name] = assessment_executor.submit(contextvars.copy_context().run,
+                                                           run_assessment_part, name, *part)
+        if parts.get('cbc') is not None:
+            sections['cbc'], seconds['cbc'] = run_assessment_part('cbc', *parts['cbc'])
+        for name, future in futures.items():
+            sections[name], seconds[name] = future.result()
+        if 'cardiovascular' in parts and parts['cardiovascular'] is None:
+            sections['cardiovascular'] = {'error': "The cardiovascular model requires gender 'Female' or 'Male'"}
+
+        total = time.perf_counter() - started
+        response = {
+            'patient': {
+                'age_years': round(shared['age_years'], 1),
+                'gender': shared['gender'],
+                **({'bmi': shared['bmi']} if 'bmi' in shared else {})
+            },
+            **{name: sections[name] for name in ('cardiovascular', 'diabetes', 'cbc') if name in sections},
+            'skipped': [name for name in ('cardiovascular', 'diabetes', 'cbc') if name not in sections],
+            'timings_ms': {
+                **{name: round(value * 1000, 3) for name, value in seconds.items()},
+                'sum_of_parts': round(sum(seconds.values()) * 1000, 3),
+                'total': round(total * 1000, 3)
+            }
+        }
+
+        with metrics.stage('serialization'):
+            return json_response(response)
+
+    except Exception as e:
+        logger.error(f"Error in assessment: {str(e)}")
+        return jsonify({'error': f'Assessment failed: {str(e)}'}), 500
+
 
 if __name__ == '__main__':
     # Load models on startup
     try:
-        load_models()
+        start_models()
+        if MICRO_BATCH_ENABLED:
+            init_micro_batching()
+        start_registry_watcher()
+        start_drift_monitor()
         logger.info("All models loaded successfully. Starting Flask server...")
         app.run(debug=True, host='0.0.0.0', port=5001)
     except Exception as e:
@@ -0,0 +1,147 @@
+"""
+MedAssist Prediction Cache
+In-process LRU cache with TTL for full prediction responses
+
+Entries are keyed on the encoded feature vector together with the model version
+and explanation mode, so a cached response can never be served for a different
+model or a different kind of explanation. The cache is bounded both by entry
+count and by an approximate memory budget (the JSON size of the cached
+responses). Responses of one shape (model version, tier and explanation mode)
+have nearly the same size, so the size is measured once per shape instead of
+serializing every response that is stored.
+
+A single-flight guard makes concurrent requests for the same key share one
+computation: the first caller claims the key and computes it, later callers
+wait for that result instead of scoring the same row again.
+
+Cached values are shared between callers and must be treated as read-only.
+Parts of a response that depend on the raw request rather than the encoded
+row (the input_data echo) are rebuilt by the caller for each request.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache with a byte budget and single-flight claims"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._shape_sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def acquire(self, key: Hashable) -> Tuple[str, Any]:
+        """
+        Look up a key and claim it on a miss.
+
+        Returns:
+            ('hit', value)    the cached value
+            ('wait', future)  another caller is computing this key; future.result() yields the value
+            ('miss', None)    the caller now owns the key and must call put() or release()
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return 'hit', value
+                # Expired entries are dropped lazily on access
+                del self._entries[key]
+                self._bytes -= size
+                self._expirations += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return 'wait', future
+
+            self._misses += 1
+            self._inflight[key] = Future()
+            return 'miss', None
+
+    def put(self, key: Hashable, value: Any, shape: Optional[Hashable] = None):
+        """
+        Store a computed value and hand it to any callers waiting on the key.
+
+        Values given the same shape are charged the JSON size of the first one;
+        without a shape every value is measured.
+        """
+        size = self._shape_sizes.get(shape) if shape is not None else None
+        if size is None:
+            size = len(json.dumps(value, default=str))
+            if shape is not None:
+                self._shape_sizes[shape] = size
+        with self._lock:
+            if size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[2]
+                self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+                self._bytes += size
+                self._evict()
+            future = self._inflight.pop(key, None)
+
+        if future is not None:
+            future.set_result(value)
+
+    def release(self, key: Hashable, error: Exception):
+        """Give up a claimed key without caching; waiting callers receive the error"""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+
+        if future is not None:
+            future.set_exception(error)
+
+    def _evict(self):
+        """Drop least recently used entries until both limits are met (lock held)"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+    def clear(self):
+        """Remove every cached entry (in-flight computations are unaffected)"""
+        with self._lock:
+            self._entries.clear()
+            self._shape_sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'in_flight': len(self._inflight),
+                'hit_rate': (self._hits + self._coalesced) / lookups if lookups else 0.0
+            }
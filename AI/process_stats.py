@@ -0,0 +1,20 @@
+"""
+MedAssist Process Stats
+Resource usage of the current process, reported by the training and ingestion jobs
+
+Standard library only, so any script can import it without loading the models.
+"""
+
+import sys
+from typing import Optional
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None where the platform does not report it)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
@@ -0,0 +1,187 @@
+"""
+MedAssist Request Metrics
+Per-stage latency histograms and request counters in Prometheus text format
+
+Each prediction request is broken into timed stages (JSON parse, validation,
+encoding, cache lookup, predict_proba, SHAP, explanation formatting,
+recommendation building and serialization). A stage is recorded with
+
+    with metrics.stage('predict_proba'):
+        ...
+
+and lands in a fixed-bucket histogram labelled with the endpoint and model of
+the request being served. The labels live in a context variable set by the
+request handler, so shared scoring code does not need to know which endpoint
+called it. Observing a value costs one bisect and one locked increment.
+
+Metrics are kept per process; under gunicorn every worker exposes its own.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+STAGES = ('parse', 'validation', 'encoding', 'cache', 'predict_proba', 'shap',
+          'format', 'recommendations', 'serialization')
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# (endpoint, model) of the request currently being handled
+_labels: contextvars.ContextVar = contextvars.ContextVar('metrics_labels', default=('', ''))
+
+Gauge = Tuple[str, str, Dict[Tuple[Tuple[str, str], ...], float]]
+
+
+class Histogram:
+    """Fixed-bucket histogram with a running sum and count"""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Cumulative bucket counts (the last one is +Inf), sum and count"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class _StageTimer:
+    """Context manager that records the time spent in its block as one stage observation"""
+
+    __slots__ = ('_registry', '_stage', '_started')
+
+    def __init__(self, registry: 'MetricsRegistry', stage: str):
+        self._registry = registry
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._registry.observe_stage(self._stage, time.perf_counter() - self._started)
+        return False
+
+
+class MetricsRegistry:
+    """Stage histograms, request durations, request counts and in-flight requests"""
+
+    def __init__(self):
+        self._stages: Dict[Tuple[str, str, str], Histogram] = {}
+        self._durations: Dict[str, Histogram] = {}
+        self._requests: Dict[Tuple[str, str], int] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def set_labels(endpoint: str, model: str):
+        """Label the stages recorded in the current context (request or micro-batch)"""
+        _labels.set((endpoint, model))
+
+    def stage(self, stage: str) -> _StageTimer:
+        return _StageTimer(self, stage)
+
+    def observe_stage(self, stage: str, seconds: float):
+        endpoint, model = _labels.get()
+        key = (endpoint, model, stage)
+        histogram = self._stages.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def request_started(self, endpoint: str):
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def request_finished(self, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 1) - 1
+            key = (endpoint, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._durations.setdefault(endpoint, Histogram())
+        histogram.observe(seconds)
+
+    def render(self, gauges: Iterable[Gauge] = ()) -> str:
+        """Everything in Prometheus text exposition format"""
+        lines: List[str] = []
+
+        with self._lock:
+            stages = sorted(self._stages.items())
+            durations = sorted(self._durations.items())
+            requests = sorted(self._requests.items())
+            in_flight = sorted(self._in_flight.items())
+
+        _histogram_lines(lines, 'medassist_stage_duration_seconds',
+                         'Time spent in each stage of a request',
+                         [((('endpoint', e), ('model', m), ('stage', s)), h) for (e, m, s), h in stages])
+        _histogram_lines(lines, 'medassist_request_duration_seconds',
+                         'Total request handling time',
+                         [((('endpoint', e),), h) for e, h in durations])
+
+        lines.append('# HELP medassist_requests_total Requests handled, by endpoint and HTTP status')
+        lines.append('# TYPE medassist_requests_total counter')
+        for (endpoint, status), count in requests:
+            lines.append(f'medassist_requests_total{_format_labels((("endpoint", endpoint), ("status", status)))} {count}')
+
+        lines.append('# HELP medassist_requests_in_flight Requests currently being handled')
+        lines.append('# TYPE medassist_requests_in_flight gauge')
+        for endpoint, count in in_flight:
+            lines.append(f'medassist_requests_in_flight{_format_labels((("endpoint", endpoint),))} {count}')
+
+        for name, help_text, values in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in values.items():
+                if value is not None:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(lines: List[str], name: str, help_text: str,
+                     series: List[Tuple[Tuple[Tuple[str, str], ...], Histogram]]):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in series:
+        cumulative, total, count = histogram.snapshot()
+        for bound, bucket_count in zip(histogram.bounds + (float('inf'),), cumulative):
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {bucket_count}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {total!r}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+
+metrics = MetricsRegistry()
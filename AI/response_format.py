@@ -0,0 +1,178 @@
+"""
+MedAssist Response Format
+Response projection and fast JSON serialization for prediction responses
+
+Callers that only need part of a prediction can ask for it:
+
+    ?fields=risk_probability,top_factors&top_k=3
+
+`fields` lists top-level keys of the response, dotted paths into nested
+objects (interpretation.result) or one of the shortcuts below, which lift a
+nested value to the top level. `top_k` shortens the ranked factor lists.
+Projection always builds a new document: results may come from the prediction
+cache and are shared between requests.
+
+Responses are serialized with orjson when it is installed. It writes NumPy
+scalars and arrays natively and is several times faster than the standard
+library encoder. Otherwise the standard encoder is used, with a fallback for
+NumPy types. Keys are sorted either way, as jsonify sorts them.
+
+The output is not byte-identical to jsonify's. Both encoders here write
+non-ASCII text as UTF-8 ("Café", not "Caf\\u00e9") and NaN or infinity as null
+(jsonify writes NaN, which is not valid JSON). orjson also spells some floats
+differently (0.00001 for 1e-05, 1e16 for 1e+16); the values are the same.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Response, current_app
+
+from feature_pipeline import ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = orjson is not None and os.getenv('FAST_JSON', 'true').lower() in ('1', 'true', 'yes')
+
+# Top-level keys of a prediction response
+RESPONSE_FIELDS = ('prediction', 'risk_probability', 'confidence_score', 'risk_category', 'input_data',
+                   'explanations', 'interpretation', 'explain_mode', 'model_version', 'model_tier')
+
+# Shortcuts for nested values, returned under the shortcut's name
+FIELD_SHORTCUTS = {
+    'top_factors': ('explanations', 'top_factors'),
+    'summary': ('explanations', 'summary'),
+    'recommendation': ('interpretation', 'recommendation'),
+    'result': ('interpretation', 'result')
+}
+
+# Lists inside a response that are ranked by importance and shortened by top_k
+RANKED_LISTS = (('explanations', 'explanations'), ('explanations', 'top_factors'))
+
+
+class Projection:
+    """The fields and top_k a caller asked for"""
+
+    def __init__(self, fields: Optional[List[Tuple[str, Tuple[str, ...]]]] = None, top_k: Optional[int] = None):
+        # (output name, path into the full response) per requested field; None means every field
+        self.fields = fields
+        self.top_k = top_k
+
+    @property
+    def identity(self) -> bool:
+        return self.fields is None and self.top_k is None
+
+    def apply(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the projected copy of a response (the response itself when nothing was asked for)"""
+        if self.identity:
+            return result
+        if self.top_k is not None:
+            result = _truncate(result, self.top_k)
+        if self.fields is None:
+            return result
+
+        projected: Dict[str, Any] = {}
+        for name, path in self.fields:
+            value = result
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if len(path) > 1 and name == '.'.join(path):
+                # Dotted paths keep their nesting: interpretation.result -> {"interpretation": {"result": ...}}
+                target = projected
+                for key in path[:-1]:
+                    target = target.setdefault(key, {})
+                target[path[-1]] = value
+            else:
+                projected[name] = value
+        return projected
+
+
+def _truncate(result: Dict[str, Any], top_k: int) -> Dict[str, Any]:
+    """Copy of a response with its ranked lists cut to top_k entries"""
+    result = dict(result)
+    for outer, inner in RANKED_LISTS:
+        block = result.get(outer)
+        if isinstance(block, dict) and isinstance(block.get(inner), list):
+            result[outer] = {**block, inner: block[inner][:top_k]}
+    return result
+
+
+def parse_projection(args: Dict[str, str]) -> Projection:
+    """Read ?fields= and ?top_k= from the query string"""
+    fields = None
+    raw_fields = args.get('fields')
+    if raw_fields:
+        fields = []
+        for name in (part.strip() for part in raw_fields.split(',')):
+            if not name:
+                continue
+            if name in FIELD_SHORTCUTS:
+                fields.append((name, FIELD_SHORTCUTS[name]))
+            elif name.split('.')[0] in RESPONSE_FIELDS:
+                fields.append((name, tuple(name.split('.'))))
+            else:
+                raise ValidationError(f"Unknown field '{name}'. Must be one of: "
+                                      f"{list(RESPONSE_FIELDS) + list(FIELD_SHORTCUTS)} or a dotted path")
+
+    top_k = None
+    raw_top_k = args.get('top_k')
+    if raw_top_k is not None:
+        try:
+            top_k = int(raw_top_k)
+        except ValueError:
+            raise ValidationError('top_k must be an integer')
+        if top_k < 0:
+            raise ValidationError('top_k must be 0 or more')
+
+    return Projection(fields, top_k)
+
+
+def _default(value: Any) -> Any:
+    """Encode NumPy values the standard json module does not know"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload: Any, indent: bool = False) -> bytes:
+    """Serialize a response body to JSON bytes with sorted keys"""
+    if FAST_JSON:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(payload, default=_default, option=option)
+    options = {'indent': 2} if indent else {'separators': (',', ':')}
+    try:
+        text = json.dumps(payload, default=_default, sort_keys=True, ensure_ascii=False, allow_nan=False, **options)
+    except ValueError:
+        # NaN or infinity somewhere in the payload: write null, as orjson does
+        text = json.dumps(_finite(payload), default=_default, sort_keys=True, ensure_ascii=False, **options)
+    return text.encode()
+
+
+def _finite(value: Any) -> Any:
+    """Copy of a payload with NaN and infinite floats replaced by None"""
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _finite(value.tolist())
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """Drop-in for jsonify on the prediction paths"""
+    # jsonify pretty-prints under the debug server; keep that behaviour
+    indent = current_app.json.compact is False or (current_app.json.compact is None and current_app.debug)
+    return current_app.response_class(dumps(payload, indent) + b'\n', status=status,
+                                      mimetype=current_app.json.mimetype)
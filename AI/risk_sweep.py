@@ -0,0 +1,140 @@
+"""
+MedAssist Risk Sweep
+What-if risk curves and surfaces for one patient in a single model call
+
+A sweep takes a base patient and one or two of its fields, each with a range
+or an explicit list of values. The full grid is encoded by the model's feature
+pipeline as one matrix and scored with one predict_proba call (and, if asked,
+one contributions call). Risks come back as a plain array: a list for one
+axis, a list of rows (first axis) for two. One request therefore replaces the
+dozens of single predictions a chart would otherwise need.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from feature_pipeline import ValidationError
+from model_store import ModelBundle
+from request_metrics import metrics
+
+# Upper bound on the number of grid points in one sweep
+SWEEP_MAX_POINTS = int(os.getenv('SWEEP_MAX_POINTS', '2500'))
+DEFAULT_SWEEP_STEPS = 21
+MAX_SWEEP_AXES = 2
+
+# Decimal places of the returned risks and contributions
+SWEEP_PRECISION = 6
+
+
+def parse_axis(spec: Any, max_points: int = SWEEP_MAX_POINTS) -> Tuple[str, List[Any]]:
+    """
+    Turn one axis of the request into (field, values).
+
+    An axis is either {"feature": "ap_hi", "values": [100, 120, 140]} or
+    {"feature": "ap_hi", "start": 100, "stop": 200, "steps": 51}, where steps
+    (default 21) evenly spaced values include both ends. An axis longer than
+    max_points is rejected before any values are generated.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('feature'), str):
+        raise ValidationError('Each sweep axis must be an object with a "feature" name')
+    field = spec['feature']
+
+    if 'values' in spec:
+        values = spec['values']
+        if not isinstance(values, list) or not values:
+            raise ValidationError(f"'values' of '{field}' must be a non-empty list")
+        if len(values) > max_points:
+            raise ValidationError(f"Sweep too large: '{field}' has {len(values)} values (at most {max_points} allowed)")
+        return field, values
+
+    if 'start' not in spec or 'stop' not in spec:
+        raise ValidationError(f"Axis '{field}' needs either 'values' or 'start' and 'stop'")
+    try:
+        start, stop = float(spec['start']), float(spec['stop'])
+        steps = int(spec.get('steps', DEFAULT_SWEEP_STEPS))
+    except (TypeError, ValueError):
+        raise ValidationError(f"'start', 'stop' and 'steps' of '{field}' must be numeric")
+    if steps < 1:
+        raise ValidationError(f"'steps' of '{field}' must be at least 1")
+    if steps > max_points:
+        raise ValidationError(f"Sweep too large: 'steps' of '{field}' is {steps} (at most {max_points} allowed)")
+
+    values = np.linspace(start, stop, steps).tolist()
+    # Keep whole numbers whole, so a blood pressure sweep reads 100, 105, ... rather than 100.0
+    if all(value.is_integer() for value in values):
+        values = [int(value) for value in values]
+    return field, values
+
+
+def parse_sweep(data: Any) -> Tuple[Dict[str, Any], List[Tuple[str, List[Any]]]]:
+    """Validate a sweep request body and return the base patient and its axes"""
+    if not isinstance(data, dict) or not data:
+        raise ValidationError('No JSON data provided')
+
+    patient = data.get('patient')
+    if not isinstance(patient, dict) or not patient:
+        raise ValidationError('Expected the base patient under "patient"')
+
+    specs = data.get('sweep')
+    if isinstance(specs, dict):
+        specs = [specs]
+    if not isinstance(specs, list) or not 1 <= len(specs) <= MAX_SWEEP_AXES:
+        raise ValidationError(f'Expected "sweep" with 1 to {MAX_SWEEP_AXES} axes')
+
+    # Each axis gets what is left of the point budget, so the grid never exceeds
+    # SWEEP_MAX_POINTS and no axis is generated past it
+    axes, points = [], 1
+    for spec in specs:
+        field, values = parse_axis(spec, SWEEP_MAX_POINTS // points)
+        axes.append((field, values))
+        points *= len(values)
+    if len({field for field, _ in axes}) != len(axes):
+        raise ValidationError('Each feature can only be swept once')
+
+    return patient, axes
+
+
+def sweep(bundle: ModelBundle, patient: Dict[str, Any], axes: List[Tuple[str, List[Any]]],
+          explain_mode: str = 'none') -> Dict[str, Any]:
+    """
+    Score every grid point of a sweep with one predict_proba call.
+
+    Returns:
+        dict: The axes, the grid shape, the risk array in that shape and the
+        base patient's own risk; with an explain mode other than 'none' also
+        the per-feature contributions, shaped (*grid shape, features).
+    """
+    started = time.perf_counter()
+    base = bundle.pipeline.transform_grid(patient, [])
+    features = bundle.pipeline.transform_grid(patient, axes)
+    metrics.observe_stage('encoding', time.perf_counter() - started)
+
+    shape = [len(values) for _, values in axes]
+    with metrics.stage('predict_proba'):
+        risk = bundle.model.predict_proba(np.vstack([base, features]))[:, 1]
+
+    used_mode = bundle.engine.resolve_mode(explain_mode)
+    response = {
+        'model': bundle.name,
+        'model_version': bundle.version,
+        'model_tier': bundle.tier,
+        'explain_mode': used_mode,
+        'axes': [{'feature': field, 'values': values} for field, values in axes],
+        'shape': shape,
+        'points': len(features),
+        'base_risk_probability': round(float(risk[0]), SWEEP_PRECISION),
+        'risk_probability': np.round(risk[1:].astype(float), SWEEP_PRECISION).reshape(shape).tolist()
+    }
+
+    if used_mode != 'none':
+        with metrics.stage('shap'):
+            contributions = np.asarray(bundle.engine.contributions(features, used_mode), dtype=float)
+        response['contributions'] = {
+            'features': list(bundle.feature_names),
+            'values': np.round(contributions, SWEEP_PRECISION).reshape(shape + [len(bundle.feature_names)]).tolist()
+        }
+
+    return response
@@ -8,12 +8,30 @@ This file tests:
 3. CBC (Complete Blood Count) Analysis API
 
 Each test shows the input data and then calls the respective API to display results.
+
+It also contains a benchmark suite. The suite drives every endpoint with
+synthetic patients drawn from the two training datasets, at a configurable
+concurrency and for a configurable duration. It reports throughput and
+p50/p95/p99 latency, either in-process (Flask test client, no network) or
+against a live server, and saves the results as JSON. Saved results can be
+compared with a baseline to catch regressions:
+
+    python test_api.py                      # interactive demo against localhost:5001
+    python test_api.py benchmark --mode inprocess --concurrency 4 --duration 10 --output bench.json
+    python test_api.py benchmark --mode live --url http://localhost:5001 --compare bench.json
 """
 
+import argparse
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
 import requests
 import json
 import time
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 # API Base URL
 BASE_URL = "http://localhost:5001"
@@ -341,5 +359,292 @@ def run_comprehensive_test():
     print("📊 Review the results above to see how each API responds to the sample data.")
     print("\n💡 You can modify the test data in this file to test different scenarios.")
 
+# --- Benchmark Suite ---
+
+class PatientGenerator:
+    """Realistic synthetic requests drawn from the training datasets"""
+
+    # Noise added to continuous fields so generated patients rarely repeat (and hit the cache)
+    CARDIO_JITTER = {'age': 180, 'height': 2, 'weight': 2.0, 'ap_hi': 5, 'ap_lo': 4}
+    DIABETES_JITTER = {'age': 1.0, 'bmi': 0.5, 'HbA1c_level': 0.1, 'blood_glucose_level': 5}
+
+    def __init__(self, seed: int = 0, sample_size: int = 5000):
+        from global_explanations import load_reference_sample
+
+        self.cardio = load_reference_sample('cardiovascular', sample_size, seed).drop(columns=['id', 'cardio'])
+        self.diabetes = load_reference_sample('diabetes', sample_size, seed).drop(columns=['diabetes'])
+        self._cardio_rows = self.cardio.to_dict('records')
+        self._diabetes_rows = self.diabetes.to_dict('records')
+        self._cardio_bounds = {f: (self.cardio[f].min(), self.cardio[f].max()) for f in self.CARDIO_JITTER}
+        self._diabetes_bounds = {f: (self.diabetes[f].min(), self.diabetes[f].max()) for f in self.DIABETES_JITTER}
+
+    @staticmethod
+    def _jitter(row: Dict[str, Any], jitter: Dict[str, float], bounds: Dict[str, Tuple[float, float]],
+                rng: random.Random) -> Dict[str, Any]:
+        patient = dict(row)
+        for field, scale in jitter.items():
+            low, high = bounds[field]
+            value = min(max(patient[field] + rng.gauss(0, scale), low), high)
+            patient[field] = int(round(value)) if isinstance(row[field], int) else round(value, 2)
+        return patient
+
+    def cardio_patient(self, rng: random.Random) -> Dict[str, Any]:
+        row = {k: (v.item() if hasattr(v, 'item') else v) for k, v in rng.choice(self._cardio_rows).items()}
+        return self._jitter(row, self.CARDIO_JITTER, self._cardio_bounds, rng)
+
+    def diabetes_patient(self, rng: random.Random) -> Dict[str, Any]:
+        row = {k: (v.item() if hasattr(v, 'item') else v) for k, v in rng.choice(self._diabetes_rows).items()}
+        return self._jitter(row, self.DIABETES_JITTER, self._diabetes_bounds, rng)
+
+    @staticmethod
+    def cbc_panel(rng: random.Random) -> Dict[str, Any]:
+        """CBC panel around the normal ranges, with roughly one value in five out of range"""
+        from prediction_api import APPLICABLE_RANGES
+
+        sex = rng.choice(['male', 'female'])
+        panel: Dict[str, Any] = {'sex': sex}
+        for param, (low, high) in APPLICABLE_RANGES[sex].items():
+            width = high - low
+            panel[param] = round(rng.uniform(low - 0.3 * width, high + 0.3 * width), 1)
+        return panel
+
+
+def benchmark_scenarios(generator: PatientGenerator, batch_size: int) -> Dict[str, Tuple[str, str, Callable]]:
+    """Endpoint -> (method, path, payload factory) for every endpoint the API serves"""
+    def batch_of(make):
+        return lambda rng: [make(rng) for _ in range(batch_size)]
+
+    def sweep_of(make, axis):
+        return lambda rng: {'patient': make(rng), 'sweep': axis}
+
+    def assessment(rng):
+        from prediction_api import DIABETES_ONLY_FIELDS
+
+        patient = generator.cardio_patient(rng)
+        diabetes = generator.diabetes_patient(rng)
+        patient.update({field: diabetes[field] for field in DIABETES_ONLY_FIELDS})
+        # The panel takes its sex from the patient's gender
+        patient['cbc'] = {k: v for k, v in generator.cbc_panel(rng).items() if k != 'sex'}
+        return patient
+
+    return {
+        'health': ('GET', '/health', None),
+        'ready': ('GET', '/ready', None),
+        'stats': ('GET', '/stats', None),
+        'metrics': ('GET', '/metrics', None),
+        'model_info': ('GET', '/model/info', None),
+        'global_explanations': ('GET', '/model/explanations/global', None),
+        'drift': ('GET', '/model/drift', None),
+        'cardiovascular': ('POST', '/predict/cardiovascular', generator.cardio_patient),
+        'cardiovascular_native': ('POST', '/predict/cardiovascular?explain=native', generator.cardio_patient),
+        'cardiovascular_batch': ('POST', '/predict/cardiovascular/batch', batch_of(generator.cardio_patient)),
+        'cardiovascular_sweep': ('POST', '/predict/cardiovascular/sweep',
+                                 sweep_of(generator.cardio_patient,
+                                          {'feature': 'ap_hi', 'start': 90, 'stop': 190, 'steps': 21})),
+        'diabetes': ('POST', '/predict/diabetes', generator.diabetes_patient),
+        'diabetes_native': ('POST', '/predict/diabetes?explain=native', generator.diabetes_patient),
+        'diabetes_batch': ('POST', '/predict/diabetes/batch', batch_of(generator.diabetes_patient)),
+        'diabetes_sweep': ('POST', '/predict/diabetes/sweep',
+                           sweep_of(generator.diabetes_patient,
+                                    {'feature': 'HbA1c_level', 'start': 4, 'stop': 9, 'steps': 21})),
+        'assessment': ('POST', '/predict/assessment', assessment),
+        'cbc': ('POST', '/analyze_cbc', generator.cbc_panel),
+        'cbc_batch': ('POST', '/analyze_cbc/batch', batch_of(generator.cbc_panel))
+    }
+
+
+def make_client_factory(mode: str, url: str) -> Callable[[], Callable[[str, str, Any], int]]:
+    """Return a factory of per-thread request functions (method, path, payload) -> status code"""
+    if mode == 'inprocess':
+        import prediction_api
+
+        if not prediction_api.models_ready:
+            prediction_api.start_models()
+
+        def inprocess_client():
+            client = prediction_api.app.test_client()
+
+            def call(method: str, path: str, payload: Any) -> int:
+                if method == 'GET':
+                    return client.get(path).status_code
+                return client.post(path, json=payload).status_code
+            return call
+        return inprocess_client
+
+    def live_client():
+        session = requests.Session()
+
+        def call(method: str, path: str, payload: Any) -> int:
+            try:
+                if method == 'GET':
+                    return session.get(url + path, timeout=30).status_code
+                return session.post(url + path, json=payload, timeout=30).status_code
+            except requests.RequestException:
+                return 0
+        return call
+    return live_client
+
+
+def benchmark_endpoint(client_factory, method: str, path: str, make_payload: Optional[Callable],
+                       concurrency: int, duration: float, seed: int) -> Dict[str, Any]:
+    """Drive one endpoint from `concurrency` closed-loop clients for `duration` seconds"""
+    from benchmark_serving import percentile
+
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        call = client_factory()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            payload = make_payload(rng) if make_payload is not None else None
+            started = time.perf_counter()
+            status = call(method, path, payload)
+            local.append(time.perf_counter() - started)
+            failed += 0 if status == 200 else 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0.0
+        }
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Commit the benchmark ran against, so saved results can be compared across commits"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark_suite(mode: str = 'inprocess', url: str = BASE_URL, endpoints: Optional[List[str]] = None,
+                        concurrency: int = 4, duration: float = 10.0, batch_size: int = 32,
+                        seed: int = 0) -> Dict[str, Any]:
+    """Benchmark each selected endpoint in turn and return the results document"""
+    generator = PatientGenerator(seed)
+    scenarios = benchmark_scenarios(generator, batch_size)
+    client_factory = make_client_factory(mode, url)
+
+    results = {}
+    for name in endpoints or list(scenarios):
+        method, path, make_payload = scenarios[name]
+        # A few untimed requests first, so lazy loading and first-call costs are not measured
+        warm = client_factory()
+        for _ in range(3):
+            warm(method, path, make_payload(random.Random(seed)) if make_payload else None)
+
+        results[name] = benchmark_endpoint(client_factory, method, path, make_payload, concurrency, duration, seed)
+        r = results[name]
+        print(f"  {name:<24} {r['requests_per_second']:>9.1f} req/s   p50 {r['latency_ms']['p50']:>8.2f} ms"
+              f"   p95 {r['latency_ms']['p95']:>8.2f} ms   p99 {r['latency_ms']['p99']:>8.2f} ms"
+              f"   errors {r['errors']}")
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'mode': mode,
+            'url': url if mode == 'live' else None,
+            'concurrency': concurrency,
+            'duration_s': duration,
+            'batch_size': batch_size,
+            'seed': seed,
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'settings': {key: os.getenv(key) for key in (
+                'MICRO_BATCH_ENABLED', 'PREDICTION_CACHE_ENABLED', 'DEFAULT_EXPLAIN_MODE', 'MODEL_LOADING')
+                if os.getenv(key) is not None}
+        },
+        'results': results
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List endpoints whose throughput or p95 latency is worse than the baseline by more than `tolerance`"""
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        if result['requests_per_second'] < before['requests_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['requests_per_second']} -> "
+                               f"{result['requests_per_second']} req/s")
+        if result['latency_ms']['p95'] > before['latency_ms']['p95'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['latency_ms']['p95']} -> {result['latency_ms']['p95']} ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='MedAssist API demo and benchmark suite')
+    subparsers = parser.add_subparsers(dest='command')
+    bench = subparsers.add_parser('benchmark', help='Benchmark every endpoint and save the results as JSON')
+    bench.add_argument('--mode', choices=['inprocess', 'live'], default='inprocess')
+    bench.add_argument('--url', default=BASE_URL)
+    bench.add_argument('--endpoints', nargs='*', default=None, help='Subset of endpoints (default: all)')
+    bench.add_argument('--concurrency', type=int, default=4)
+    bench.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint')
+    bench.add_argument('--batch-size', type=int, default=32, help='Patients or panels per batch request')
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--output', default=None, help='Write the results to this JSON file')
+    bench.add_argument('--compare', default=None, help='Baseline results JSON to compare against')
+    bench.add_argument('--tolerance', type=float, default=0.10,
+                       help='Allowed relative slowdown before a change counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.command == 'benchmark' and args.endpoints:
+        # Only the scenario names are needed, so the class stands in for a generator (nothing is called)
+        names = list(benchmark_scenarios(PatientGenerator, args.batch_size))
+        unknown = sorted(set(args.endpoints) - set(names))
+        if unknown:
+            bench.error(f"Unknown endpoints {unknown}. Choose from: {', '.join(names)}")
+
+    if args.command != 'benchmark':
+        run_comprehensive_test()
+        return
+
+    print_separator(f"BENCHMARK ({args.mode}, concurrency {args.concurrency}, {args.duration:g}s per endpoint)")
+    results = run_benchmark_suite(args.mode, args.url, args.endpoints, args.concurrency, args.duration,
+                                  args.batch_size, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        print(f"\n📈 Compared with {args.compare} (commit {baseline.get('meta', {}).get('commit')}):")
+        for line in regressions or ['No regressions beyond the tolerance']:
+            print(f"  {line}")
+        if regressions:
+            sys.exit(1)
+
+
 if __name__ == "__main__":
-    run_comprehensive_test()
+    main()
@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class Scorer:
+    """score_fn that records the batches it was given"""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, records):
+        self.batches.append(list(records))
+        return [(None, ValueError(f'bad {r}')) if r == self.fail_on else (r * 10, None) for r in records]
+
+
+def submit_all(batcher, records, timeout=5):
+    with ThreadPoolExecutor(len(records)) as pool:
+        return list(pool.map(lambda r: batcher.submit(r, timeout=timeout), records))
+
+
+def test_single_record_is_scored_alone():
+    scorer = Scorer()
+    batcher = MicroBatcher('test', scorer, max_batch_size=8, max_wait_ms=1)
+
+    assert batcher.submit(3, timeout=5) == (30, None)
+    assert scorer.batches == [[3]]
+
+
+def test_concurrent_records_share_one_batch_and_get_their_own_outcome():
+    scorer = Scorer()
+    # A long window so every submitted record joins the first batch
+    batcher = MicroBatcher('test', scorer, max_batch_size=4, max_wait_ms=2000)
+
+    outcomes = submit_all(batcher, [1, 2, 3, 4])
+
+    assert outcomes == [(10, None), (20, None), (30, None), (40, None)]
+    assert len(scorer.batches) == 1
+    assert sorted(scorer.batches[0]) == [1, 2, 3, 4]
+    stats = batcher.stats()
+    assert (stats['batches'], stats['rows'], stats['max_observed_batch_size']) == (1, 4, 4)
+
+
+def test_batch_is_flushed_at_max_batch_size():
+    scorer = Scorer()
+    batcher = MicroBatcher('test', scorer, max_batch_size=2, max_wait_ms=2000)
+
+    outcomes = submit_all(batcher, [1, 2, 3, 4])
+
+    assert [result for result, _ in outcomes] == [10, 20, 30, 40]
+    assert all(len(batch) <= 2 for batch in scorer.batches)
+
+
+def test_row_error_only_fails_its_own_caller():
+    batcher = MicroBatcher('test', Scorer(fail_on=2), max_batch_size=3, max_wait_ms=2000)
+
+    outcomes = submit_all(batcher, [1, 2, 3])
+
+    assert outcomes[0] == (10, None) and outcomes[2] == (30, None)
+    assert outcomes[1][0] is None and str(outcomes[1][1]) == 'bad 2'
+
+
+def test_failure_of_the_whole_batch_reaches_every_caller():
+    def score(records):
+        raise RuntimeError('matrix failed')
+
+    batcher = MicroBatcher('test', score, max_batch_size=2, max_wait_ms=2000)
+
+    outcomes = submit_all(batcher, [1, 2])
+
+    assert [result for result, _ in outcomes] == [None, None]
+    assert all(str(error) == 'matrix failed' for _, error in outcomes)
+
+
+def test_short_outcome_list_fails_every_caller_instead_of_hanging():
+    batcher = MicroBatcher('test', lambda records: [(r, None) for r in records][:-1], max_batch_size=2,
+                           max_wait_ms=2000)
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(batcher.submit, r, 5) for r in (1, 2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match='1 outcomes for 2 rows'):
+                future.result(timeout=10)
+
+
+def test_worker_survives_a_bookkeeping_error():
+    batcher = MicroBatcher('test', Scorer(), max_batch_size=8, max_wait_ms=1)
+    record = batcher._record
+
+    def broken(*args):
+        raise ValueError('counter failed')
+
+    batcher._record = broken
+    with pytest.raises(ValueError, match='counter failed'):
+        batcher.submit(1, timeout=5)
+
+    batcher._record = record
+    assert batcher.submit(2, timeout=5) == (20, None)
+    assert batcher._worker.is_alive()
+
+
+def test_submit_times_out():
+    release = threading.Event()
+
+    def slow(records):
+        release.wait(5)
+        return [(r, None) for r in records]
+
+    batcher = MicroBatcher('test', slow, max_batch_size=8, max_wait_ms=1)
+    try:
+        with pytest.raises(FutureTimeoutError):
+            batcher.submit(1, timeout=0.05)
+    finally:
+        release.set()
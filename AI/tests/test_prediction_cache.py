@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+
+import pytest
+
+from prediction_cache import PredictionCache
+
+
+def entry_size(value) -> int:
+    return len(json.dumps(value, default=str))
+
+
+def test_miss_then_hit():
+    cache = PredictionCache()
+    assert cache.acquire('a') == ('miss', None)
+    cache.put('a', {'risk': 0.4})
+
+    assert cache.acquire('a') == ('hit', {'risk': 0.4})
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['in_flight']) == (1, 1, 0)
+
+
+def test_concurrent_callers_share_one_computation():
+    cache = PredictionCache()
+    assert cache.acquire('a') == ('miss', None)
+
+    status, future = cache.acquire('a')
+    assert status == 'wait'
+    assert not future.done()
+
+    cache.put('a', {'risk': 0.4})
+    assert future.result(timeout=1) == {'risk': 0.4}
+    assert cache.stats()['coalesced'] == 1
+
+
+def test_waiting_threads_receive_the_owner_result():
+    cache = PredictionCache()
+    assert cache.acquire('a')[0] == 'miss'
+    results = []
+
+    def wait():
+        status, future = cache.acquire('a')
+        results.append(future.result(timeout=5) if status == 'wait' else None)
+
+    threads = [threading.Thread(target=wait) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < len(threads):
+        time.sleep(0.001)
+    cache.put('a', 'value')
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == ['value'] * len(threads)
+
+
+def test_release_hands_the_error_to_waiters_and_frees_the_key():
+    cache = PredictionCache()
+    assert cache.acquire('a')[0] == 'miss'
+    _, future = cache.acquire('a')
+
+    error = ValueError('scoring failed')
+    cache.release('a', error)
+    with pytest.raises(ValueError, match='scoring failed'):
+        future.result(timeout=1)
+
+    # Nothing was cached, and the next caller owns the key again
+    assert cache.acquire('a') == ('miss', None)
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted_by_count():
+    cache = PredictionCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.acquire(key)
+        cache.put(key, key)
+    # Touch 'a' so 'b' becomes the least recently used
+    assert cache.acquire('a')[0] == 'hit'
+
+    cache.acquire('c')
+    cache.put('c', 'c')
+
+    assert cache.acquire('b') == ('miss', None)
+    assert cache.acquire('a')[0] == 'hit'
+    assert cache.acquire('c')[0] == 'hit'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_budget_evicts_oldest_entries():
+    value = {'payload': 'x' * 100}
+    cache = PredictionCache(max_bytes=2 * entry_size(value) + 1)
+    for key in ('a', 'b', 'c'):
+        cache.acquire(key)
+        cache.put(key, value)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['bytes'] == 2 * entry_size(value)
+    assert cache.acquire('a') == ('miss', None)
+
+
+def test_values_of_one_shape_are_measured_once():
+    first, second = {'payload': 'x' * 100}, {'payload': 'x' * 10}
+    cache = PredictionCache()
+    for key, value in (('a', first), ('b', second)):
+        cache.acquire(key)
+        cache.put(key, value, shape='cardio')
+
+    assert cache.stats()['bytes'] == 2 * entry_size(first)
+
+
+def test_value_larger_than_budget_is_not_cached_but_reaches_waiters():
+    cache = PredictionCache(max_bytes=10)
+    cache.acquire('a')
+    _, future = cache.acquire('a')
+
+    cache.put('a', 'x' * 100)
+
+    assert future.result(timeout=1) == 'x' * 100
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entry_is_dropped_on_access():
+    cache = PredictionCache(ttl_seconds=0.01)
+    cache.acquire('a')
+    cache.put('a', 'value')
+    time.sleep(0.02)
+
+    assert cache.acquire('a') == ('miss', None)
+    stats = cache.stats()
+    assert (stats['expirations'], stats['entries'], stats['bytes']) == (1, 0, 0)
+
+
+def test_clear_keeps_in_flight_claims():
+    cache = PredictionCache()
+    cache.acquire('a')
+    cache.put('a', 'value')
+    cache.acquire('b')
+
+    cache.clear()
+
+    assert cache.stats()['entries'] == 0
+    status, future = cache.acquire('b')
+    assert status == 'wait'
+    cache.put('b', 'value')
+    assert future.result(timeout=1) == 'value'
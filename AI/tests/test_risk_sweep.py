@@ -0,0 +1,45 @@
+import pytest
+
+import risk_sweep
+from feature_pipeline import ValidationError
+from prediction_api import app
+
+PATIENT = {'age': 50, 'gender': 2, 'height': 170, 'weight': 80, 'ap_hi': 130, 'ap_lo': 85}
+
+
+def sweep_request(axes):
+    with app.test_client() as client:
+        return client.post('/predict/cardiovascular/sweep', json={'patient': PATIENT, 'sweep': axes})
+
+
+def test_range_axis_includes_both_ends():
+    assert risk_sweep.parse_axis({'feature': 'ap_hi', 'start': 100, 'stop': 200, 'steps': 5}) == \
+        ('ap_hi', [100, 125, 150, 175, 200])
+
+
+def test_oversized_steps_returns_400():
+    response = sweep_request({'feature': 'ap_hi', 'start': 100, 'stop': 200, 'steps': 10 ** 9})
+
+    assert response.status_code == 400
+    assert 'Sweep too large' in response.get_json()['error']
+
+
+def test_grid_larger_than_the_budget_returns_400():
+    side = int(risk_sweep.SWEEP_MAX_POINTS ** 0.5) + 1
+    response = sweep_request([{'feature': 'ap_hi', 'start': 100, 'stop': 200, 'steps': side},
+                              {'feature': 'age', 'start': 30, 'stop': 70, 'steps': side}])
+
+    assert response.status_code == 400
+    assert 'Sweep too large' in response.get_json()['error']
+
+
+def test_second_axis_is_checked_before_its_values_are_generated(monkeypatch):
+    def linspace(start, stop, steps):
+        assert steps <= risk_sweep.SWEEP_MAX_POINTS // 100
+        return risk_sweep.np.arange(steps, dtype=float)
+
+    monkeypatch.setattr(risk_sweep.np, 'linspace', linspace)
+    with pytest.raises(ValidationError, match="'steps' of 'age'"):
+        risk_sweep.parse_sweep({'patient': PATIENT,
+                                'sweep': [{'feature': 'ap_hi', 'values': list(range(100))},
+                                          {'feature': 'age', 'start': 30, 'stop': 70, 'steps': 10 ** 9}]})
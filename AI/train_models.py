@@ -0,0 +1,220 @@
+"""
+MedAssist Model Training
+Reproducible training of both models, extracted from ml_notebook.ipynb
+
+Loads each dataset through the columnar cache (dataset_cache.py) and cleans it
+exactly as the notebook does:
+- cardiovascular: drop `id`, drop duplicate rows, keep 0 < ap_hi < 250 and 0 < ap_lo < 200;
+- diabetes: fit label encoders on `gender` and `smoking_history`.
+It then makes the notebook's 80/20 train/test split (same seed, stratified for
+diabetes), so test metrics are comparable with the notebook's.
+
+Differences from the notebook run:
+- XGBoost uses the `hist` tree method on all cores (`--nthread`).
+- Training uses early stopping on a validation split carved from the
+  training set. The test set is never seen during training. The published
+  model is trimmed to the best iteration, so predictions and native SHAP
+  values use the same trees.
+- No plots. The run records wall time per phase, peak memory (resident set
+  size) and test metrics.
+
+Each trained model is published to the model registry (model_registry.py) as a
+new version. Its metadata includes the training report, and a running API
+hot-swaps to it.
+
+Usage:
+    python train_models.py                          # both models, published to model_registry/
+    python train_models.py diabetes --nthread 8 --n-estimators 2000 --early-stopping 100
+    python train_models.py --no-publish --report training_report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import DATASET_DIR, REFERENCE_DATASETS, load_dataset
+from model_registry import REGISTRY_DIR, publish
+from process_stats import peak_rss_mb
+
+logger = logging.getLogger('train_models')
+
+TEST_SIZE = 0.2
+# Share of the training split held out for early stopping
+VALIDATION_SIZE = 0.1
+SEED = 42
+
+DIABETES_FEATURES = ['age', 'hypertension', 'heart_disease', 'bmi', 'HbA1c_level',
+                     'blood_glucose_level', 'gender_encoded', 'smoking_encoded']
+
+# Hyperparameters from the notebook; n_estimators is only an upper bound once early stopping is on
+NOTEBOOK_PARAMS = {
+    'cardiovascular': {},
+    'diabetes': {'max_depth': 6, 'learning_rate': 0.1, 'subsample': 0.8, 'colsample_bytree': 0.8}
+}
+
+
+def clean_cardio(df: pd.DataFrame) -> pd.DataFrame:
+    """The notebook's cardiovascular cleaning: drop id, deduplicate, remove blood pressure outliers"""
+    df = df.drop(columns=['id'], errors='ignore')
+    df = df.drop_duplicates()
+    return df[(df['ap_hi'] < 250) & (df['ap_lo'] < 200) & (df['ap_hi'] > 0) & (df['ap_lo'] > 0)]
+
+
+def load_cardio(dataset_dir: str = DATASET_DIR) -> Tuple[pd.DataFrame, pd.Series, Dict[str, Any]]:
+    df = clean_cardio(load_dataset('cardiovascular', dataset_dir))
+    return df.drop('cardio', axis=1), df['cardio'], {}
+
+
+def load_diabetes(dataset_dir: str = DATASET_DIR) -> Tuple[pd.DataFrame, pd.Series, Dict[str, Any]]:
+    """The notebook's diabetes preparation: label-encode gender and smoking history"""
+    from sklearn.preprocessing import LabelEncoder
+
+    df = load_dataset('diabetes', dataset_dir)
+    encoders = {'gender_encoder': LabelEncoder(), 'smoking_encoder': LabelEncoder()}
+    df['gender_encoded'] = encoders['gender_encoder'].fit_transform(df['gender'])
+    df['smoking_encoded'] = encoders['smoking_encoder'].fit_transform(df['smoking_history'])
+    return df[DIABETES_FEATURES], df['diabetes'], encoders
+
+
+LOADERS = {'cardiovascular': load_cardio, 'diabetes': load_diabetes}
+
+# Label column of each dataset
+TARGETS = {'cardiovascular': 'cardio', 'diabetes': 'diabetes'}
+
+
+def split(name: str, X: pd.DataFrame, y: pd.Series, seed: int = SEED):
+    """The notebook's train/test split, then a validation split of the training rows for early stopping"""
+    from sklearn.model_selection import train_test_split
+
+    # The notebook stratifies the diabetes split only
+    stratify = y if name == 'diabetes' else None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=seed,
+                                                        stratify=stratify)
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=VALIDATION_SIZE,
+                                                  random_state=seed, stratify=y_train)
+    return X_fit, X_val, X_test, y_fit, y_val, y_test
+
+
+def trim_to_best_iteration(model):
+    """Copy of an early-stopped classifier without the trees after its best iteration"""
+    import xgboost as xgb
+
+    booster = model.get_booster()
+    best = getattr(model, 'best_iteration', None)
+    if best is None or best + 1 >= booster.num_boosted_rounds():
+        return model
+    trimmed = xgb.XGBClassifier()
+    trimmed.load_model(bytearray(booster[:best + 1].save_raw('ubj')))
+    return trimmed
+
+
+def evaluate(model, X: pd.DataFrame, y: pd.Series) -> Dict[str, float]:
+    from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+
+    proba = model.predict_proba(X)[:, 1]
+    return {
+        'accuracy': round(float(accuracy_score(y, proba > 0.5)), 5),
+        'roc_auc': round(float(roc_auc_score(y, proba)), 5),
+        'log_loss': round(float(log_loss(y, proba)), 5)
+    }
+
+
+def train(name: str, n_estimators: int = 1000, early_stopping: int = 50, nthread: int = -1,
+          seed: int = SEED, dataset_dir: str = DATASET_DIR) -> Tuple[Any, Dict[str, Any], Dict[str, Any]]:
+    """
+    Train one model the notebook's way, with hist, all cores and early stopping.
+
+    Returns:
+        tuple: (model trimmed to its best iteration, label encoders, training report)
+    """
+    import xgboost as xgb
+
+    timings = {}
+    started = time.perf_counter()
+    X, y, encoders = LOADERS[name](dataset_dir)
+    X_fit, X_val, X_test, y_fit, y_val, y_test = split(name, X, y, seed)
+    timings['load_seconds'] = time.perf_counter() - started
+
+    params = {
+        'n_estimators': n_estimators,
+        'tree_method': 'hist',
+        'n_jobs': nthread,
+        'random_state': seed,
+        'eval_metric': 'logloss',
+        'early_stopping_rounds': early_stopping,
+        **NOTEBOOK_PARAMS[name]
+    }
+    model = xgb.XGBClassifier(**params)
+    fit_started = time.perf_counter()
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+    timings['train_seconds'] = time.perf_counter() - fit_started
+
+    trimmed = trim_to_best_iteration(model)
+    if not np.allclose(trimmed.predict_proba(X_test), model.predict_proba(X_test), atol=1e-6):
+        raise RuntimeError(f'Trimmed {name} model does not reproduce the early-stopped predictions')
+
+    evaluate_started = time.perf_counter()
+    metrics = evaluate(trimmed, X_test, y_test)
+    timings['evaluate_seconds'] = time.perf_counter() - evaluate_started
+
+    report = {
+        'dataset': REFERENCE_DATASETS[name][0],
+        'rows': {'total': int(len(X)), 'train': int(len(X_fit)), 'validation': int(len(X_val)),
+                 'test': int(len(X_test))},
+        'params': {key: value for key, value in params.items() if key != 'n_jobs'},
+        'nthread': nthread if nthread > 0 else os.cpu_count(),
+        'best_iteration': int(model.best_iteration) if getattr(model, 'best_iteration', None) is not None else None,
+        'trees': int(trimmed.get_booster().num_boosted_rounds()),
+        'test_metrics': metrics,
+        **{key: round(value, 3) for key, value in timings.items()},
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    return trimmed, encoders, report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Train the MedAssist models and publish them to the model registry')
+    parser.add_argument('models', nargs='*', help=f'Models to train: {list(LOADERS)} (default: both)')
+    parser.add_argument('--n-estimators', type=int, default=1000, help='Upper bound on boosting rounds')
+    parser.add_argument('--early-stopping', type=int, default=50, help='Rounds without validation improvement')
+    parser.add_argument('--nthread', type=int, default=-1, help='XGBoost threads (-1 = all cores)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--registry-dir', default=REGISTRY_DIR)
+    parser.add_argument('--version', default=None, help='Registry version name (default: UTC timestamp)')
+    parser.add_argument('--no-publish', action='store_true', help='Train and report only')
+    parser.add_argument('--report', default=None, help='Also write the training reports to this JSON file')
+    args = parser.parse_args(argv)
+    unknown = set(args.models) - set(LOADERS)
+    if unknown:
+        parser.error(f'Unknown model(s) {sorted(unknown)}. Must be in: {list(LOADERS)}')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    reports = {}
+    for name in args.models or list(LOADERS):
+        logger.info(f"Training {name} model")
+        model, encoders, report = train(name, args.n_estimators, args.early_stopping, args.nthread,
+                                        args.seed, args.dataset_dir)
+        logger.info(f"{name}: {report['trees']} trees in {report['train_seconds']}s, "
+                    f"test AUC {report['test_metrics']['roc_auc']}, accuracy {report['test_metrics']['accuracy']}, "
+                    f"peak RSS {report['peak_rss_mb']} MB")
+        if not args.no_publish:
+            report['version'] = publish(name, model, list(model.get_booster().feature_names), encoders,
+                                        args.registry_dir, args.version, extra={'training': report})
+        reports[name] = report
+
+    print(json.dumps(reports, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+MedAssist Prediction API - Production WSGI Entry Point
+
+Loads the models once in the parent process, before gunicorn forks its workers,
+so every worker shares the XGBoost boosters and SHAP explainers copy-on-write
+instead of loading its own copy:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Worker count, threads and XGBoost threads per worker are set in gunicorn.conf.py.
+"""
+
+import gc
+
+import prediction_api
+from prediction_api import app, load_models
+
+load_models()
+
+if prediction_api.MICRO_BATCH_ENABLED:
+    # Scheduler threads are started lazily inside each worker after the fork
+    prediction_api.init_micro_batching()
+
+# Move everything loaded so far into the permanent generation: the garbage
+# collector then never writes to those objects, so forked workers keep sharing
+# their memory pages instead of copying them
+gc.freeze()
+
+__all__ = ['app']
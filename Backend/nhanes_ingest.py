@@ -0,0 +1,446 @@
+"""
+MedAssist NHANES Ingestion
+Converts a directory of NHANES XPT (SAS transport) files into compact Parquet, in chunks and in parallel
+
+convert: every *.xpt file in the input directory becomes <output>/<MODULE>.parquet
+(DEMO_L.xpt -> DEMO_L.parquet). Files are converted in a pool of `--workers`
+processes, largest first. Each file gets a fresh process, so the peak memory
+reported for a file is that file's alone. A file is read `--chunk-size` rows at
+a time with pd.read_sas, so memory depends on the chunk size, not on the file
+size. Each file takes two passes:
+1. The XPT chunks are written unchanged to a temporary Parquet file (numbers
+   as float64, text decoded). For every column the pass records whether all
+   values are whole numbers, their range and whether they fit in 7
+   significant digits.
+2. The temporary file is read back one row group at a time, and each column is
+   cast to the smallest type that holds its values exactly:
+   - whole numbers (codes, counts, SEQN): the smallest signed integer type.
+     SAS missing values become nulls.
+   - other numbers: float32 when every value has at most 7 significant digits,
+     otherwise float64.
+   - text: strings. Blank values, SAS's missing text, become nulls. Parquet
+     dictionary-encodes repeated values.
+Some NHANES files store zero as 5.397605e-79, the smallest SAS transport
+number. Such values are written as 0.
+
+Each output file records in its metadata the module, source file, row count
+and whether SEQN is unique and sorted, which is true for one-row-per-participant
+modules. The run reports, per file, rows, columns, XPT and Parquet sizes, time
+per pass and peak memory (resident set size).
+
+join: builds one wide table with one row per participant. The base module
+(DEMO_*) is read `--chunk-size` rows at a time. For each chunk, only the row
+groups of the other modules whose SEQN range overlaps the chunk are read, and
+they are left-joined on SEQN. Memory holds one chunk of every module, never
+whole files. Modules with more than one row per SEQN (prescriptions, dietary
+foods, ...) cannot become columns and are skipped with a note. Column names
+that already exist get the module as a prefix.
+
+Usage:
+    python nhanes_ingest.py convert nhanes/2021-2023/ nhanes_parquet/ --workers 4 --chunk-size 50000
+    python nhanes_ingest.py join nhanes_parquet/ nhanes_2021_2023_wide.parquet
+    python nhanes_ingest.py join nhanes_parquet/ wide.parquet --base DEMO_L --modules BMX_L GHB_L --report join.json
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Shared helpers live with the other jobs in AI/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'AI'))
+from process_stats import peak_rss_mb  # noqa: E402
+
+logger = logging.getLogger('nhanes_ingest')
+
+KEY = 'SEQN'
+DEFAULT_CHUNK_SIZE = 50000
+METADATA_KEY = b'medassist'
+# XPT text is Latin-1 (the transport format predates UTF-8)
+XPT_ENCODING = 'latin-1'
+# The smallest SAS transport number; NHANES uses it for an exact zero
+SAS_ZERO = 1e-70
+FLOAT32_DIGITS = 7
+
+INTEGER_TYPES = [(np.int8, 'int8'), (np.int16, 'int16'), (np.int32, 'int32'), (np.int64, 'int64')]
+
+
+def module_name(path: str) -> str:
+    """DEMO_L.xpt -> DEMO_L"""
+    return os.path.splitext(os.path.basename(path))[0].upper()
+
+
+def significant_digits_fit(values: np.ndarray, digits: int = FLOAT32_DIGITS) -> bool:
+    """Whether every finite, non-zero value has at most `digits` significant digits"""
+    values = values[np.isfinite(values) & (values != 0)]
+    if not len(values):
+        return True
+    # Scaled to `digits` digits before the decimal point, a value that fits is a whole number
+    scaled = values * 10.0 ** (digits - 1 - np.floor(np.log10(np.abs(values))))
+    return bool(np.all(np.abs(scaled - np.round(scaled)) <= 1e-4))
+
+
+class ColumnStats:
+    """What the first pass learns about one numeric column"""
+
+    def __init__(self):
+        self.whole = True
+        self.float32 = True
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self.whole:
+            self.whole = bool(np.all(values == np.floor(values)))
+        if not self.whole and self.float32:
+            self.float32 = significant_digits_fit(values)
+
+    def arrow_type(self):
+        if self.whole:
+            for numpy_type, arrow_name in INTEGER_TYPES:
+                info = np.iinfo(numpy_type)
+                if self.min == np.inf or (info.min <= self.min and self.max <= info.max):
+                    return getattr(pa, arrow_name)()
+        return pa.float32() if self.float32 else pa.float64()
+
+
+def clean_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Decode text, blank text -> missing, SAS zero -> 0"""
+    for column in chunk.columns:
+        values = chunk[column]
+        if values.dtype == object:
+            values = values.str.decode(XPT_ENCODING) if len(values) and isinstance(values.iloc[0], bytes) else values
+            chunk[column] = values.str.rstrip().replace('', None)
+        else:
+            array = values.to_numpy(dtype=np.float64)
+            tiny = np.abs(array) < SAS_ZERO
+            if tiny.any():
+                array = array.copy()
+                array[tiny] = 0.0
+                chunk[column] = array
+    return chunk
+
+
+def convert_file(path: str, output_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Convert one XPT file to compact Parquet in two chunked passes.
+
+    Returns:
+        dict: The file's report (rows, columns, sizes, time per pass, peak memory).
+    """
+    started = time.perf_counter()
+    module = module_name(path)
+    final_path = os.path.join(output_dir, f'{module}.parquet')
+    staging_path = f'{final_path}.{os.getpid()}.staging'
+    tmp_path = f'{final_path}.{os.getpid()}.tmp'
+
+    stats: Dict[str, ColumnStats] = {}
+    rows = chunks = 0
+    previous_key, key_unique_sorted = None, True
+    writer = None
+    try:
+        # Pass 1: XPT chunks -> staging Parquet, collecting per-column statistics
+        with pd.read_sas(path, format='xport', chunksize=chunk_size) as reader:
+            for chunk in reader:
+                chunk = clean_chunk(chunk)
+                for column in chunk.columns:
+                    if chunk[column].dtype != object:
+                        stats.setdefault(column, ColumnStats()).update(chunk[column].to_numpy(dtype=np.float64))
+                if KEY in chunk.columns and len(chunk):
+                    keys = chunk[KEY].to_numpy()
+                    if (previous_key is not None and keys[0] <= previous_key) or np.any(np.diff(keys) <= 0):
+                        key_unique_sorted = False
+                    previous_key = keys[-1]
+                if writer is None:
+                    # SAS has two types: numbers (read as float64) and text
+                    staging_schema = pa.schema([(column, pa.string() if chunk[column].dtype == object else pa.float64())
+                                                for column in chunk.columns])
+                    writer = pq.ParquetWriter(staging_path, staging_schema, compression='none')
+                writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+                rows += len(chunk)
+                chunks += 1
+        if writer is None:
+            raise ValueError(f'{path} has no rows')
+        writer.close()
+        writer = None
+        read_seconds = time.perf_counter() - started
+
+        # Pass 2: staging Parquet -> final types, one row group at a time
+        cast_started = time.perf_counter()
+        staging = pq.ParquetFile(staging_path)
+        schema = pa.schema([pa.field(field.name, stats[field.name].arrow_type() if field.name in stats
+                                     else pa.string()) for field in staging.schema_arrow])
+        metadata = {'module': module, 'source': os.path.basename(path), 'rows': rows,
+                    'key_unique_sorted': KEY in schema.names and key_unique_sorted}
+        schema = schema.with_metadata({METADATA_KEY: json.dumps(metadata).encode()})
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as final:
+            for group in range(staging.num_row_groups):
+                table = staging.read_row_group(group)
+                final.write_table(pa.table([pc.cast(table[name], schema.field(name).type) for name in schema.names],
+                                           schema=schema))
+        os.replace(tmp_path, final_path)
+        cast_seconds = time.perf_counter() - cast_started
+    finally:
+        if writer is not None:
+            writer.close()
+        for leftover in (staging_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    types = {}
+    for field in schema:
+        types[str(field.type)] = types.get(str(field.type), 0) + 1
+    return {
+        'module': module,
+        'rows': rows,
+        'columns': len(schema),
+        'chunks': chunks,
+        'key_unique_sorted': metadata['key_unique_sorted'],
+        'types': types,
+        'xpt_mb': round(os.path.getsize(path) / 1e6, 2),
+        'parquet_mb': round(os.path.getsize(final_path) / 1e6, 2),
+        'read_seconds': round(read_seconds, 3),
+        'cast_seconds': round(cast_seconds, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def convert_in_own_process(path: str, output_dir: str, chunk_size: int) -> Dict[str, Any]:
+    """Convert one file in a fresh process (Python < 3.11, where pools cannot recycle their workers)"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(convert_file, path, output_dir, chunk_size).result()
+
+
+def convert_directory(input_dir: str, output_dir: str, workers: int = 1,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Convert every XPT file of a directory, `workers` files at a time"""
+    paths = sorted(glob.glob(os.path.join(input_dir, '*.xpt')) + glob.glob(os.path.join(input_dir, '*.XPT')),
+                   key=os.path.getsize, reverse=True)
+    if not paths:
+        raise FileNotFoundError(f'No .xpt files in {input_dir}')
+    os.makedirs(output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    files, failed = [], []
+    # One process per file, so each file's peak memory is measured on its own
+    if sys.version_info >= (3, 11):
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   max_tasks_per_child=1)
+        task = convert_file
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        task = convert_in_own_process
+    with pool:
+        futures = {pool.submit(task, path, output_dir, chunk_size): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                logger.error(f"Could not convert {path}: {str(e)}")
+                failed.append({'file': os.path.basename(path), 'error': str(e)})
+                continue
+            files.append(report)
+            logger.info(f"{report['module']}: {report['rows']} rows x {report['columns']} columns in "
+                        f"{report['seconds']}s, peak RSS {report['peak_rss_mb']} MB, "
+                        f"{report['xpt_mb']} MB -> {report['parquet_mb']} MB")
+
+    files.sort(key=lambda report: report['module'])
+    return {
+        'input_dir': input_dir,
+        'output_dir': output_dir,
+        'workers': workers,
+        'chunk_size': chunk_size,
+        'files': files,
+        'failed': failed,
+        'wall_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """The metadata convert wrote into a module's Parquet file"""
+    raw = (pq.read_schema(path).metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else {'module': module_name(path)}
+
+
+class ModuleReader:
+    """Reads the rows of one SEQN range from a module, touching only the row groups that overlap it"""
+
+    def __init__(self, path: str):
+        self.file = pq.ParquetFile(path)
+        key_index = self.file.schema_arrow.get_field_index(KEY)
+        self.ranges = []
+        for group in range(self.file.num_row_groups):
+            column = self.file.metadata.row_group(group).column(key_index)
+            self.ranges.append((column.statistics.min, column.statistics.max)
+                               if column.statistics is not None and column.statistics.has_min_max else (None, None))
+        self.groups_read = 0
+
+    def read_range(self, low, high) -> 'pa.Table':
+        groups = [g for g, (g_low, g_high) in enumerate(self.ranges)
+                  if g_low is None or (g_low <= high and g_high >= low)]
+        self.groups_read += len(groups)
+        table = self.file.read_row_groups(groups) if groups else self.file.schema_arrow.empty_table()
+        key = table[KEY]
+        return table.filter(pc.and_(pc.greater_equal(key, low), pc.less_equal(key, high)))
+
+
+def join_modules(parquet_dir: str, output_path: str, base: Optional[str] = None,
+                 modules: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Left-join one-row-per-participant modules onto the base module on SEQN, a chunk at a time.
+
+    Args:
+        base: Base module (default: the DEMO_* module).
+        modules: Modules to join (default: all others).
+
+    Returns:
+        dict: Rows, columns, joined and skipped modules, time and peak memory.
+    """
+    started = time.perf_counter()
+    paths = {module_name(path): path for path in sorted(glob.glob(os.path.join(parquet_dir, '*.parquet')))}
+    if base is None:
+        base = next((name for name in paths if name.startswith('DEMO')), None)
+    if base not in paths:
+        raise FileNotFoundError(f'Base module {base!r} not found in {parquet_dir}')
+    unknown = set(modules or []) - set(paths)
+    if unknown:
+        raise FileNotFoundError(f'Modules not found in {parquet_dir}: {sorted(unknown)}')
+
+    joined, skipped = [], {}
+    for name in modules or [name for name in paths if name != base]:
+        if name == base:
+            continue
+        metadata = read_metadata(paths[name])
+        if not metadata.get('key_unique_sorted'):
+            skipped[name] = f'more than one row per {KEY} (or no {KEY} column)'
+        else:
+            joined.append(name)
+
+    # Output schema: the base columns, then each module's columns; a name already taken gets the module as prefix
+    base_reader = pq.ParquetFile(paths[base])
+    fields = list(base_reader.schema_arrow)
+    readers, renames = {}, {}
+    for name in joined:
+        readers[name] = ModuleReader(paths[name])
+        taken = {field.name for field in fields}
+        renames[name] = []
+        for field in readers[name].file.schema_arrow:
+            if field.name == KEY:
+                continue
+            new_name = f'{name}_{field.name}' if field.name in taken else field.name
+            renames[name].append((field.name, new_name))
+            fields.append(pa.field(new_name, field.type))
+    schema = pa.schema(fields, metadata={METADATA_KEY: json.dumps({'base': base, 'modules': joined}).encode()})
+
+    rows = 0
+    matched = {name: 0 for name in joined}
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+            for batch in base_reader.iter_batches(batch_size=chunk_size):
+                table = pa.Table.from_batches([batch])
+                low, high = pc.min(table[KEY]).as_py(), pc.max(table[KEY]).as_py()
+                for name in joined:
+                    part = readers[name].read_range(low, high)
+                    matched[name] += part.num_rows
+                    part = part.select([KEY] + [old for old, _ in renames[name]]).rename_columns(
+                        [KEY] + [new for _, new in renames[name]])
+                    table = table.join(part, keys=KEY, join_type='left outer')
+                table = table.sort_by(KEY).select(schema.names).cast(schema)
+                writer.write_table(table)
+                rows += table.num_rows
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'output': output_path,
+        'base': base,
+        'rows': rows,
+        'columns': len(schema),
+        'modules': {name: {'matched_rows': matched[name], 'row_groups_read': readers[name].groups_read,
+                           'row_groups': readers[name].file.num_row_groups} for name in joined},
+        'skipped': skipped,
+        'parquet_mb': round(os.path.getsize(output_path) / 1e6, 2),
+        'seconds': round(time.perf_counter() - started, 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def print_conversion(report: Dict[str, Any]):
+    print(f"{'module':<16} {'rows':>9} {'cols':>5} {'xpt MB':>8} {'parquet MB':>10} {'read s':>7} {'cast s':>7} "
+          f"{'total s':>7} {'peak MB':>8}")
+    for file in report['files']:
+        print(f"{file['module']:<16} {file['rows']:>9} {file['columns']:>5} {file['xpt_mb']:>8.2f} "
+              f"{file['parquet_mb']:>10.2f} {file['read_seconds']:>7.2f} {file['cast_seconds']:>7.2f} "
+              f"{file['seconds']:>7.2f} {file['peak_rss_mb']:>8}")
+    for file in report['failed']:
+        print(f"{file['file']:<16} failed: {file['error']}")
+    print(f"{len(report['files'])} files in {report['wall_seconds']}s with {report['workers']} worker(s)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Convert NHANES XPT files to compact Parquet and join them on SEQN')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='Convert every .xpt file of a directory to Parquet')
+    convert_parser.add_argument('input_dir')
+    convert_parser.add_argument('output_dir')
+    convert_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                                help='Files converted at the same time')
+    convert_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows read at a time')
+    convert_parser.add_argument('--report', default=None, help='Also write the report to this JSON file')
+
+    join_parser = subparsers.add_parser('join', help='Join converted modules on SEQN into one wide table')
+    join_parser.add_argument('parquet_dir')
+    join_parser.add_argument('output')
+    join_parser.add_argument('--base', default=None, help='Base module (default: the DEMO_* module)')
+    join_parser.add_argument('--modules', nargs='+', default=None, help='Modules to join (default: all)')
+    join_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Base rows joined at a time')
+    join_parser.add_argument('--report', default=None, help='Also write the report to this JSON file')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if not PARQUET_AVAILABLE:
+        parser.error('NHANES ingestion requires pyarrow')
+
+    if args.command == 'convert':
+        report = convert_directory(args.input_dir, args.output_dir, args.workers, args.chunk_size)
+        print_conversion(report)
+    else:
+        report = join_modules(args.parquet_dir, args.output, args.base,
+                              [name.upper() for name in args.modules] if args.modules else None, args.chunk_size)
+        print(json.dumps(report, indent=2))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()